@@ -1,8 +1,18 @@
+import argparse
 import pandas as pd
 import os
+import sys
+from pathlib import Path
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "scripts" / "python")
+if SHARED_DIR not in sys.path:
+    sys.path.insert(0, SHARED_DIR)
+from data_cache import read_table
+from instrumentation import add_trace_arguments, start_tracing, traced
+
+@traced
 def load_data(filepath):
     """
     Load data from the specified filepath.
@@ -18,7 +28,8 @@ def load_data(filepath):
         return None
 
     try:
-        df_loaded = pd.read_excel(filepath)
+        # Compact dtypes: categories for text, small integers for flags
+        df_loaded = read_table(filepath, compact=True)
         print(f"Data loaded successfully from {filepath}")
         return df_loaded
     except FileNotFoundError:
@@ -28,6 +39,7 @@ def load_data(filepath):
     except pd.errors.EmptyDataError:
         print(f"No data found in: {filepath}")
 
+@traced
 def explore_data(df):
     """
     Perform exploratory data analysis on the DataFrame.
@@ -44,6 +56,7 @@ def explore_data(df):
     print("\nMissing values in each column:")
     print(df.isnull().sum())
 
+@traced
 def visualize_data(df):
     """
     Create visualizations for the data.
@@ -58,8 +71,16 @@ def visualize_data(df):
     plt.close()  # Close the plot to avoid display issues
 
 if __name__ == "__main__":
-    data_filepath = "C:\\Users\\Farkas\\Documents\\Exploring-individual-and-demographic-factors-potentially-affecting-dogs-vocal-behaviour\\Exploring_Dogs_Vocal_Behaviour_Analysis\\base_data\\raw\\DATA_Base_stone.xlsx"
+    parser = argparse.ArgumentParser(description="Explore the base dataset")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    tracer = (start_tracing(Path(__file__).resolve().parent, "exploration", args.trace,
+                            args.trace_memory) if args.trace else None)
+    
+    data_filepath = Path(__file__).resolve().parent.parent / "base_data" / "raw" / "DATA_Base_stone.xlsx"
     data = load_data(data_filepath)
     if data is not None:
         explore_data(data)
         visualize_data(data)
+    if tracer:
+        tracer.close()
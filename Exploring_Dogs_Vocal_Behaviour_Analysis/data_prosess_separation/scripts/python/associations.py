@@ -0,0 +1,379 @@
+"""
+Binary Association Engine
+-------------------------
+
+Computes every pairwise association between two blocks of 0/1 indicator
+columns (keep x problems, growl x howl, origin x problems, ...) in one
+batched step instead of one scipy call per pair.
+
+For binary variables all 2x2 contingency tables follow from a single
+matrix product: n11 = X.T @ Y gives the "both yes" counts, and the other
+three cells come from the column sums. From those cells we derive:
+- phi coefficient (identical to Pearson's r on 0/1 data)
+- chi-square statistic and p-value (1 degree of freedom)
+- odds ratio with a Wald 95% confidence interval
+- one-sided Fisher exact p-values and the doubled two-sided p-value
+
+The same idea crosses a cluster (or any categorical) label with indicator
+columns: one-hot(labels).T @ X gives the "yes" count of every column in
+every cluster, i.e. all k x 2 contingency tables at once, from which the
+chi-square test, Cramer's V and the row percentages follow.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+STATISTICS = ('n11', 'phi', 'chi2', 'p_value', 'odds_ratio',
+              'or_ci_low', 'or_ci_high', 'fisher_p_greater',
+              'fisher_p_less', 'fisher_p')
+CLUSTER_STATISTICS = ('chi2', 'dof', 'p_value', 'cramers_v')
+
+
+def contingency_cells(X, Y):
+    """
+    Build all 2x2 contingency tables between the columns of X and Y.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray
+        Indicator matrix of shape (n_dogs, a)
+    Y : numpy.ndarray
+        Indicator matrix of shape (n_dogs, b)
+
+    Returns:
+    --------
+    tuple of numpy.ndarray
+        (n11, n10, n01, n00), each of shape (a, b), where n10 counts
+        "X yes, Y no" and n01 counts "X no, Y yes"
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if X.shape[0] != Y.shape[0]:
+        raise ValueError(f"Blocks have different row counts: {X.shape[0]} vs {Y.shape[0]}")
+
+    n = X.shape[0]
+    n11 = X.T @ Y
+    x_yes = X.sum(axis=0)[:, None]
+    y_yes = Y.sum(axis=0)[None, :]
+    n10 = x_yes - n11
+    n01 = y_yes - n11
+    n00 = n - n11 - n10 - n01
+    return n11, n10, n01, n00
+
+
+def compute_associations(X, Y, x_names=None, y_names=None, yates=False):
+    """
+    Compute all association statistics between two indicator blocks.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray or pandas.DataFrame
+        First indicator block, shape (n_dogs, a)
+    Y : numpy.ndarray or pandas.DataFrame
+        Second indicator block, shape (n_dogs, b)
+    x_names, y_names : list of str, optional
+        Column labels; taken from the DataFrames when omitted
+    yates : bool
+        Apply Yates' continuity correction to the chi-square statistic
+        (as scipy.stats.chi2_contingency does by default for 2x2 tables)
+
+    Returns:
+    --------
+    dict
+        Statistic name -> DataFrame of shape (a, b), indexed by x_names
+        with columns y_names. See STATISTICS for the available keys.
+    """
+    if x_names is None:
+        x_names = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(X.shape[1]))
+    if y_names is None:
+        y_names = list(Y.columns) if isinstance(Y, pd.DataFrame) else list(range(Y.shape[1]))
+
+    n11, n10, n01, n00 = contingency_cells(X, Y)
+    return associations_from_counts(n11 + n10 + n01 + n00, n11 + n10, n11 + n01, n11,
+                                    x_names, y_names, yates=yates)
+
+
+def associations_from_counts(n, x_yes, y_yes, n11, x_names=None, y_names=None, yates=False):
+    """
+    Compute all association statistics from pre-aggregated counts.
+
+    The 2x2 tables only depend on the number of dogs, the column sums and
+    the "both yes" counts, so counts kept from earlier runs (see
+    sufficient_stats.py) give exactly the same results as the raw answers.
+
+    Parameters:
+    -----------
+    n : int or numpy.ndarray
+        Number of dogs
+    x_yes : numpy.ndarray
+        "Yes" count of every X column, shape (a,) or broadcastable to (a, b)
+    y_yes : numpy.ndarray
+        "Yes" count of every Y column, shape (b,) or broadcastable to (a, b)
+    n11 : numpy.ndarray
+        "Both yes" counts, shape (a, b)
+    x_names, y_names : list of str, optional
+        Row and column labels of the results
+    yates : bool
+        Apply Yates' continuity correction to the chi-square statistic
+
+    Returns:
+    --------
+    dict
+        As compute_associations
+    """
+    n11 = np.asarray(n11, dtype=np.float64)
+    x_yes = np.asarray(x_yes, dtype=np.float64)
+    y_yes = np.asarray(y_yes, dtype=np.float64)
+    if x_yes.ndim == 1:
+        x_yes = x_yes[:, None]
+    if y_yes.ndim == 1:
+        y_yes = y_yes[None, :]
+    n = np.broadcast_to(np.asarray(n, dtype=np.float64), n11.shape)
+    n10 = x_yes - n11
+    n01 = y_yes - n11
+    n00 = n - n11 - n10 - n01
+    x_yes = n11 + n10
+    y_yes = n11 + n01
+    if x_names is None:
+        x_names = list(range(n11.shape[0]))
+    if y_names is None:
+        y_names = list(range(n11.shape[1]))
+
+    # Phi coefficient; undefined (NaN) for constant columns, like pearsonr
+    cross = n11 * n00 - n10 * n01
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = np.sqrt(x_yes * (n - x_yes) * y_yes * (n - y_yes))
+        phi = np.where(denom > 0, cross / denom, np.nan)
+
+        if yates:
+            adjusted = np.maximum(np.abs(cross) - n / 2, 0)
+            chi2 = np.where(denom > 0, n * adjusted ** 2 / denom ** 2, np.nan)
+        else:
+            chi2 = n * phi ** 2
+    p_value = stats.chi2.sf(chi2, df=1)
+
+    # Odds ratio with the Haldane-Anscombe correction for tables with a zero cell
+    cells = np.stack([n11, n10, n01, n00])
+    cells = np.where((cells == 0).any(axis=0), cells + 0.5, cells)
+    log_or = np.log(cells[0]) + np.log(cells[3]) - np.log(cells[1]) - np.log(cells[2])
+    log_se = np.sqrt((1.0 / cells).sum(axis=0))
+    z = stats.norm.ppf(0.975)
+
+    # Fisher exact test: n11 follows a hypergeometric distribution given the margins
+    total = n.astype(np.int64)
+    successes = x_yes.astype(np.int64)
+    draws = y_yes.astype(np.int64)
+    observed = n11.astype(np.int64)
+    fisher_greater = stats.hypergeom.sf(observed - 1, total, successes, draws)
+    fisher_less = stats.hypergeom.cdf(observed, total, successes, draws)
+    fisher_two_sided = np.minimum(1.0, 2 * np.minimum(fisher_greater, fisher_less))
+
+    values = {
+        'n11': n11.astype(np.int64),
+        'phi': phi,
+        'chi2': chi2,
+        'p_value': p_value,
+        'odds_ratio': np.exp(log_or),
+        'or_ci_low': np.exp(log_or - z * log_se),
+        'or_ci_high': np.exp(log_or + z * log_se),
+        'fisher_p_greater': fisher_greater,
+        'fisher_p_less': fisher_less,
+        'fisher_p': fisher_two_sided,
+    }
+    return {name: pd.DataFrame(value, index=x_names, columns=y_names)
+            for name, value in values.items()}
+
+
+def associate_blocks(matrix, x_block, y_block, x_columns=None, y_columns=None, **kwargs):
+    """
+    Compute associations between two blocks of a RespondentMatrix.
+
+    Parameters:
+    -----------
+    matrix : RespondentMatrix
+        Joined respondent matrix
+    x_block, y_block : str
+        Block names, e.g. 'keep' and 'problems'
+    x_columns, y_columns : list of str, optional
+        Restrict to these (prefixed) columns of the blocks
+    **kwargs
+        Passed to compute_associations
+
+    Returns:
+    --------
+    dict
+        Statistic name -> DataFrame, as returned by compute_associations
+    """
+    def select(block, columns):
+        names = matrix.columns[block]
+        if columns is None:
+            return matrix.block(block), names
+        positions = [names.index(col) for col in columns]
+        return matrix.block(block)[:, positions], list(columns)
+
+    X, x_names = select(x_block, x_columns)
+    Y, y_names = select(y_block, y_columns)
+    return compute_associations(X, Y, x_names, y_names, **kwargs)
+
+
+def associations_long(results):
+    """
+    Reshape association matrices into one row per variable pair.
+
+    Parameters:
+    -----------
+    results : dict
+        Output of compute_associations
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Columns 'x', 'y' plus one column per statistic
+    """
+    first = next(iter(results.values()))
+    long_df = pd.DataFrame({
+        'x': np.repeat(first.index.to_numpy(), first.shape[1]),
+        'y': np.tile(first.columns.to_numpy(), first.shape[0]),
+    })
+    for name, df in results.items():
+        long_df[name] = df.to_numpy().ravel()
+    return long_df
+
+
+def cluster_contingency(labels, X, names=None, correction=True):
+    """
+    Cross a label vector with every column of an indicator block at once.
+
+    Parameters:
+    -----------
+    labels : array-like
+        Cluster (or other category) of every dog
+    X : numpy.ndarray or pandas.DataFrame
+        Indicator block of shape (n_dogs, m)
+    names : list of str, optional
+        Column labels; taken from the DataFrame when omitted
+    correction : bool
+        Apply Yates' continuity correction when there are only two labels
+        (1 degree of freedom), as scipy.stats.chi2_contingency does
+
+    Returns:
+    --------
+    dict
+        'counts': labels x columns "yes" counts;
+        'row_pct': labels x columns percentage of "yes" within each label;
+        'tests': columns x (chi2, dof, p_value, cramers_v), NaN for columns
+        that are constant (an expected cell count of zero)
+    """
+    if names is None:
+        names = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(X.shape[1]))
+    X = np.asarray(X)
+    labels = np.asarray(labels)
+    if X.shape[0] != len(labels):
+        raise ValueError(f"Labels and block have different row counts: "
+                         f"{len(labels)} vs {X.shape[0]}")
+
+    levels, codes = np.unique(labels, return_inverse=True)
+    one_hot = np.zeros((len(levels), len(codes)), dtype=np.float32)
+    one_hot[codes, np.arange(len(codes))] = 1
+    # float32 products are exact for counts below 2**24 dogs
+    yes = (one_hot @ X.astype(np.float32)).astype(np.float64)      # (k, m)
+    sizes = one_hot.sum(axis=1).astype(np.float64)
+    return cluster_contingency_from_counts(yes, sizes, levels, names, correction=correction)
+
+
+def cluster_contingency_from_counts(yes, sizes, levels=None, names=None, correction=True):
+    """
+    Cluster x column tests from pre-aggregated counts.
+
+    Parameters:
+    -----------
+    yes : numpy.ndarray
+        "Yes" count of every column in every label, shape (k, m)
+    sizes : numpy.ndarray
+        Number of dogs per label, shape (k,)
+    levels : list, optional
+        Label values, in the order of the rows of yes
+    names : list of str, optional
+        Column labels
+    correction : bool
+        Yates' continuity correction for two labels, as in cluster_contingency
+
+    Returns:
+    --------
+    dict
+        As cluster_contingency
+    """
+    yes = np.asarray(yes, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 1)     # (k, 1)
+    if levels is None:
+        levels = list(range(yes.shape[0]))
+    if names is None:
+        names = list(range(yes.shape[1]))
+    n = sizes.sum()
+    col_yes = yes.sum(axis=0, keepdims=True)
+
+    # Labels without dogs (e.g. a cluster absent from a small stratum) have
+    # no expected counts and drop out of the tables
+    present = sizes.ravel() > 0
+    tested, tested_sizes = yes[present], sizes[present]
+
+    # Expected counts of the k x 2 tables, "yes" and "no" halves
+    expected_yes = tested_sizes * col_yes / n
+    expected_no = tested_sizes * (n - col_yes) / n
+    dof = int(present.sum()) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dev_yes = np.abs(tested - expected_yes)
+        dev_no = np.abs(tested_sizes - tested - expected_no)
+        if correction and dof == 1:
+            dev_yes = np.maximum(dev_yes - 0.5, 0)
+            dev_no = np.maximum(dev_no - 0.5, 0)
+        chi2 = (dev_yes ** 2 / expected_yes + dev_no ** 2 / expected_no).sum(axis=0)
+    constant = (col_yes.ravel() == 0) | (col_yes.ravel() == n)
+    chi2[constant] = np.nan
+    if dof < 1:
+        chi2[:] = np.nan
+
+    # Cramer's V of a k x 2 table: sqrt(chi2 / (n * min(k - 1, 1)))
+    cramers_v = np.sqrt(chi2 / n) if dof >= 1 else np.full_like(chi2, np.nan)
+    p_value = stats.chi2.sf(chi2, df=max(dof, 1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        row_pct = yes / sizes * 100
+    return {
+        'counts': pd.DataFrame(yes.astype(np.int64), index=levels, columns=names),
+        'row_pct': pd.DataFrame(row_pct, index=levels, columns=names),
+        'tests': pd.DataFrame({'chi2': chi2, 'dof': dof, 'p_value': p_value,
+                               'cramers_v': cramers_v}, index=names),
+    }
+
+
+def cluster_block_contingency(matrix, labels, blocks=None, **kwargs):
+    """
+    Cross a label vector with every column of several RespondentMatrix
+    blocks in one product.
+
+    Parameters:
+    -----------
+    matrix : RespondentMatrix
+        Joined respondent matrix
+    labels : pandas.Series or array-like
+        One label per respondent; a Series is aligned on ID_full
+    blocks : list of str, optional
+        Block names; all blocks when omitted
+    **kwargs
+        Passed to cluster_contingency
+
+    Returns:
+    --------
+    dict
+        As cluster_contingency, with a 'block' column added to 'tests'
+    """
+    blocks = list(matrix.blocks) if blocks is None else list(blocks)
+    labels = matrix.labels(labels)
+    X = np.hstack([matrix.block(name) for name in blocks])
+    names = [col for name in blocks for col in matrix.columns[name]]
+    results = cluster_contingency(labels.to_numpy(), X, names, **kwargs)
+    results['tests'].insert(0, 'block', np.repeat(blocks, [len(matrix.columns[name])
+                                                           for name in blocks]))
+    return results
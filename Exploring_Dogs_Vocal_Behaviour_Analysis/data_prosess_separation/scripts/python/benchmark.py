@@ -0,0 +1,340 @@
+"""
+Benchmark Suite
+---------------
+
+Measures how the analysis stages scale with the number of respondents.
+
+1. Synthetic surveys: binary questionnaire tables with the same columns
+   and marginal yes-frequencies as grow_to_whom.csv, howl_on_sound.csv,
+   keep.csv, origin.csv and problems.csv (origin is drawn as one category
+   per dog, like the real data), plus a base workbook with fill and
+   repfilt_full flags for filter_unique_entries
+2. Every stage of DogVocalizationAnalysis, MCAAnalysis and
+   filter_unique_entries is timed (best of --repeat runs) and profiled for
+   peak traced memory (tracemalloc, one extra run). tracemalloc only sees
+   the benchmark process, so the memory run sets n_jobs=1 and work that
+   normally goes to worker processes is done, and counted, in-process
+3. Results can be saved as a baseline and later runs compared against it;
+   a stage slower or hungrier than the baseline by more than the tolerance
+   is reported as a regression (exit status 1)
+
+Usage:
+    python benchmark.py --sizes 5000 100000
+    python benchmark.py --sizes 5000 --save-baseline
+    python benchmark.py --sizes 5000 --compare
+
+Synthetic data is kept under data/synthetic/n<size> and reused by later
+runs. Figures are disabled for all benchmarked stages.
+"""
+
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from binary_store import ID_COLUMN
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+SYNTHETIC_DIR = DATA_DIR / "synthetic"
+BASELINE_FILE = Path(__file__).parent.parent.parent / "benchmarks" / "baseline.json"
+DEFAULT_SIZES = (5000, 100000, 1000000)
+
+# Files whose columns and marginal frequencies the generator copies;
+# categorical files get exactly one yes per respondent
+SURVEY_FILES = {
+    'grow_to_whom.csv': False,
+    'howl_on_sound.csv': False,
+    'keep.csv': False,
+    'origin.csv': True,
+    'problems.csv': False,
+}
+
+# Base workbook: share of rows kept by filter_unique_entries per flag
+BASE_FLAGS = {'fill': 0.9, 'repfilt_full': 0.85}
+
+
+def survey_marginals(raw_dir=DATA_DIR / "raw"):
+    """
+    Yes-frequency of every answer column in the real survey files.
+
+    Returns:
+    --------
+    dict
+        File name -> pandas.Series of frequencies indexed by column
+    """
+    marginals = {}
+    for filename in SURVEY_FILES:
+        df = pd.read_csv(raw_dir / filename, encoding='utf-8-sig')
+        marginals[filename] = df.drop(columns=ID_COLUMN).mean()
+    return marginals
+
+
+def generate_survey(n_respondents, output_dir, marginals=None, seed=42,
+                    workbook_columns=5):
+    """
+    Write a synthetic survey of n_respondents dogs.
+
+    Parameters:
+    -----------
+    n_respondents : int
+        Number of rows per table
+    output_dir : str or Path
+        Target folder; the tables go to output_dir/raw
+    marginals : dict, optional
+        Output of survey_marginals(); read from the real data when omitted
+    seed : int
+        Seed of the random generator
+    workbook_columns : int
+        Answer columns copied into the synthetic base workbook (besides
+        ID_full, fill and repfilt_full); 0 skips the workbook
+
+    Returns:
+    --------
+    pathlib.Path
+        The raw folder holding the generated files
+    """
+    marginals = marginals or survey_marginals()
+    raw_dir = Path(output_dir) / "raw"
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n_respondents + 1)
+
+    tables = {}
+    for filename, categorical in SURVEY_FILES.items():
+        freq = marginals[filename]
+        if categorical:
+            # One category per dog; dogs without any yes keep the remainder
+            p = np.append(freq.to_numpy(), max(0.0, 1 - freq.sum()))
+            choice = rng.choice(len(p), size=n_respondents, p=p / p.sum())
+            values = (choice[:, None] == np.arange(len(freq))[None, :]).astype(np.uint8)
+        else:
+            values = (rng.random((n_respondents, len(freq))) < freq.to_numpy()).astype(np.uint8)
+        df = pd.DataFrame(values, columns=freq.index)
+        df.insert(0, ID_COLUMN, ids)
+        df.to_csv(raw_dir / filename, index=False)
+        tables[filename] = df
+
+    if workbook_columns:
+        _write_base_workbook(raw_dir / "DATA_STONE_BASE.xlsx", tables['problems.csv'],
+                             workbook_columns, rng)
+    return raw_dir
+
+
+def _write_base_workbook(path, answers, n_columns, rng):
+    """Base export with the filter flags and a few answer columns"""
+    from openpyxl import Workbook
+
+    columns = list(answers.columns[:n_columns + 1])
+    flags = {name: (rng.random(len(answers)) < share).astype(int)
+             for name, share in BASE_FLAGS.items()}
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns + list(flags))
+    values = answers[columns].to_numpy().tolist()
+    flag_rows = np.column_stack(list(flags.values())).tolist()
+    for row, flag_row in zip(values, flag_rows):
+        sheet.append(row + flag_row)
+    workbook.save(path)
+
+
+def synthetic_data(n_respondents, seed=42):
+    """Folder with a synthetic survey of the given size, generated on first use"""
+    output_dir = SYNTHETIC_DIR / f"n{n_respondents}"
+    if not (output_dir / "raw" / "DATA_STONE_BASE.xlsx").exists():
+        print(f"Generating synthetic survey with {n_respondents} respondents...")
+        generate_survey(n_respondents, output_dir, seed=seed)
+    return output_dir
+
+
+def measure(func, repeat=1, memory=True, owner=None):
+    """
+    Time a callable and trace its peak memory.
+
+    Parameters:
+    -----------
+    func : callable
+        Stage to run (without arguments)
+    repeat : int
+        Timed runs; the fastest one is reported
+    memory : bool
+        Run once more under tracemalloc for the peak allocation
+    owner : object, optional
+        Analyzer whose n_jobs is set to 1 for the memory run, so process
+        pool work happens where tracemalloc can see it
+
+    Returns:
+    --------
+    dict
+        seconds, peak_mb
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    peak_mb = np.nan
+    if memory:
+        n_jobs = getattr(owner, 'n_jobs', None)
+        if owner is not None:
+            owner.n_jobs = 1
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+            if owner is not None:
+                owner.n_jobs = n_jobs
+    return {'seconds': min(times), 'peak_mb': peak_mb}
+
+
+def _analysis_stages(data_dir):
+    from data_gathering import DogVocalizationAnalysis
+
+    analyzer = DogVocalizationAnalysis(figures=False, data_dir=data_dir)
+    return [
+        ('gathering.load', analyzer.load_data, analyzer),
+        ('gathering.vocalization', analyzer.analyze_vocalization_patterns, analyzer),
+        ('gathering.hierarchical', analyzer.analyze_hierarchical_clustering, analyzer),
+        ('gathering.origin', analyzer.analyze_origin_impact, analyzer),
+        ('gathering.keeping', analyzer.analyze_keeping_conditions_impact, analyzer),
+        ('gathering.adjusted_effects', analyzer.analyze_adjusted_effects, analyzer),
+        ('gathering.latent_classes', analyzer.analyze_latent_classes, analyzer),
+    ]
+
+
+def _mca_stages(data_dir):
+    from mca_analysis import MCAAnalysis
+
+    analyzer = MCAAnalysis(figures=False, data_dir=data_dir)
+    blocks = {}
+    stages = [('mca.load', lambda: blocks.update(analyzer.load_blocks()), None)]
+    for name in analyzer.blocks:
+        stages.append((f'mca.{name}',
+                       lambda name=name: analyzer.perform_mca(blocks[name], name.title()), None))
+    stages.append(('mca.joint', analyzer.analyze_joint, None))
+    return stages
+
+
+def _filter_stages(data_dir):
+    from filter_unique_entries import filter_unique_entries
+
+    raw_dir = Path(data_dir) / "raw"
+    return [('filter.stream', lambda: filter_unique_entries(
+        raw_dir / "DATA_STONE_BASE.xlsx", output_dir=raw_dir, use_cache=False), None)]
+
+
+STAGE_GROUPS = {
+    'gathering': _analysis_stages,
+    'mca': _mca_stages,
+    'filter': _filter_stages,
+}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, groups=tuple(STAGE_GROUPS), repeat=1, memory=True):
+    """
+    Benchmark every stage of the selected groups at every size.
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per (n_respondents, stage) with seconds and peak_mb
+    """
+    rows = []
+    for n in sizes:
+        data_dir = synthetic_data(n)
+        for group in groups:
+            # Stages of a group run in order; later ones use earlier results
+            for stage, func, owner in STAGE_GROUPS[group](data_dir):
+                print(f"\n[benchmark] {stage} @ {n} respondents")
+                result = measure(func, repeat=repeat, memory=memory, owner=owner)
+                rows.append({'n_respondents': n, 'stage': stage, **result})
+    return pd.DataFrame(rows)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Store benchmark results together with a description of the machine"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'machine': platform.platform(),
+            'python': platform.python_version(),
+            'results': results.to_dict(orient='records'),
+        }, f, indent=2)
+    print(f"Saved baseline to: {path}")
+
+
+def compare_baseline(results, path=BASELINE_FILE, tolerance=0.25, min_seconds=0.05):
+    """
+    Compare results against a saved baseline.
+
+    Parameters:
+    -----------
+    tolerance : float
+        Allowed relative increase of time and peak memory
+    min_seconds : float
+        Slowdowns smaller than this are timer noise and never flagged
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Current and baseline values, their ratios and a regression flag
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = pd.DataFrame(json.load(f)['results'])
+    merged = results.merge(baseline, on=['n_respondents', 'stage'],
+                           suffixes=('', '_baseline'))
+    merged['time_ratio'] = merged['seconds'] / merged['seconds_baseline']
+    merged['memory_ratio'] = merged['peak_mb'] / merged['peak_mb_baseline']
+    slower = merged['seconds'] - merged['seconds_baseline'] > min_seconds
+    merged['regression'] = ((slower & (merged['time_ratio'] > 1 + tolerance)) |
+                            (merged['memory_ratio'] > 1 + tolerance))
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis stages")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="numbers of synthetic respondents")
+    parser.add_argument('--groups', nargs='+', default=list(STAGE_GROUPS),
+                        choices=list(STAGE_GROUPS), help="stage groups to run")
+    parser.add_argument('--repeat', type=int, default=1, help="timed runs per stage")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip the tracemalloc run")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"store the results in {BASELINE_FILE.name}")
+    parser.add_argument('--compare', action='store_true',
+                        help="compare against the saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative slowdown / memory growth")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.groups, args.repeat, not args.no_memory)
+    print("\nBenchmark results:")
+    print(results.round(3).to_markdown(index=False))
+
+    if args.save_baseline:
+        save_baseline(results)
+    if args.compare:
+        comparison = compare_baseline(results, tolerance=args.tolerance)
+        print("\nComparison with baseline:")
+        print(comparison[['n_respondents', 'stage', 'time_ratio', 'memory_ratio',
+                          'regression']].round(2).to_markdown(index=False))
+        regressions = comparison[comparison['regression']]
+        if len(regressions):
+            print(f"\n{len(regressions)} stages regressed beyond {args.tolerance:.0%}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
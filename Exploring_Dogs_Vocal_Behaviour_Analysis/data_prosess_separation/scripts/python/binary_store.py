@@ -0,0 +1,270 @@
+"""
+Bit-Packed Binary Table Store
+-----------------------------
+
+The questionnaire blocks (growl, howl, keep, origin, problems) are 0/1
+indicator matrices keyed by ID_full. Parsed with pd.read_csv they end up
+as int64 columns, i.e. 64 bits for every single yes/no answer.
+
+This module converts each CSV once into a bit-packed on-disk layout:
+- ids.npy   : ID_full values (int64)
+- bits.npy  : np.packbits rows, one bit per answer (uint8)
+- meta.json : column dictionary plus the source file signature
+
+Later runs memory-map the packed arrays instead of re-parsing the CSV and
+only unpack the columns that are actually requested.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ID_COLUMN = 'ID_full'
+FORMAT_VERSION = 1
+
+
+class PackedTable:
+    """
+    Read-only, DataFrame-compatible view over a bit-packed indicator table.
+
+    Columns are unpacked lazily from the memory-mapped bit matrix, so
+    selecting a handful of answers never touches the rest of the table.
+    """
+
+    def __init__(self, ids, bits, columns, name=None):
+        """
+        Parameters:
+        -----------
+        ids : numpy.ndarray
+            ID_full value of every row
+        bits : numpy.ndarray
+            Packed answers, shape (n_rows, ceil(n_columns / 8)), dtype uint8
+        columns : list of str
+            Answer column names in packed bit order
+        name : str, optional
+            Table name used in messages
+        """
+        self.ids = ids
+        self.bits = bits
+        self.columns = pd.Index(columns)
+        self.name = name
+        self._positions = {col: i for i, col in enumerate(columns)}
+
+    @property
+    def shape(self):
+        """Shape of the equivalent DataFrame (ID_full column included)"""
+        return (len(self.ids), len(self.columns) + 1)
+
+    @property
+    def nbytes(self):
+        """Bytes used by the packed answers and the ID vector"""
+        return self.bits.nbytes + self.ids.nbytes
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, column):
+        return column == ID_COLUMN or column in self._positions
+
+    def column_values(self, column):
+        """
+        Unpack a single answer column.
+
+        Parameters:
+        -----------
+        column : str
+            Answer column name
+
+        Returns:
+        --------
+        numpy.ndarray
+            uint8 vector of 0/1 answers
+        """
+        if column not in self._positions:
+            raise KeyError(column)
+        position = self._positions[column]
+        byte, bit = divmod(position, 8)
+        return (self.bits[:, byte] >> (7 - bit)) & 1
+
+    def to_numpy(self, columns=None):
+        """
+        Unpack several answer columns into a dense uint8 matrix.
+
+        Parameters:
+        -----------
+        columns : list of str, optional
+            Columns to unpack; all answer columns when omitted
+
+        Returns:
+        --------
+        numpy.ndarray
+            Matrix of shape (n_rows, n_columns), dtype uint8
+        """
+        if columns is None:
+            return np.unpackbits(self.bits, axis=1, count=len(self.columns))
+        if not len(columns):
+            return np.empty((len(self.ids), 0), dtype=np.uint8)
+        return np.column_stack([self.column_values(col) for col in columns])
+
+    def to_frame(self, columns=None):
+        """
+        Materialize the table as a pandas DataFrame with uint8 answers.
+
+        Parameters:
+        -----------
+        columns : list of str, optional
+            Answer columns to include; all when omitted
+
+        Returns:
+        --------
+        pandas.DataFrame
+            ID_full followed by the requested answer columns
+        """
+        columns = list(self.columns) if columns is None else list(columns)
+        df = pd.DataFrame(self.to_numpy(columns), columns=columns)
+        df.insert(0, ID_COLUMN, np.asarray(self.ids))
+        return df
+
+    def __getitem__(self, key):
+        """Mimic DataFrame indexing: a name gives a Series, a list a DataFrame"""
+        if isinstance(key, str):
+            if key == ID_COLUMN:
+                return pd.Series(np.asarray(self.ids), name=ID_COLUMN)
+            return pd.Series(self.column_values(key), name=key)
+        key = list(key)
+        answers = [col for col in key if col != ID_COLUMN]
+        df = self.to_frame(answers)
+        return df[key]
+
+    def __repr__(self):
+        return (f"PackedTable(name={self.name!r}, rows={len(self.ids)}, "
+                f"columns={len(self.columns)}, packed_bytes={self.nbytes})")
+
+
+class FrameViews(Mapping):
+    """
+    Read-only name -> DataFrame view of packed tables. A table is only
+    materialized (as uint8 answers) the first time its frame is requested.
+    """
+
+    def __init__(self, tables):
+        self._tables = tables
+        self._frames = {}
+
+    def __getitem__(self, name):
+        if name not in self._frames:
+            self._frames[name] = self._tables[name].to_frame()
+        return self._frames[name]
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+
+class BinaryTableStore:
+    """
+    Converts indicator CSV files to the packed layout once and memory-maps
+    them on subsequent loads. A packed table is rebuilt automatically when
+    its source CSV changes (size or modification time).
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Parameters:
+        -----------
+        cache_dir : str or Path
+            Directory holding one packed sub-directory per source table
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _table_dir(self, source):
+        return self.cache_dir / Path(source).stem
+
+    @staticmethod
+    def _signature(source):
+        stat = os.stat(source)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def is_current(self, source):
+        """Check whether a packed copy exists and matches the source file"""
+        meta_file = self._table_dir(source) / "meta.json"
+        if not meta_file.exists():
+            return False
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return (meta.get('version') == FORMAT_VERSION
+                and meta.get('source') == self._signature(source))
+
+    def convert(self, source):
+        """
+        Parse an indicator CSV and write its packed representation.
+
+        Parameters:
+        -----------
+        source : str or Path
+            CSV file with an ID_full column and 0/1 answer columns
+
+        Raises:
+        -------
+        ValueError
+            If the ID column is missing or an answer is not 0/1
+        """
+        source = Path(source)
+        df = pd.read_csv(source)
+        if ID_COLUMN not in df.columns:
+            raise ValueError(f"{source.name} has no {ID_COLUMN} column")
+
+        columns = [col for col in df.columns if col != ID_COLUMN]
+        answers = df[columns].to_numpy()
+        if not np.isin(answers, (0, 1)).all():
+            bad = [col for col in columns if not df[col].isin((0, 1)).all()]
+            raise ValueError(f"{source.name} has non-binary values in: {', '.join(bad)}")
+
+        table_dir = self._table_dir(source)
+        table_dir.mkdir(parents=True, exist_ok=True)
+        np.save(table_dir / "ids.npy", df[ID_COLUMN].to_numpy(dtype=np.int64))
+        np.save(table_dir / "bits.npy", np.packbits(answers.astype(np.uint8), axis=1))
+
+        # meta.json is written last so an interrupted conversion is never
+        # mistaken for a current one
+        meta = {
+            'version': FORMAT_VERSION,
+            'columns': columns,
+            'n_rows': int(len(df)),
+            'source': self._signature(source),
+        }
+        with open(table_dir / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        print(f"Packed {source.name}: {answers.shape[0]} rows x {answers.shape[1]} answers")
+
+    def load(self, source):
+        """
+        Load a packed table, converting the source CSV first if needed.
+
+        Parameters:
+        -----------
+        source : str or Path
+            CSV file backing the table
+
+        Returns:
+        --------
+        PackedTable
+            Memory-mapped view of the table
+        """
+        source = Path(source)
+        if not self.is_current(source):
+            self.convert(source)
+
+        table_dir = self._table_dir(source)
+        with open(table_dir / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        ids = np.load(table_dir / "ids.npy", mmap_mode='r')
+        bits = np.load(table_dir / "bits.npy", mmap_mode='r')
+        return PackedTable(ids, bits, meta['columns'], name=source.stem)
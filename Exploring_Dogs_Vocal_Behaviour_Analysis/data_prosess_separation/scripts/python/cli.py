@@ -0,0 +1,241 @@
+"""
+Command-Line Entry Point
+------------------------
+
+One command for every step of the analysis:
+
+    python cli.py filter        keep unique entries of the base workbook
+    python cli.py profile       write the metadata sheet of the base export
+    python cli.py cohort QUERY  count respondents matching a boolean query
+    python cli.py cluster       growl clustering (k-means and Ward)
+    python cli.py mca           MCA of the questionnaire blocks
+    python cli.py associations  origin, keeping-condition and cluster tests
+    python cli.py report        the complete analysis
+
+Only the standard library is imported at startup; each subcommand
+imports pandas, scikit-learn, scipy or matplotlib when it runs, so quick
+jobs such as filtering (which streams the workbook with openpyxl) or
+cohort counts do not pay for the analysis stack.
+
+Paths default to the repository layout and can be moved with --data-dir /
+--base-dir or the VOCAL_DATA_DIR / VOCAL_BASE_DIR environment variables.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+import shared_paths  # noqa: F401 - makes scripts/python importable
+from instrumentation import add_trace_arguments, start_tracing
+
+REPO_DIR = Path(__file__).resolve().parents[3]
+DATA_DIR = Path(os.environ.get('VOCAL_DATA_DIR', REPO_DIR / "data_prosess_separation" / "data"))
+BASE_DIR = Path(os.environ.get('VOCAL_BASE_DIR', REPO_DIR / "base_data"))
+
+
+def _jobs(args):
+    """--jobs 0 means all cores"""
+    return args.jobs or None
+
+
+def _trace(args, directory, name):
+    if not args.trace:
+        return None
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    return start_tracing(directory, name, args.trace, args.trace_memory)
+
+
+def run_filter(args):
+    from filter_unique_entries import filter_unique_entries
+
+    input_file = args.input or args.base_dir / "raw" / "DATA_STONE_BASE.xlsx"
+    tracer = _trace(args, args.data_dir / "processed", "filter")
+    filter_unique_entries(input_file, args.output_dir, formats=tuple(args.formats),
+                          chunk_size=args.chunk_size, use_cache=not args.no_cache)
+    return tracer
+
+
+def run_profile(args):
+    from create_metadata_sheet import create_metadata_sheet
+
+    input_file = args.input or args.base_dir / "raw" / "DATA_Base_stone.xlsx"
+    output_file = args.output or input_file.parent / "metadata_sheet.xlsx"
+    tracer = _trace(args, output_file.parent, "metadata_sheet")
+    create_metadata_sheet(input_file, output_file, args.chunk_size, _jobs(args))
+    return tracer
+
+
+def run_cohort(args):
+    from cohort_index import CohortIndex, QueryError
+
+    tracer = _trace(args, args.data_dir / "processed", "cohort")
+    index = CohortIndex.from_data_dir(args.data_dir)
+    if args.columns:
+        print("\n".join(index.columns))
+    if args.query:
+        try:
+            bitmap = index.query(args.query)
+        except QueryError as e:
+            args.parser.error(str(e))
+        print(f"{len(bitmap)} respondents match")
+        if args.ids:
+            print(" ".join(str(i) for i in index.ids[bitmap.positions()]))
+    return tracer
+
+
+def _analysis(args, **settings):
+    from data_gathering import DogVocalizationAnalysis
+
+    if getattr(args, 'strata', None):
+        settings.update(strata_file=args.strata, stratify_by=args.stratify_by,
+                        min_stratum=args.min_stratum)
+    return DogVocalizationAnalysis(n_jobs=_jobs(args), figures=not args.no_figures,
+                                   data_dir=args.data_dir, trace=args.trace,
+                                   trace_memory=args.trace_memory, **settings)
+
+
+def run_cluster(args):
+    analyzer = _analysis(args, cluster_method=args.method, n_clusters=args.clusters,
+                         n_bootstrap=args.bootstrap)
+    analyzer.run_pipeline(force=args.force, targets=['vocalization', 'hierarchical'])
+    return analyzer.tracer
+
+
+def run_associations(args):
+    analyzer = _analysis(args, correction=args.correction, n_permutations=args.permutations)
+    targets = ['origin', 'keeping', 'adjusted_effects', 'cluster_associations']
+    if args.strata:
+        targets.append('strata')
+    analyzer.run_pipeline(force=args.force, targets=targets)
+    return analyzer.tracer
+
+
+def run_report(args):
+    analyzer = _analysis(args, correction=args.correction, n_permutations=args.permutations,
+                         cluster_method=args.method, n_clusters=args.clusters,
+                         n_bootstrap=args.bootstrap)
+    if args.incremental or args.wave:
+        analyzer.update_statistics(args.wave)
+        analyzer.render_figures()
+    else:
+        analyzer.run_pipeline(force=args.force)
+    return analyzer.tracer
+
+
+def run_mca(args):
+    from mca_analysis import MCAAnalysis
+
+    analyzer = MCAAnalysis(figures=not args.no_figures, data_dir=args.data_dir,
+                           trace=args.trace, trace_memory=args.trace_memory)
+    analyzer.analyze_all(joint=args.joint, n_jobs=_jobs(args), force=args.force)
+    return analyzer.tracer
+
+
+def build_parser():
+    """Argument parser with one subparser per step"""
+    parser = argparse.ArgumentParser(description="Dog vocalization analysis")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--data-dir', type=Path, default=DATA_DIR,
+                        help="folder holding raw/, processed/ and cache/ "
+                             "(default: $VOCAL_DATA_DIR or data_prosess_separation/data)")
+    common.add_argument('--base-dir', type=Path, default=BASE_DIR,
+                        help="folder holding the base export in raw/ "
+                             "(default: $VOCAL_BASE_DIR or base_data)")
+    common.add_argument('--jobs', type=int, default=0,
+                        help="worker processes (0 = all cores)")
+    add_trace_arguments(common)
+
+    analysis = argparse.ArgumentParser(add_help=False, parents=[common])
+    analysis.add_argument('--no-figures', action='store_true',
+                          help="skip rendering figures (headless runs)")
+    analysis.add_argument('--force', nargs='+', default=[], metavar='STEP',
+                          help="steps to recompute even if a memoized result exists")
+
+    clustering = argparse.ArgumentParser(add_help=False)
+    clustering.add_argument('--method', choices=('minibatch', 'kmodes'), default='minibatch',
+                            help="clustering of the growl answers")
+    clustering.add_argument('--clusters', type=int,
+                            help="fixed number of clusters (default: chosen by silhouette)")
+    clustering.add_argument('--bootstrap', type=int, default=0,
+                            help="bootstrap resamples for the cluster stability check")
+
+    testing = argparse.ArgumentParser(add_help=False)
+    testing.add_argument('--correction', choices=('fdr_bh', 'holm', 'bonferroni'),
+                         default='fdr_bh', help="multiple-testing correction")
+    testing.add_argument('--permutations', type=int, default=0,
+                         help="label shuffles for permutation p-values")
+
+    stratify = argparse.ArgumentParser(add_help=False)
+    stratify.add_argument('--strata', type=Path,
+                          help="table with ID_full and the grouping column; adds "
+                               "per-group results")
+    stratify.add_argument('--stratify-by', default='lang',
+                          help="grouping column of the strata table (default: lang)")
+    stratify.add_argument('--min-stratum', type=int, default=30,
+                          help="smallest group reported")
+
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sub = commands.add_parser('filter', parents=[common],
+                              help="keep unique entries of the base workbook")
+    sub.add_argument('--input', type=Path,
+                     help="workbook to filter (default: BASE_DIR/raw/DATA_STONE_BASE.xlsx)")
+    sub.add_argument('--output-dir', type=Path, help="folder of the output files")
+    sub.add_argument('--formats', nargs='+', default=['parquet'],
+                     choices=('parquet', 'feather', 'csv', 'xlsx'), help="output file formats")
+    sub.add_argument('--chunk-size', type=int, default=50000, help="rows buffered per write")
+    sub.add_argument('--no-cache', action='store_true',
+                     help="always stream the workbook, even if a cached copy exists")
+    sub.set_defaults(handler=run_filter)
+
+    sub = commands.add_parser('profile', parents=[common],
+                              help="write the metadata sheet of the base export")
+    sub.add_argument('--input', type=Path,
+                     help="export to profile (default: BASE_DIR/raw/DATA_Base_stone.xlsx)")
+    sub.add_argument('--output', type=Path,
+                     help="metadata sheet to write (default: next to the input)")
+    sub.add_argument('--chunk-size', type=int, default=20000, help="rows profiled per chunk")
+    sub.set_defaults(handler=run_profile)
+
+    sub = commands.add_parser('cohort', parents=[common],
+                              help="count respondents matching a boolean query")
+    sub.add_argument('query', nargs='?',
+                     help="e.g. 'origin_From_a_shelter AND keep_In_the_garden'")
+    sub.add_argument('--ids', action='store_true', help="print the matching ID_full values")
+    sub.add_argument('--columns', action='store_true', help="list the indexed columns")
+    sub.set_defaults(handler=run_cohort, parser=sub)
+
+    sub = commands.add_parser('cluster', parents=[analysis, clustering],
+                              help="growl clustering (k-means and Ward)")
+    sub.set_defaults(handler=run_cluster)
+
+    sub = commands.add_parser('mca', parents=[analysis], help="MCA of the questionnaire blocks")
+    sub.add_argument('--joint', action='store_true',
+                     help="one joint MCA over all blocks instead of one per block")
+    sub.set_defaults(handler=run_mca)
+
+    sub = commands.add_parser('associations', parents=[analysis, testing, stratify],
+                              help="origin, keeping-condition and cluster tests")
+    sub.set_defaults(handler=run_associations)
+
+    sub = commands.add_parser('report', parents=[analysis, clustering, testing, stratify],
+                              help="the complete analysis")
+    sub.add_argument('--incremental', action='store_true',
+                     help="fold new respondents into the saved counts instead of "
+                          "rerunning every analysis")
+    sub.add_argument('--wave', type=Path,
+                     help="folder with the block CSVs of a new wave (implies --incremental)")
+    sub.set_defaults(handler=run_report)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    tracer = args.handler(args)
+    if tracer:
+        tracer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Scalable Clustering with Automatic k Selection
+----------------------------------------------
+
+The R pipeline chooses the number of clusters with silhouette scores over
+a full dist() matrix, which needs O(n^2) memory. This module sweeps k
+without ever materializing the pairwise distance matrix:
+- MiniBatchKMeans for standardized data, or a vectorized k-modes
+  (Hamming distance) for the raw 0/1 answers
+- silhouette computed on a random sample of dogs
+- inertia / k-modes cost accumulated over row chunks
+
+All fits accept per-row sample weights, so they can run on the deduplicated
+answer patterns (see patterns.py) instead of on every dog.
+
+Each k is fitted in its own worker process.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+CLUSTER_METHODS = ('minibatch', 'kmodes')
+
+
+class BinaryKModes:
+    """
+    k-modes clustering for 0/1 data.
+
+    Distances to all modes are computed for a chunk of rows with two matrix
+    products, and modes are updated as per-cluster majority votes, so memory
+    stays at O(chunk_size x k).
+    """
+
+    def __init__(self, n_clusters, n_init=10, max_iter=100, chunk_size=100000,
+                 random_state=None, init=None):
+        self.n_clusters = n_clusters
+        self.init = init
+        self.n_init = n_init
+        self.max_iter = max_iter
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    def _assign(self, X, modes, weights):
+        """Nearest mode and (weighted) Hamming cost for every row, chunk by chunk"""
+        labels = np.empty(X.shape[0], dtype=np.int64)
+        cost = 0.0
+        modes = modes.astype(np.float64)
+        mode_ones = modes.sum(axis=1)
+        for start in range(0, X.shape[0], self.chunk_size):
+            chunk = X[start:start + self.chunk_size].astype(np.float64)
+            # Hamming distance = |x| + |m| - 2 x.m
+            dist = chunk.sum(axis=1)[:, None] + mode_ones[None, :] - 2 * chunk @ modes.T
+            labels[start:start + len(chunk)] = dist.argmin(axis=1)
+            cost += dist.min(axis=1) @ weights[start:start + len(chunk)]
+        return labels, cost
+
+    def _update(self, X, labels, weights, rng):
+        one_hot = np.zeros((X.shape[0], self.n_clusters))
+        one_hot[np.arange(X.shape[0]), labels] = weights
+        sizes = one_hot.sum(axis=0)
+        ones = one_hot.T @ X.astype(np.float64)
+        new_modes = (2 * ones >= sizes[:, None]).astype(np.uint8)
+        # Re-seed empty clusters from random rows
+        for empty in np.flatnonzero(sizes == 0):
+            new_modes[empty] = X[rng.integers(X.shape[0])]
+        return new_modes
+
+    def fit(self, X, sample_weight=None, init=None):
+        """
+        Fit the modes.
+
+        Parameters:
+        -----------
+        X : numpy.ndarray
+            0/1 matrix of shape (n_dogs, n_answers)
+        sample_weight : numpy.ndarray, optional
+            Weight of every row, e.g. the number of dogs sharing a pattern
+        init : numpy.ndarray, optional
+            Starting modes of shape (n_clusters, n_answers); when given a
+            single run is started from them. Defaults to the modes passed
+            to the constructor
+        """
+        init = self.init if init is None else init
+        X = np.asarray(X, dtype=np.uint8)
+        weights = np.ones(X.shape[0]) if sample_weight is None \
+            else np.asarray(sample_weight, dtype=np.float64)
+        rng = np.random.default_rng(self.random_state)
+        starts = [np.asarray(init, dtype=np.uint8)] if init is not None else [
+            X[rng.choice(X.shape[0], self.n_clusters, replace=False, p=weights / weights.sum())]
+            for _ in range(self.n_init)]
+
+        best = None
+        for modes in starts:
+            labels, cost = self._assign(X, modes, weights)
+            for _ in range(self.max_iter):
+                modes = self._update(X, labels, weights, rng)
+                new_labels, cost = self._assign(X, modes, weights)
+                if np.array_equal(new_labels, labels):
+                    break
+                labels = new_labels
+            if best is None or cost < best[2]:
+                best = (modes, labels, cost)
+
+        self.cluster_centers_, self.labels_, self.cost_ = best
+        self.inertia_ = self.cost_
+        return self
+
+    def predict(self, X):
+        """Assign rows to the nearest fitted mode"""
+        X = np.asarray(X, dtype=np.uint8)
+        return self._assign(X, self.cluster_centers_, np.ones(X.shape[0]))[0]
+
+    def fit_predict(self, X, sample_weight=None, init=None):
+        return self.fit(X, sample_weight=sample_weight, init=init).labels_
+
+
+def make_model(method, n_clusters, random_state=42, init=None):
+    """
+    Create an unfitted clustering model.
+
+    Parameters:
+    -----------
+    method : str
+        'minibatch' (MiniBatchKMeans) or 'kmodes' (BinaryKModes)
+    n_clusters : int
+        Number of clusters
+    random_state : int
+        Seed for reproducible fits
+    init : numpy.ndarray, optional
+        Starting centers / modes of shape (n_clusters, n_columns); a warm
+        start runs a single initialization from them
+    """
+    if method == 'minibatch':
+        if init is not None:
+            return MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=1,
+                                   batch_size=4096, random_state=random_state)
+        return MiniBatchKMeans(n_clusters=n_clusters, n_init=10, batch_size=4096,
+                               random_state=random_state)
+    if method == 'kmodes':
+        return BinaryKModes(n_clusters=n_clusters, random_state=random_state, init=init)
+    raise ValueError(f"Unknown cluster method '{method}', "
+                     f"expected one of {', '.join(CLUSTER_METHODS)}")
+
+
+def _score_k(X, k, method, sample_size, random_state, sample_weight=None):
+    """Fit one k and score it on a random sample (runs in a worker process)"""
+    model = make_model(method, k, random_state)
+    labels = model.fit_predict(X, sample_weight=sample_weight)
+
+    metric = 'hamming' if method == 'kmodes' else 'euclidean'
+    if len(np.unique(labels)) < 2:
+        silhouette = np.nan
+    elif sample_weight is not None:
+        # Weighted rows stand for several dogs: draw the silhouette sample
+        # of dogs by picking rows in proportion to their weight
+        rng = np.random.default_rng(random_state)
+        weights = np.asarray(sample_weight, dtype=np.float64)
+        sample = rng.choice(X.shape[0], size=sample_size, p=weights / weights.sum())
+        if len(np.unique(labels[sample])) < 2:
+            silhouette = np.nan
+        else:
+            silhouette = silhouette_score(X[sample], labels[sample], metric=metric)
+    else:
+        silhouette = silhouette_score(X, labels, metric=metric,
+                                      sample_size=min(sample_size, X.shape[0]),
+                                      random_state=random_state)
+    return {'k': k, 'inertia': float(model.inertia_), 'silhouette': float(silhouette)}
+
+
+def select_k(X, k_values=range(2, 9), method='minibatch', sample_size=5000,
+             n_jobs=None, random_state=42, sample_weight=None):
+    """
+    Sweep the number of clusters and pick the one with the best silhouette.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray
+        Data to cluster (standardized for 'minibatch', raw 0/1 for 'kmodes')
+    k_values : iterable of int
+        Candidate numbers of clusters
+    method : str
+        'minibatch' or 'kmodes'
+    sample_size : int
+        Dogs used for the silhouette score; memory is O(sample_size^2)
+        instead of O(n_dogs^2)
+    n_jobs : int, optional
+        Worker processes; None uses all cores, 1 runs in-process
+    random_state : int
+        Seed for model fits and silhouette sampling
+    sample_weight : numpy.ndarray, optional
+        Weight of every row, e.g. pattern counts from ResponsePatterns
+
+    Returns:
+    --------
+    best_k : int
+        k with the highest sampled silhouette; the smallest k when no k
+        has a silhouette (every fit or sample ended up with one cluster,
+        e.g. with very skewed pattern weights)
+    scores : pandas.DataFrame
+        inertia and silhouette for every k
+    """
+    if method not in CLUSTER_METHODS:
+        raise ValueError(f"Unknown cluster method '{method}', "
+                         f"expected one of {', '.join(CLUSTER_METHODS)}")
+    X = np.asarray(X)
+    # There cannot be more clusters than (distinct) rows
+    k_values = [k for k in k_values if k <= X.shape[0]]
+    args = [(X, k, method, sample_size, random_state, sample_weight) for k in k_values]
+
+    if n_jobs == 1 or len(k_values) == 1:
+        rows = [_score_k(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            rows = list(pool.map(_score_k, *zip(*args)))
+
+    scores = pd.DataFrame(rows).set_index('k')
+    if scores['silhouette'].isna().all():
+        best_k = int(scores.index.min())
+        print(f"No silhouette could be computed for any k; using the smallest, k={best_k}")
+    else:
+        best_k = int(scores['silhouette'].idxmax())
+    return best_k, scores
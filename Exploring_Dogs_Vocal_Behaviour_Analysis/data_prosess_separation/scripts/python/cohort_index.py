@@ -0,0 +1,468 @@
+"""
+Cohort Bitmap Index
+-------------------
+
+Answers cohort questions such as "how many shelter dogs that live in a
+garden growl at adult men and howl at sirens?" without a pandas filter
+over the block frames.
+
+Every binary answer column of the joined RespondentMatrix becomes a
+compressed bitmap over the respondent rows (sorted ID_full order), laid
+out like a roaring bitmap: rows are split into chunks of 65536, and each
+non-empty chunk is stored either as a sorted uint16 array of its set rows
+(up to 4096 of them) or as a 65536-bit bitmap of 1024 uint64 words.
+AND / OR / NOT work container by container, so a query touches only the
+chunks and words involved.
+
+Queries are boolean expressions over (prefixed) column names:
+
+    origin_From_a_shelter AND keep_In_the_garden AND growl_to_whom_Adult_man
+    (howl_House_or_car_alarm OR howl_Ice_cream_truck) AND NOT problems_Shy
+
+AND, OR and NOT (also written &, | and ~) bind in the usual order NOT >
+AND > OR; names containing spaces or parentheses can be given in double
+quotes. Results come back as counts or ID_full sets.
+
+Usage:
+    python cohort_index.py "origin_From_a_shelter AND keep_In_the_garden"
+    python cohort_index.py --serve --port 8765
+
+The server answers GET /count?q=..., /ids?q=...&limit=... and /columns
+with JSON and only listens on localhost unless told otherwise.
+"""
+
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from binary_store import BinaryTableStore
+from respondent_matrix import RespondentMatrix
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+
+# Indexed blocks: name -> (file, column prefix), as in data_gathering.py
+BLOCKS = {
+    'growl': ("grow_to_whom.csv", 'growl_to_whom_'),
+    'howl': ("howl_on_sound.csv", 'howl_'),
+    'keep': ("keep.csv", 'keep_'),
+    'origin': ("origin.csv", 'origin_'),
+    'problems': ("problems.csv", 'problems_'),
+}
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+ARRAY_LIMIT = 4096
+WORDS = CHUNK_SIZE // 64
+
+_BIT = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+def _to_words(rows):
+    """Bitmap container (1024 uint64 words) from sorted uint16 rows"""
+    words = np.zeros(WORDS, dtype=np.uint64)
+    rows = rows.astype(np.int64)
+    np.bitwise_or.at(words, rows >> 6, _BIT[rows & 63])
+    return words
+
+
+def _to_rows(words):
+    """Sorted uint16 rows of a bitmap container"""
+    bits = np.unpackbits(words.astype('<u8').view(np.uint8), bitorder='little')
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def _cardinality(container):
+    if container.dtype == np.uint16:
+        return len(container)
+    return int(np.unpackbits(container.view(np.uint8)).sum())
+
+
+def _optimize(container):
+    """Store a container in its smaller form; None when it is empty"""
+    if container.dtype == np.uint16:
+        if not len(container):
+            return None
+        return _to_words(container) if len(container) > ARRAY_LIMIT else container
+    count = _cardinality(container)
+    if not count:
+        return None
+    return _to_rows(container) if count <= ARRAY_LIMIT else container
+
+
+def _contains(words, rows):
+    """Which rows of an array container are set in a bitmap container"""
+    rows = rows.astype(np.int64)
+    return (words[rows >> 6] & _BIT[rows & 63]) != 0
+
+
+def _and(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return np.intersect1d(a, b, assume_unique=True)
+    if a.dtype == np.uint16:
+        return a[_contains(b, a)]
+    if b.dtype == np.uint16:
+        return b[_contains(a, b)]
+    return a & b
+
+
+def _or(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return np.union1d(a, b).astype(np.uint16)
+    words = a.copy() if a.dtype == np.uint64 else _to_words(a)
+    return words | (b if b.dtype == np.uint64 else _to_words(b))
+
+
+class Bitmap:
+    """
+    Roaring-style compressed set of row positions.
+
+    Attributes:
+    -----------
+    size : int
+        Number of rows of the universe (needed for NOT)
+    containers : dict
+        Chunk number -> uint16 row array or uint64 word bitmap
+    """
+
+    def __init__(self, size, containers=None):
+        self.size = size
+        self.containers = containers or {}
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Build from a boolean (or 0/1) vector over all rows"""
+        mask = np.asarray(mask, dtype=bool)
+        containers = {}
+        for key, start in enumerate(range(0, len(mask), CHUNK_SIZE)):
+            rows = np.flatnonzero(mask[start:start + CHUNK_SIZE]).astype(np.uint16)
+            container = _optimize(rows)
+            if container is not None:
+                containers[key] = container
+        return cls(len(mask), containers)
+
+    def _combine(self, other, op, keys):
+        if self.size != other.size:
+            raise ValueError("Bitmaps cover different numbers of rows")
+        containers = {}
+        for key in keys:
+            a, b = self.containers.get(key), other.containers.get(key)
+            if a is None or b is None:
+                result = a if b is None else b
+            else:
+                result = _optimize(op(a, b))
+            if result is not None:
+                containers[key] = result
+        return Bitmap(self.size, containers)
+
+    def __and__(self, other):
+        return self._combine(other, _and, self.containers.keys() & other.containers.keys())
+
+    def __or__(self, other):
+        return self._combine(other, _or, sorted(self.containers.keys() | other.containers.keys()))
+
+    def __invert__(self):
+        containers = {}
+        for key in range((self.size + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            container = self.containers.get(key)
+            words = (np.zeros(WORDS, dtype=np.uint64) if container is None
+                     else container if container.dtype == np.uint64 else _to_words(container))
+            words = ~words
+            # Clear the bits past the last row of the final chunk
+            valid = min(CHUNK_SIZE, self.size - key * CHUNK_SIZE)
+            full, tail = divmod(valid, 64)
+            if tail:
+                words[full] &= _BIT[tail] - np.uint64(1)
+                words[full + 1:] = 0
+            else:
+                words[full:] = 0
+            result = _optimize(words)
+            if result is not None:
+                containers[key] = result
+        return Bitmap(self.size, containers)
+
+    def __len__(self):
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    def positions(self):
+        """Sorted row positions of the set"""
+        parts = [key * CHUNK_SIZE + (container if container.dtype == np.uint16
+                                     else _to_rows(container)).astype(np.int64)
+                 for key, container in sorted(self.containers.items())]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return sum(container.nbytes for container in self.containers.values())
+
+
+class QueryError(ValueError):
+    """Malformed query or unknown column name"""
+
+
+_TOKEN = re.compile(r'\s*(?:(?P<paren>[()])|(?P<op>&|\||~|!)|"(?P<quoted>[^"]*)"|(?P<word>[^\s()&|~!"]+))')
+_KEYWORDS = {'AND': '&', 'OR': '|', 'NOT': '~'}
+
+
+def tokenize(query):
+    """Split a query into parentheses, operators (&, |, ~) and column names"""
+    tokens, position = [], 0
+    query = query.rstrip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if not match:
+            raise QueryError(f"Cannot parse query at: {query[position:]!r}")
+        position = match.end()
+        if match.group('paren'):
+            tokens.append(('paren', match.group('paren')))
+        elif match.group('op'):
+            tokens.append(('op', '~' if match.group('op') == '!' else match.group('op')))
+        elif match.group('quoted') is not None:
+            tokens.append(('name', match.group('quoted')))
+        elif match.group('word').upper() in _KEYWORDS:
+            tokens.append(('op', _KEYWORDS[match.group('word').upper()]))
+        else:
+            tokens.append(('name', match.group('word')))
+    return tokens
+
+
+class CohortIndex:
+    """
+    Bitmap per binary answer column of a RespondentMatrix.
+
+    Attributes:
+    -----------
+    ids : numpy.ndarray
+        Sorted ID_full values; bitmap row i is respondent ids[i]
+    bitmaps : dict
+        Column name -> Bitmap of the respondents answering yes
+    """
+
+    def __init__(self, ids, bitmaps):
+        self.ids = np.asarray(ids)
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def from_matrix(cls, matrix, blocks=None):
+        """
+        Index the answer columns of a RespondentMatrix.
+
+        Parameters:
+        -----------
+        matrix : RespondentMatrix
+            Joined respondent matrix (prefixed column names)
+        blocks : list of str, optional
+            Blocks to index; all when omitted
+        """
+        blocks = list(matrix.blocks) if blocks is None else list(blocks)
+        bitmaps = {}
+        for name in blocks:
+            values = matrix.block(name)
+            for position, column in enumerate(matrix.columns[name]):
+                bitmaps[column] = Bitmap.from_mask(values[:, position])
+        return cls(matrix.ids, bitmaps)
+
+    @classmethod
+    def from_data_dir(cls, data_dir=None, blocks=None):
+        """
+        Index the survey blocks of a data folder (raw CSVs, read through
+        the packed store in data_dir/cache).
+        """
+        data_dir = Path(data_dir) if data_dir else DATA_DIR
+        store = BinaryTableStore(data_dir / "cache")
+        names = list(BLOCKS) if blocks is None else list(blocks)
+        tables = {name: store.load(data_dir / "raw" / BLOCKS[name][0]) for name in names}
+        matrix = RespondentMatrix.from_tables(tables, {name: BLOCKS[name][1] for name in names})
+        return cls.from_matrix(matrix)
+
+    @property
+    def columns(self):
+        return list(self.bitmaps)
+
+    @property
+    def nbytes(self):
+        """Bytes held by all bitmap containers"""
+        return sum(bitmap.nbytes for bitmap in self.bitmaps.values())
+
+    def query(self, query):
+        """
+        Evaluate a boolean expression over column names.
+
+        Parameters:
+        -----------
+        query : str
+            e.g. "origin_From_a_shelter AND NOT (keep_Chained OR keep_In_the_garden)"
+
+        Returns:
+        --------
+        Bitmap
+            Rows of the matching respondents
+
+        Raises:
+        -------
+        QueryError
+            If the query is malformed, nested too deeply or names an
+            unknown column
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            raise QueryError("Empty query")
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else (None, None)
+
+        def take():
+            nonlocal position
+            position += 1
+            return tokens[position - 1]
+
+        # Recursive descent: or_expr := and_expr (| and_expr)*,
+        # and_expr := not_expr (& not_expr)*, not_expr := ~ not_expr | atom
+        def or_expr():
+            result = and_expr()
+            while peek() == ('op', '|'):
+                take()
+                result = result | and_expr()
+            return result
+
+        def and_expr():
+            result = not_expr()
+            while peek() == ('op', '&'):
+                take()
+                result = result & not_expr()
+            return result
+
+        def not_expr():
+            if peek() == ('op', '~'):
+                take()
+                return ~not_expr()
+            return atom()
+
+        def atom():
+            if position == len(tokens):
+                raise QueryError("Query ends where a column name was expected")
+            kind, value = take()
+            if (kind, value) == ('paren', '('):
+                result = or_expr()
+                if peek() != ('paren', ')'):
+                    raise QueryError("Missing closing parenthesis")
+                take()
+                return result
+            if kind == 'name':
+                if value not in self.bitmaps:
+                    raise QueryError(f"Unknown column '{value}'")
+                return self.bitmaps[value]
+            raise QueryError(f"Expected a column name or '(' but got {value!r}")
+
+        try:
+            result = or_expr()
+        except RecursionError:
+            raise QueryError("Query is nested too deeply") from None
+        if position < len(tokens):
+            raise QueryError(f"Unexpected {tokens[position][1]!r} in query")
+        return result
+
+    def count(self, query):
+        """Number of respondents matching a query"""
+        return len(self.query(query))
+
+    def ids_matching(self, query):
+        """ID_full values of the respondents matching a query"""
+        return self.ids[self.query(query).positions()]
+
+
+def _handler(index):
+    """Request handler class answering queries against one index"""
+
+    class CohortHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path == '/columns':
+                return self._reply(200, {'columns': index.columns, 'respondents': len(index.ids)})
+            if url.path not in ('/count', '/ids'):
+                return self._reply(404, {'error': f"Unknown endpoint {url.path}"})
+            query = params.get('q', [''])[0]
+            started = time.perf_counter()
+            try:
+                bitmap = index.query(query)
+            except QueryError as e:
+                return self._reply(400, {'error': str(e), 'query': query})
+            payload = {'query': query, 'count': len(bitmap)}
+            if url.path == '/ids':
+                try:
+                    limit = int(params.get('limit', ['0'])[0] or 0)
+                except ValueError:
+                    limit = -1
+                if limit < 0:
+                    return self._reply(400, {'error': "limit must be a non-negative integer",
+                                             'query': query})
+                ids = index.ids[bitmap.positions()]
+                payload['ids'] = (ids[:limit] if limit else ids).tolist()
+            payload['elapsed_us'] = round((time.perf_counter() - started) * 1e6, 1)
+            return self._reply(200, payload)
+
+        def log_message(self, format, *args):
+            print(f"[cohort] {self.address_string()} {format % args}")
+
+    return CohortHandler
+
+
+def serve(index, host='127.0.0.1', port=8765):
+    """Answer /count, /ids and /columns requests until interrupted"""
+    server = ThreadingHTTPServer((host, port), _handler(index))
+    print(f"Serving cohort queries on http://{host}:{port}/count?q=...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count respondents matching a boolean query")
+    parser.add_argument('query', nargs='?', help="e.g. 'origin_From_a_shelter AND keep_In_the_garden'")
+    parser.add_argument('--ids', action='store_true', help="print the matching ID_full values")
+    parser.add_argument('--columns', action='store_true', help="list the indexed columns")
+    parser.add_argument('--serve', action='store_true', help="start the local HTTP endpoint")
+    parser.add_argument('--host', default='127.0.0.1', help="address the server binds to")
+    parser.add_argument('--port', type=int, default=8765, help="port of the server")
+    parser.add_argument('--data-dir', type=Path, help="folder holding raw/ and cache/")
+    args = parser.parse_args()
+
+    index = CohortIndex.from_data_dir(args.data_dir)
+    print(f"Indexed {len(index.columns)} columns of {len(index.ids)} respondents "
+          f"({index.nbytes / 1024:.1f} KiB of bitmaps)")
+    if args.columns:
+        print("\n".join(index.columns))
+    if args.query:
+        started = time.perf_counter()
+        try:
+            bitmap = index.query(args.query)
+        except QueryError as e:
+            parser.error(str(e))
+        elapsed = time.perf_counter() - started
+        print(f"{len(bitmap)} respondents match ({elapsed * 1e6:.0f} us)")
+        if args.ids:
+            print(" ".join(str(i) for i in index.ids[bitmap.positions()]))
+    if args.serve:
+        serve(index, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
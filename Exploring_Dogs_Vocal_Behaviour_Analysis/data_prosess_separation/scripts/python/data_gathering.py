@@ -20,12 +20,34 @@ import numpy as np
 from pathlib import Path
 from sklearn.decomposition import PCA
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from scipy import stats
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
 import os
+import pickle
 
+import shared_paths  # noqa: F401 - makes scripts/python importable
+from instrumentation import add_trace_arguments, instrument, start_tracing
+
+from binary_store import ID_COLUMN, BinaryTableStore, FrameViews
+from respondent_matrix import RespondentMatrix
+from associations import associate_blocks, associations_long, cluster_block_contingency
+from multiple_testing import adjust_pvalues, permutation_pvalues, permutation_chi2_pvalues
+from clustering import make_model, select_k
+from hierarchical import agreement_table, cut_tree, node_weights, ward_linkage
+from lca import select_classes
+from logistic import batched_logistic, logistic_long
+from patterns import ResponsePatterns
+from stability import bootstrap_stability
+from stratified import grouped_statistics, read_groups, summarize_strata
+from sufficient_stats import SufficientStatistics
+from pipeline import Pipeline, captured_figures, captured_sections
+from figures import FigureQueue, FigureSpec
+
+# Vocalization-related problems crossed with the keeping conditions
+VOCALIZATION_PROBLEMS = ['problems_He_she_barks_too_much',
+                         'problems_Aggression_towards_people',
+                         'problems_Aggression_towards_other_dogs']
+
+@instrument(exclude=('append_to_results', 'save_figure'))
 class DogVocalizationAnalysis:
     """
     A class to analyze dog vocalization patterns and their relationships with 
@@ -38,31 +60,122 @@ class DogVocalizationAnalysis:
     - Results documentation
     """
     
-    def __init__(self):
+    def __init__(self, correction='fdr_bh', n_permutations=0, n_jobs=None,
+                 cluster_method='minibatch', n_clusters=None, k_values=range(2, 9),
+                 n_bootstrap=0, lca_classes=range(2, 7), lca_starts=20,
+                 strata_file=None, stratify_by='lang', min_stratum=30,
+                 figures=True, data_dir=None, trace=None, trace_memory=False):
         """
         Initialize the analysis environment with proper paths and data structures.
         Sets up directory structure for raw data and processed results.
+        
+        Parameters:
+        -----------
+        correction : str
+            Multiple-testing correction applied to each battery of tests
+            ('fdr_bh', 'holm' or 'bonferroni')
+        n_permutations : int
+            Number of label shuffles for permutation p-values; 0 disables them
+        n_jobs : int, optional
+            Worker processes for permutation batches and the k sweep
+            (None = all cores)
+        cluster_method : str
+            'minibatch' (MiniBatchKMeans on standardized answers) or
+            'kmodes' (k-modes on the raw 0/1 answers)
+        n_clusters : int, optional
+            Fixed number of clusters; None selects k by sampled silhouette
+        k_values : iterable of int
+            Candidate numbers of clusters for the automatic selection
+        n_bootstrap : int
+            Bootstrap resamples for the cluster stability check; 0 disables it
+        lca_classes : iterable of int
+            Candidate numbers of latent classes; empty disables the latent
+            class analysis
+        lca_starts : int
+            Random EM starts per number of latent classes
+        strata_file : str or Path, optional
+            Table with ID_full and the grouping column (e.g. the filtered
+            base export); enables the stratified results
+        stratify_by : str
+            Grouping column of strata_file, e.g. 'lang' or a country column
+        min_stratum : int
+            Strata with fewer dogs are left out of the stratified results
+        figures : bool
+            Render the queued figures after the analyses; False skips all
+            plotting (headless runs)
+        data_dir : str or Path, optional
+            Folder holding raw/, processed/ and cache/; defaults to
+            data_prosess_separation/data
+        trace : str, optional
+            'jsonl' or 'chrome' records time, CPU, memory and input sizes of
+            every public method in processed/analysis_trace.*
+        trace_memory : bool
+            Include tracemalloc peaks in the trace (slower)
         """
         # Set up directory paths
-        self.data_dir = Path(__file__).parent.parent.parent / "data"
+        self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent.parent.parent / "data"
         self.raw_dir = self.data_dir / "raw"
         self.processed_dir = self.data_dir / "processed"
+        self.cache_dir = self.data_dir / "cache"
         
         # Define input files
         self.files = {
-            'growl': 'growl_to_whom.csv',      # Contains growling target information
+            'growl': 'grow_to_whom.csv',       # Contains growling target information
             'keep': 'keep.csv',                 # Contains keeping conditions
+            'howl': 'howl_on_sound.csv',        # Contains howling triggers
             'origin': 'origin.csv',             # Contains dog origin information
             'problems': 'problems.csv'          # Contains behavioral problems
         }
         
+        # Column name prefixes keeping names unique in the joined matrix
+        self.prefixes = {
+            'growl': 'growl_to_whom_',
+            'keep': 'keep_',
+            'howl': 'howl_',
+            'origin': 'origin_',
+            'problems': 'problems_'
+        }
+        
         # Initialize storage for loaded data and analysis results
-        self.dataframes = {}
+        self.store = BinaryTableStore(self.cache_dir)
+        self.tables = {}
+        self.dataframes = FrameViews(self.tables)
+        self.matrix = None
         self.clusters = None
+        self.cluster_scaler = None
+        self.cluster_model = None
+        
+        # Counts kept between runs for incremental updates
+        self.stats_dir = self.cache_dir / "stats"
+        
+        # Significance testing settings
+        self.correction = correction
+        self.n_permutations = n_permutations
+        self.n_jobs = n_jobs
+        
+        # Clustering settings
+        self.cluster_method = cluster_method
+        self.n_clusters = n_clusters
+        self.k_values = k_values
+        self.n_bootstrap = n_bootstrap
+        self.lca_classes = lca_classes
+        self.lca_starts = lca_starts
+        
+        # Stratified (per language / country) settings
+        self.strata_file = Path(strata_file) if strata_file else None
+        self.stratify_by = stratify_by
+        self.min_stratum = min_stratum
         
         # Ensure output directory exists
         os.makedirs(self.processed_dir, exist_ok=True)
         
+        # Figures are described during the analyses and rendered afterwards
+        self.figure_queue = FigureQueue(self.processed_dir, enabled=figures, n_jobs=n_jobs)
+        
+        # Per-stage timing and memory, written next to the results file
+        self.tracer = (start_tracing(self.processed_dir, "analysis", trace, trace_memory)
+                       if trace else None)
+        
         # Create results markdown file
         self.results_file = self.processed_dir / "analysis_results.md"
         self._initialize_results_file()
@@ -84,8 +197,10 @@ and their relationships with various environmental and demographic factors.
 2. [Growling Patterns Analysis](#growling-patterns)
 3. [Origin Impact Analysis](#origin-impact)
 4. [Keeping Conditions Analysis](#keeping-conditions)
-5. [Statistical Relationships](#statistical-relationships)
-6. [Conclusions](#conclusions)
+5. [Latent Class Analysis](#latent-classes)
+6. [Statistical Relationships](#statistical-relationships)
+7. [Stratified Results](#stratified-results)
+8. [Conclusions](#conclusions)
 
 ---
 """)
@@ -101,57 +216,78 @@ and their relationships with various environmental and demographic factors.
         content : str
             The content to append
         """
+        # Inside a pipeline stage the section is kept with the stage result
+        # and written in stage order once the run is over
+        sections = captured_sections()
+        if sections is not None:
+            sections.append((section, content))
+            return
         with open(self.results_file, 'a', encoding='utf-8') as f:
             f.write(f"\n## {section}\n")
             f.write(content + "\n")
     
-    def save_figure(self, fig, filename):
+    def save_figure(self, spec):
         """
-        Safely save matplotlib figure and document it in results.
+        Queue a figure for deferred rendering and document it in results.
         
         Parameters:
         -----------
-        fig : matplotlib.figure.Figure
-            The figure to save
-        filename : str
-            The filename for the figure
-        """
-        try:
-            fig.savefig(self.processed_dir / filename, bbox_inches='tight', dpi=300)
-            plt.close(fig)
-            print(f"Saved figure: {filename}")
-            
-            # Document in markdown
-            self.append_to_results("Visualization",
-                f"![{filename}](processed/{filename})\n\n"
-                f"*Figure: {filename.replace('_', ' ').replace('.png', '')}*\n")
-        except Exception as e:
-            print(f"Error saving figure {filename}: {str(e)}")
+        spec : FigureSpec
+            Plot kind, data and style of the figure
+        """
+        # Inside a pipeline stage the spec travels with the stage result
+        figures = captured_figures()
+        if figures is not None:
+            figures.append(spec)
+        else:
+            self.figure_queue.add(spec)
+        
+        # Document in markdown
+        self.append_to_results("Visualization",
+            f"![{spec.filename}](processed/{spec.filename})\n\n"
+            f"*Figure: {spec.filename.replace('_', ' ').replace('.png', '')}*\n")
+    
+    def render_figures(self):
+        """Render the queued figures whose data changed (no-op when disabled)"""
+        return self.figure_queue.render()
     
     def load_data(self):
         """
         Load all CSV files into dataframes and document basic statistics.
         Performs initial data validation and reports any issues.
+        
+        Each CSV is converted once into the bit-packed store and memory-mapped
+        on later runs; self.tables keeps the packed views. self.dataframes
+        gives uint8 DataFrames of them, built only when one is requested.
+        
+        The loaded blocks are then joined once into self.matrix, a
+        RespondentMatrix indexed by sorted ID_full that every analysis slices
+        its columns from. Raises ValueError if the blocks do not describe
+        exactly the same respondents.
         """
         data_overview = "### Dataset Information\n\n"
         
         for key, filename in self.files.items():
             file_path = self.raw_dir / filename
             try:
-                df = pd.read_csv(file_path)
-                self.dataframes[key] = df
+                table = self.store.load(file_path)
+                self.tables[key] = table
                 print(f"\nLoaded {filename}")
-                print(f"Shape: {df.shape}")
+                print(f"Shape: {table.shape}")
                 
                 # Document dataset information
                 data_overview += f"#### {filename}\n"
-                data_overview += f"- Number of records: {df.shape[0]}\n"
-                data_overview += f"- Number of features: {df.shape[1]}\n"
-                data_overview += f"- Features: {', '.join(df.columns.tolist())}\n\n"
+                data_overview += f"- Number of records: {table.shape[0]}\n"
+                data_overview += f"- Number of features: {table.shape[1]}\n"
+                data_overview += f"- Features: {', '.join([ID_COLUMN, *table.columns])}\n\n"
                 
             except Exception as e:
                 print(f"Error loading {filename}: {str(e)}")
         
+        self.matrix = RespondentMatrix.from_tables(self.tables, self.prefixes)
+        print(f"\nJoined respondent matrix: {len(self.matrix)} respondents, "
+              f"{self.matrix.values.shape[1]} answer columns")
+        
         self.append_to_results("Data Overview", data_overview)
     
     def analyze_vocalization_patterns(self):
@@ -160,18 +296,18 @@ and their relationships with various environmental and demographic factors.
         
         This includes:
         - Percentage analysis of growling targets
-        - Cluster analysis of behavioral patterns
+        - Cluster analysis of behavioral patterns, with k chosen by sampled
+          silhouette unless n_clusters is fixed
         - Statistical validation of patterns
         """
-        if 'growl' not in self.dataframes or 'problems' not in self.dataframes:
+        if self.matrix is None or 'growl' not in self.matrix or 'problems' not in self.matrix:
             print("Required data not loaded")
             return
             
-        growl_df = self.dataframes['growl']
-        problems_df = self.dataframes['problems']
+        growl_df = self.matrix.frame('growl')
         
         # Analyze growling patterns
-        growl_cols = [col for col in growl_df.columns if col != 'ID_full']
+        growl_cols = self.matrix.columns['growl']
         
         # Calculate and document percentages
         growl_percentages = (growl_df[growl_cols].sum() / len(growl_df) * 100).sort_values(ascending=False)
@@ -181,14 +317,33 @@ and their relationships with various environmental and demographic factors.
         for target, percentage in growl_percentages.items():
             results += f"- {target.replace('growl_to_whom_', '')}: {percentage:.1f}%\n"
         
-        # Perform clustering
-        X = StandardScaler().fit_transform(growl_df[growl_cols])
-        optimal_k = 4
-        kmeans = KMeans(n_clusters=optimal_k, random_state=42)
-        self.clusters = kmeans.fit_predict(X)
+        # Cluster the distinct answer patterns weighted by their counts
+        # instead of every dog; k-modes works on the raw answers
+        patterns = ResponsePatterns.from_matrix(self.matrix.block('growl'), growl_cols)
+        print(f"Clustering {len(patterns)} distinct growl patterns of {patterns.n_rows} dogs")
+        scaler = StandardScaler().fit(patterns.patterns, sample_weight=patterns.counts)
+        X_patterns = scaler.transform(patterns.patterns)
+        X_cluster = patterns.patterns if self.cluster_method == 'kmodes' else X_patterns
+        
+        if self.n_clusters is None:
+            optimal_k, k_scores = select_k(X_cluster, self.k_values, self.cluster_method,
+                                           n_jobs=self.n_jobs,
+                                           sample_weight=patterns.counts)
+            results += "\n### Choosing the Number of Clusters\n\n"
+            results += f"Method: {self.cluster_method}, sampled silhouette and inertia per k:\n\n"
+            results += k_scores.round(4).to_markdown()
+            results += f"\n\nSelected k = {optimal_k}\n"
+        else:
+            optimal_k = self.n_clusters
+        
+        model = make_model(self.cluster_method, optimal_k)
+        pattern_labels = model.fit_predict(X_cluster, sample_weight=patterns.counts)
+        self.clusters = self.matrix.labels(patterns.broadcast(pattern_labels), name='Cluster')
+        self.cluster_scaler, self.cluster_model = scaler, model
         
         # Analyze clusters
-        cluster_df = pd.DataFrame(X, columns=growl_cols)
+        cluster_df = pd.DataFrame(patterns.broadcast(X_patterns), index=self.matrix.index,
+                                  columns=growl_cols)
         cluster_df['Cluster'] = self.clusters
         
         results += "\n### Behavioral Clusters\n\n"
@@ -205,48 +360,268 @@ and their relationships with various environmental and demographic factors.
                 results += f"- {feature.replace('growl_to_whom_', '')}: {value:.2f} SD from mean\n"
             results += "\n"
         
+        if self.n_bootstrap:
+            # Refit on bootstrap resamples of the dogs, warm-started from
+            # the reference centers
+            stability = bootstrap_stability(X_cluster, pattern_labels, model.cluster_centers_,
+                                            self.cluster_method, sample_weight=patterns.counts,
+                                            n_resamples=self.n_bootstrap, n_jobs=self.n_jobs)
+            ari = stability['ari']
+            results += f"### Cluster Stability ({self.n_bootstrap} bootstrap resamples)\n\n"
+            results += "Jaccard stability per cluster (mean below 0.5 = cluster dissolves):\n\n"
+            results += stability['summary'].round(3).to_markdown()
+            results += (f"\n\nAdjusted Rand index with the reference clustering: "
+                        f"mean {ari.mean():.3f}, 5th-95th percentile "
+                        f"{ari.quantile(0.05):.3f}-{ari.quantile(0.95):.3f}\n")
+        
         self.append_to_results("Growling Patterns", results)
+        self.save_figure(FigureSpec(
+            'bar', "growling_targets_distribution.png",
+            growl_percentages.rename(lambda col: col.replace('growl_to_whom_', '')),
+            title="Growling Targets", ylabel="% of dogs", figsize=(10, 6)))
         return growl_percentages, cluster_df
     
+    def analyze_hierarchical_clustering(self):
+        """
+        Ward hierarchical clustering of the growl answers, compared with
+        the k-means clusters (the R ward.D2 step).
+        
+        The standardized distinct growl patterns are clustered with a
+        nearest-neighbor chain, weighted by their number of dogs, which
+        gives the same dendrogram as Ward on every dog without an n x n
+        distance matrix. The tree is cut into as many clusters as the
+        k-means solution has.
+        
+        Returns:
+        --------
+        linkage : numpy.ndarray
+            scipy linkage matrix over the distinct patterns
+        hierarchical : pandas.Series
+            Hierarchical cluster of every dog, indexed by ID_full
+        agreement : pandas.DataFrame
+            k-means x hierarchical clusters, number of dogs
+        """
+        if self.matrix is None or 'growl' not in self.matrix or self.clusters is None:
+            print("Required data not loaded or clustering not performed")
+            return
+        
+        growl_cols = self.matrix.columns['growl']
+        patterns = ResponsePatterns.from_matrix(self.matrix.block('growl'), growl_cols)
+        scaler = StandardScaler().fit(patterns.patterns, sample_weight=patterns.counts)
+        X_patterns = scaler.transform(patterns.patterns)
+        
+        # Every dog of a pattern has the same k-means cluster
+        kmeans_dogs = self.matrix.labels(self.clusters).to_numpy()
+        kmeans_patterns = np.empty(len(patterns), dtype=np.int64)
+        kmeans_patterns[patterns.inverse] = kmeans_dogs
+        n_clusters = int(kmeans_patterns.max()) + 1
+        
+        print(f"Ward clustering of {len(patterns)} distinct growl patterns")
+        Z = ward_linkage(X_patterns, sample_weight=patterns.counts)
+        hierarchical_patterns = cut_tree(Z, n_clusters)
+        hierarchical = self.matrix.labels(patterns.broadcast(hierarchical_patterns),
+                                          name='Hierarchical')
+        agreement, ari = agreement_table(kmeans_patterns, hierarchical_patterns,
+                                         sample_weight=patterns.counts)
+        
+        results = "### Hierarchical Clustering (Ward.D2)\n\n"
+        results += (f"{len(patterns)} distinct growl patterns of {patterns.n_rows} dogs, "
+                    f"cut into {n_clusters} clusters.\n\n")
+        sizes = hierarchical.value_counts().sort_index().rename('dogs').rename_axis('Cluster')
+        results += sizes.to_markdown()
+        results += "\n\nK-means vs hierarchical clusters (number of dogs):\n\n"
+        results += agreement.to_markdown()
+        results += f"\n\nAdjusted Rand index between the two clusterings: {ari:.3f}\n"
+        
+        self.append_to_results("Growling Patterns", results)
+        threshold = (Z[-n_clusters, 2] + Z[-n_clusters + 1, 2]) / 2 if n_clusters > 1 else None
+        self.save_figure(FigureSpec(
+            'dendrogram', "growl_dendrogram.png",
+            {'linkage': Z, 'weights': node_weights(Z, patterns.counts), 'threshold': threshold},
+            title="Hierarchical Clustering Dendrogram (Ward.D2)", ylabel="Height",
+            xlabel="Dogs per branch", figsize=(12, 8)))
+        return Z, hierarchical, agreement
+    
+    def analyze_latent_classes(self, blocks=('growl', 'howl', 'problems')):
+        """
+        Latent class analysis of the binary answer blocks.
+        
+        A Bernoulli mixture is fitted to the distinct answer patterns of
+        every block for each candidate number of classes; the number with
+        the lowest BIC is reported together with its class profiles.
+        
+        Parameters:
+        -----------
+        blocks : iterable of str
+            Blocks to analyze
+        
+        Returns:
+        --------
+        dict
+            Block name -> (best number of classes, model scores, class
+            profiles, latent class of every dog)
+        """
+        if self.matrix is None or not list(self.lca_classes):
+            print("Required data not loaded or latent class analysis disabled")
+            return
+        
+        fits = {}
+        results = ("Bernoulli mixture models fitted by EM "
+                   f"({self.lca_starts} random starts per number of classes); "
+                   "lower BIC is better, entropy near 1 means well separated classes.\n")
+        for block in blocks:
+            if block not in self.matrix:
+                continue
+            columns = self.matrix.columns[block]
+            prefix = self.prefixes[block]
+            patterns = ResponsePatterns.from_matrix(self.matrix.block(block), columns)
+            print(f"Latent class analysis of {len(patterns)} distinct {block} patterns")
+            best_k, scores, models = select_classes(
+                patterns.patterns, self.lca_classes, sample_weight=patterns.counts,
+                columns=[col.removeprefix(prefix) for col in columns],
+                n_starts=self.lca_starts, n_jobs=self.n_jobs)
+            model = models[best_k]
+            classes = self.matrix.labels(patterns.broadcast(model.predict(patterns.patterns)),
+                                         name='Latent class')
+            profiles = model.profiles()
+            
+            results += f"\n### {block.capitalize()}\n\n"
+            results += scores.round(4).to_markdown()
+            results += f"\n\nSelected {best_k} classes. Probability of answering yes per class:\n\n"
+            profile_table = (profiles * 100).round(1).T
+            profile_table.columns = [f"Class {i} ({share * 100:.1f}%)"
+                                     for i, share in enumerate(model.weights_)]
+            results += profile_table.to_markdown()
+            results += "\n"
+            
+            self.save_figure(FigureSpec(
+                'heatmap', f"lca_{block}_profiles.png", profiles.T,
+                title=f"Latent Class Profiles: {block}", figsize=(10, 8),
+                cmap='viridis', center=None))
+            fits[block] = (best_k, scores, profiles, classes)
+        
+        self.append_to_results("Latent Classes", results)
+        return fits
+    
     def analyze_origin_impact(self):
         """
         Analyze how a dog's origin impacts its vocalization patterns.
         
         Performs:
-        - Chi-square tests for independence
+        - Chi-square tests for independence, corrected for multiple testing
+          (plus permutation p-values when n_permutations > 0)
         - Distribution analysis across behavioral clusters
         - Visual representation of relationships
+        
+        All cluster x origin tables come from one batched product (see
+        associations.cluster_contingency).
         """
-        if 'origin' not in self.dataframes or self.clusters is None:
+        if self.matrix is None or 'origin' not in self.matrix or self.clusters is None:
             print("Required data not loaded or clustering not performed")
             return
             
-        origin_df = self.dataframes['origin']
-        origin_df['Cluster'] = self.clusters
+        origin_df = self.matrix.frame('origin')
+        # Aligned on ID_full, fails loudly if the labels cover other dogs
+        clusters = self.matrix.labels(self.clusters, name='Cluster')
         
         results = "### Statistical Analysis of Origin Impact\n\n"
         
         # Analyze each origin type
-        origin_cols = [col for col in origin_df.columns if col != 'ID_full' and col != 'Cluster']
+        origin_cols = self.matrix.columns['origin']
+        
+        contingency = cluster_block_contingency(self.matrix, clusters, ['origin'])
+        tests = contingency['tests']
+        distributions = {}
+        
+        # Significance is judged on p-values corrected over all origin tests
+        raw_p = tests['p_value']
+        adjusted_p = adjust_pvalues(raw_p, self.correction)
+        if self.n_permutations:
+            perm_p = permutation_chi2_pvalues(clusters.to_numpy(), origin_df,
+                                              n_permutations=self.n_permutations,
+                                              n_jobs=self.n_jobs)
+            perm_adjusted_p = adjust_pvalues(perm_p, self.correction)
         
         for col in origin_cols:
-            contingency = pd.crosstab(origin_df['Cluster'], origin_df[col])
-            chi2, p_value = stats.chi2_contingency(contingency)[:2]
-            
             results += f"#### {col.replace('origin_', '')}\n"
-            results += f"- Chi-square statistic: {chi2:.2f}\n"
-            results += f"- p-value: {p_value:.4f}\n"
+            results += f"- Chi-square statistic: {tests.loc[col, 'chi2']:.2f}\n"
+            results += f"- Cramer's V: {tests.loc[col, 'cramers_v']:.3f}\n"
+            results += f"- p-value: {tests.loc[col, 'p_value']:.4f}\n"
+            results += f"- Adjusted p-value ({self.correction}): {adjusted_p[col]:.4f}\n"
+            if self.n_permutations:
+                results += (f"- Permutation p-value ({self.n_permutations} shuffles): "
+                            f"{perm_p[col]:.4f} (adjusted: {perm_adjusted_p[col]:.4f})\n")
             
-            if p_value < 0.05:
+            if adjusted_p[col] < 0.05:
                 results += "- **Statistically significant relationship found**\n"
             
             # Calculate and document percentages
-            percentages = contingency.div(contingency.sum(axis=1), axis=0) * 100
+            yes_pct = contingency['row_pct'][col]
+            percentages = pd.DataFrame({0: 100 - yes_pct, 1: yes_pct}).rename_axis(
+                index='Cluster', columns=col)
+            distributions[col] = percentages
             results += "\nDistribution across clusters:\n"
             results += percentages.to_markdown()
             results += "\n\n"
         
         self.append_to_results("Origin Impact", results)
+        for col, percentages in distributions.items():
+            self.save_figure(FigureSpec(
+                'bar', f"origin_cluster_{col}.png", percentages,
+                title=f"{col.replace('origin_', '')} by cluster", ylabel="% of cluster",
+                rotation=0, figsize=(10, 6)))
+    
+    def analyze_cluster_associations(self, blocks=('origin', 'keep', 'problems', 'howl')):
+        """
+        Cross the behavioral clusters with every answer of several blocks.
+        
+        All cluster x answer tables come from a single one-hot(clusters).T @ X
+        product over the joined blocks; every answer gets a chi-square test,
+        Cramer's V and its yes-percentage per cluster. P-values are corrected
+        over the whole battery.
+        
+        Parameters:
+        -----------
+        blocks : iterable of str
+            Blocks to cross with the clusters; blocks that were not loaded
+            are skipped
+            
+        Returns:
+        --------
+        tests : pandas.DataFrame
+            block, chi2, dof, p_value, cramers_v and adjusted_p per answer,
+            sorted by Cramer's V
+        row_pct : pandas.DataFrame
+            Clusters x answers percentage of dogs answering yes
+        """
+        if self.matrix is None or self.clusters is None:
+            print("Required data not loaded or clustering not performed")
+            return
+        
+        blocks = [name for name in blocks if name in self.matrix]
+        contingency = cluster_block_contingency(self.matrix, self.clusters, blocks)
+        tests = contingency['tests']
+        tests['adjusted_p'] = adjust_pvalues(tests['p_value'], self.correction)
+        tests = tests.sort_values('cramers_v', ascending=False)
+        row_pct = contingency['row_pct']
+        
+        significant = tests.index[tests['adjusted_p'] < 0.05]
+        results = "### Behavioral Clusters Across All Blocks\n\n"
+        results += (f"{len(tests)} answers from {', '.join(blocks)} crossed with the clusters; "
+                     f"{len(significant)} differ significantly between clusters "
+                     f"(adjusted p < 0.05, {self.correction}).\n\n")
+        results += tests.round(4).to_markdown()
+        if len(significant):
+            results += "\n\n#### Percentage answering yes per cluster (significant answers)\n\n"
+            results += row_pct[significant].round(1).to_markdown()
+        results += "\n"
+        
+        self.append_to_results("Statistical Relationships", results)
+        self.save_figure(FigureSpec(
+            'heatmap', "cluster_profiles.png", row_pct.T, title="% answering yes per cluster",
+            xlabel="Cluster", cmap='viridis', center=None, fmt='.0f',
+            figsize=(10, max(6, 0.3 * row_pct.shape[1]))))
+        return tests, row_pct
     
     def analyze_keeping_conditions_impact(self):
         """
@@ -254,50 +629,477 @@ and their relationships with various environmental and demographic factors.
         
         Performs:
         - Correlation analysis
-        - Statistical significance testing
+        - Statistical significance testing, corrected for multiple testing
+          (plus permutation p-values when n_permutations > 0)
         - Visual representation of relationships
+        
+        Returns:
+        --------
+        corr_matrix : pandas.DataFrame
+            Phi coefficients, keeping conditions x vocalization problems
+        p_values : pandas.DataFrame
+            Chi-square p-values with the same layout
         """
-        if 'keep' not in self.dataframes or 'problems' not in self.dataframes:
+        if self.matrix is None or 'keep' not in self.matrix or 'problems' not in self.matrix:
             print("Required data not loaded")
             return
             
-        keep_df = self.dataframes['keep']
-        problems_df = self.dataframes['problems']
-        
-        # Merge datasets
-        merged_df = pd.merge(keep_df, problems_df, on='ID_full')
-        
         # Focus on vocalization-related problems
-        voc_problems = ['problems_He_she_barks_too_much', 
-                       'problems_Aggression_towards_people',
-                       'problems_Aggression_towards_other_dogs']
+        voc_problems = VOCALIZATION_PROBLEMS
                        
-        keep_cols = [col for col in keep_df.columns if col != 'ID_full']
+        keep_cols = self.matrix.columns['keep']
+        
+        # All keep x problem 2x2 tables come from one batched product;
+        # phi equals Pearson's r on 0/1 data
+        associations = associate_blocks(self.matrix, 'keep', 'problems',
+                                        y_columns=voc_problems)
+        corr_matrix = associations['phi']
+        p_values = associations['p_value']
         
-        # Calculate correlations and p-values
-        corr_matrix = merged_df[keep_cols + voc_problems].corr()
-        p_values = pd.DataFrame(np.zeros_like(corr_matrix), 
-                              index=corr_matrix.index, 
-                              columns=corr_matrix.columns)
+        # Significance is judged on p-values corrected over the whole battery
+        adjusted_p = adjust_pvalues(p_values, self.correction)
+        if self.n_permutations:
+            perm_p = permutation_pvalues(self.matrix.frame('keep'),
+                                         self.matrix.frame('problems')[voc_problems],
+                                         n_permutations=self.n_permutations,
+                                         n_jobs=self.n_jobs)
+            perm_adjusted_p = adjust_pvalues(perm_p, self.correction)
                               
         results = "### Keeping Conditions Impact Analysis\n\n"
         results += "Correlation analysis between keeping conditions and vocalization problems:\n\n"
         
         for i in keep_cols:
             for j in voc_problems:
-                corr, p = stats.pearsonr(merged_df[i], merged_df[j])
-                p_values.loc[i, j] = p
+                corr = corr_matrix.loc[i, j]
+                p = p_values.loc[i, j]
                 
                 results += f"#### {i.replace('keep_', '')} vs {j.replace('problems_', '')}\n"
                 results += f"- Correlation coefficient: {corr:.3f}\n"
                 results += f"- p-value: {p:.4f}\n"
-                if p < 0.05:
+                results += f"- Adjusted p-value ({self.correction}): {adjusted_p.loc[i, j]:.4f}\n"
+                if self.n_permutations:
+                    results += (f"- Permutation p-value ({self.n_permutations} shuffles): "
+                                f"{perm_p.loc[i, j]:.4f} (adjusted: {perm_adjusted_p.loc[i, j]:.4f})\n")
+                if adjusted_p.loc[i, j] < 0.05:
                     results += "- **Statistically significant**\n"
                 results += "\n"
         
         self.append_to_results("Keeping Conditions", results)
+        self.save_figure(FigureSpec(
+            'heatmap', "keeping_vocalization_correlations.png",
+            corr_matrix.rename(index=lambda col: col.replace('keep_', ''),
+                               columns=lambda col: col.replace('problems_', '')),
+            title="Keeping Conditions vs Vocalization Problems (phi)", figsize=(10, 6)))
         return corr_matrix, p_values
 
+    def analyze_adjusted_effects(self, predictors=('keep', 'origin'),
+                                 outcomes=('problems', 'growl', 'howl')):
+        """
+        Adjusted odds ratios of every outcome answer on all predictors.
+        
+        Unlike the pairwise correlations, each odds ratio is adjusted for
+        the other keeping conditions and origins. All outcomes share one
+        design matrix and are fitted together with batched IRLS.
+        
+        Parameters:
+        -----------
+        predictors : iterable of str
+            Blocks entered together as predictors
+        outcomes : iterable of str
+            Blocks whose columns are each modeled as an outcome
+        
+        Returns:
+        --------
+        dict
+            batched_logistic results plus 'p_adjusted' (corrected over all
+            predictor x outcome tests)
+        """
+        if self.matrix is None:
+            print("Required data not loaded")
+            return
+        predictors = [block for block in predictors if block in self.matrix]
+        outcomes = [block for block in outcomes if block in self.matrix]
+        if not predictors or not outcomes:
+            print("Predictor or outcome blocks not loaded")
+            return
+        
+        X = np.hstack([self.matrix.block(block) for block in predictors])
+        Y = np.hstack([self.matrix.block(block) for block in outcomes])
+        x_names = [col for block in predictors for col in self.matrix.columns[block]]
+        y_names = [col for block in outcomes for col in self.matrix.columns[block]]
+        print(f"Fitting {len(y_names)} logistic regressions on {len(x_names)} predictors")
+        fit = batched_logistic(X, Y, x_names, y_names)
+        fit['p_adjusted'] = adjust_pvalues(fit['p_value'], self.correction)
+        
+        results = "### Adjusted Odds Ratios (logistic regression)\n\n"
+        results += (f"Each of {len(y_names)} outcome answers ({', '.join(outcomes)}) regressed on "
+                    f"all {', '.join(predictors)} answers together ({fit['n']} dogs); "
+                    f"p-values corrected with {self.correction} over all tests.\n\n")
+        if fit['dropped']:
+            results += f"Dropped as constant or collinear: {', '.join(fit['dropped'])}\n\n"
+        separated = fit['separated'].stack()
+        separated = separated[separated].index.tolist()
+        if separated:
+            results += "Separation, odds ratios not interpretable (predictor / outcome):\n"
+            results += "".join(f"- {x} / {y}\n" for x, y in separated) + "\n"
+        
+        long = logistic_long(fit, fit['p_adjusted'])
+        significant = long[long['p_adjusted'] < 0.05]
+        if len(significant):
+            results += significant.round(4).reset_index().to_markdown(index=False)
+        else:
+            results += "No odds ratio is significant after correction."
+        results += "\n"
+        
+        self.append_to_results("Keeping Conditions", results)
+        log_odds = np.log2(fit['odds_ratio'].mask(fit['separated'])).dropna(how='all')
+        self.save_figure(FigureSpec(
+            'heatmap', "adjusted_odds_ratios.png", log_odds.T,
+            title="Adjusted log2 Odds Ratios", figsize=(12, 14), fmt='.1f'))
+        return fit
+    
+    def analyze_strata(self):
+        """
+        Growl percentages, keeping-condition associations and cluster x
+        origin tests for every level of the grouping column.
+        
+        The counts of all strata are taken in one pass over the respondent
+        matrix (see stratified.py); the clusters are the ones fitted on all
+        dogs, so strata are compared on the same clusters. Deriving the
+        tests of each stratum runs on the process pool.
+        
+        Returns:
+        --------
+        dict
+            Group level -> stratum summary (see stratified.stratum_summary)
+        """
+        if self.matrix is None or self.strata_file is None:
+            print("Required data not loaded or no strata file given")
+            return
+        
+        groups = read_groups(self.strata_file, self.stratify_by)
+        strata = grouped_statistics(self.matrix, groups, self.clusters, min_size=self.min_stratum)
+        if not strata:
+            print(f"No {self.stratify_by} group has at least {self.min_stratum} dogs")
+            return
+        print(f"Stratified results for {len(strata)} {self.stratify_by} groups")
+        summaries = summarize_strata(strata, n_jobs=self.n_jobs, problems=VOCALIZATION_PROBLEMS,
+                                     correction=self.correction)
+        
+        matched = sum(summary['n'] for summary in summaries.values())
+        results = f"### By {self.stratify_by}\n\n"
+        results += (f"{matched} of {len(self.matrix)} dogs fall in a {self.stratify_by} group "
+                    f"with at least {self.min_stratum} dogs.\n\n")
+        results += pd.Series({level: summary['n'] for level, summary in summaries.items()},
+                             name='dogs').rename_axis(self.stratify_by).to_markdown()
+        
+        if all('growl' in summary for summary in summaries.values()):
+            growl = pd.DataFrame({level: summary['growl'] for level, summary in summaries.items()})
+            growl.index = [col.replace('growl_to_whom_', '') for col in growl.index]
+            results += "\n\n#### Growling targets (% of dogs)\n\n"
+            results += growl.round(1).to_markdown()
+            self.save_figure(FigureSpec(
+                'heatmap', f"growl_by_{self.stratify_by}.png", growl,
+                title=f"Growling Targets by {self.stratify_by} (% of dogs)", figsize=(12, 8),
+                cmap='viridis', center=None, fmt='.1f'))
+        
+        significant = [summary['associations'].assign(**{self.stratify_by: level})
+                       for level, summary in summaries.items() if 'associations' in summary]
+        if significant:
+            significant = pd.concat(significant, ignore_index=True)
+            significant = significant[significant['adjusted_p'] < 0.05]
+            results += "\n\n#### Keeping conditions vs vocalization problems (significant)\n\n"
+            results += (significant.round(4).to_markdown(index=False) if len(significant)
+                        else "No association is significant after correction in any group.")
+        
+        if all('clusters' in summary for summary in summaries.values()):
+            cramers_v = pd.DataFrame({level: summary['clusters']['cramers_v']
+                                      for level, summary in summaries.items()})
+            adjusted = pd.DataFrame({level: summary['clusters']['adjusted_p']
+                                     for level, summary in summaries.items()})
+            results += "\n\n#### Clusters vs origin (Cramer's V)\n\n"
+            results += cramers_v.round(3).to_markdown()
+            results += "\n\nCorrected p-values:\n\n"
+            results += adjusted.round(4).to_markdown()
+        results += "\n"
+        
+        self.append_to_results("Stratified Results", results)
+        return summaries
+    
+    def load_wave(self, wave_dir):
+        """
+        Load a new survey wave: the block CSVs (same names and columns as in
+        raw/) holding only the newly collected respondents.
+        
+        Parameters:
+        -----------
+        wave_dir : str or Path
+            Folder with one CSV per block
+            
+        Returns:
+        --------
+        RespondentMatrix
+            The wave's answers
+            
+        Raises:
+        -------
+        ValueError
+            If a block file has non-binary answers or the blocks do not
+            describe the same respondents
+        """
+        wave_dir = Path(wave_dir)
+        tables = {}
+        for key, filename in self.files.items():
+            df = pd.read_csv(wave_dir / filename, encoding='utf-8-sig')
+            answers = df.drop(columns='ID_full')
+            if not answers.isin((0, 1)).all().all():
+                raise ValueError(f"{filename} in {wave_dir} has non-binary answers")
+            tables[key] = df
+        wave = RespondentMatrix.from_tables(tables, self.prefixes)
+        print(f"Loaded wave {wave_dir.name}: {len(wave)} respondents")
+        return wave
+    
+    def assign_clusters(self, growl):
+        """
+        Assign dogs to the fitted behavioral clusters without refitting.
+        
+        Parameters:
+        -----------
+        growl : numpy.ndarray
+            0/1 growl answers, one row per dog
+            
+        Returns:
+        --------
+        numpy.ndarray
+            Cluster of every dog
+        """
+        if self.cluster_method == 'kmodes':
+            return self.cluster_model.predict(growl)
+        return self.cluster_model.predict(self.cluster_scaler.transform(growl.astype(np.float64)))
+    
+    def update_statistics(self, wave_dir=None):
+        """
+        Fold new respondents into the counts kept under data/cache/stats and
+        report the statistics derived from them.
+        
+        The first call runs the full load and clustering, counts every
+        respondent and freezes the cluster model next to the counts. Later
+        calls only read the new wave (or, without wave_dir, the raw files)
+        and fold in the respondents whose ID_full was not counted yet,
+        assigning them to the frozen clusters. Percentages, phi tables,
+        cluster tests and MCA inertia then follow from the counts alone.
+        
+        Parameters:
+        -----------
+        wave_dir : str or Path, optional
+            Folder with the block CSVs of the new respondents
+            
+        Returns:
+        --------
+        SufficientStatistics
+            The updated counts
+        """
+        model_file = self.stats_dir / "cluster_model.pkl"
+        if not SufficientStatistics.exists(self.stats_dir) or not model_file.exists():
+            print("No saved statistics, counting all respondents")
+            self.load_data()
+            self.analyze_vocalization_patterns()
+            stats = SufficientStatistics.from_matrix(self.matrix, self.clusters,
+                                                     n_clusters=self.cluster_model.n_clusters)
+            self.stats_dir.mkdir(parents=True, exist_ok=True)
+            with open(model_file, 'wb') as f:
+                pickle.dump({'method': self.cluster_method, 'scaler': self.cluster_scaler,
+                             'model': self.cluster_model}, f)
+        else:
+            stats = SufficientStatistics.load(self.stats_dir)
+            with open(model_file, 'rb') as f:
+                frozen = pickle.load(f)
+            self.cluster_method = frozen['method']
+            self.cluster_scaler, self.cluster_model = frozen['scaler'], frozen['model']
+            
+            if wave_dir is not None:
+                wave = self.load_wave(wave_dir)
+            else:
+                self.load_data()
+                wave = self.matrix
+            labels = self.assign_clusters(wave.block('growl'))
+            added = stats.fold(wave, labels)
+            print(f"Folded in {added} new respondents ({len(wave) - added} already counted)")
+        
+        stats.save(self.stats_dir)
+        self.report_statistics(stats)
+        return stats
+    
+    def report_statistics(self, stats):
+        """
+        Write the results derivable from the sufficient statistics.
+        
+        Parameters:
+        -----------
+        stats : SufficientStatistics
+            Counts of all respondents seen so far
+        """
+        results = "### Incremental Update\n\n"
+        results += f"Respondents counted: {stats.n}\n\n"
+        results += pd.DataFrame(stats.waves[-10:]).to_markdown(index=False)
+        results += "\n"
+        
+        if 'growl' in stats.blocks:
+            growl_percentages = stats.percentages('growl').sort_values(ascending=False)
+            results += "\n#### Growling targets (% of dogs)\n\n"
+            for target, percentage in growl_percentages.items():
+                results += f"- {target.replace('growl_to_whom_', '')}: {percentage:.1f}%\n"
+        
+        if 'keep' in stats.blocks and 'problems' in stats.blocks:
+            associations = stats.associations('keep', 'problems', y_columns=VOCALIZATION_PROBLEMS)
+            long_df = associations_long({'phi': associations['phi'],
+                                         'p_value': associations['p_value']})
+            long_df['adjusted_p'] = adjust_pvalues(long_df['p_value'], self.correction)
+            results += "\n#### Keeping conditions vs vocalization problems\n\n"
+            results += long_df.round(4).to_markdown(index=False)
+            results += "\n"
+        
+        if stats.cluster_counts is not None:
+            blocks = [name for name in ('origin', 'keep', 'problems', 'howl') if name in stats.blocks]
+            tests = stats.cluster_contingency(blocks)['tests']
+            tests['adjusted_p'] = adjust_pvalues(tests['p_value'], self.correction)
+            sizes = pd.Series(stats.cluster_sizes, name='dogs').rename_axis('Cluster')
+            results += "\n#### Cluster sizes\n\n"
+            results += sizes.to_markdown()
+            results += "\n\n#### Clusters vs answers (strongest 15 by Cramer's V)\n\n"
+            results += tests.sort_values('cramers_v', ascending=False).head(15).round(4).to_markdown()
+            results += "\n"
+        
+        inertia = {name: stats.mca(name).explained_inertia_ for name in stats.blocks
+                   if len(stats.columns[name]) > 1}
+        results += "\n#### MCA explained inertia (from the Burt matrices)\n\n"
+        results += pd.DataFrame(inertia, index=['Component 1', 'Component 2']).T.round(4).to_markdown()
+        results += "\n"
+        
+        self.append_to_results("Statistical Relationships", results)
+
+    def _load_stage(self):
+        self.load_data()
+        return self.matrix
+    
+    def _vocalization_stage(self, matrix):
+        self.matrix = matrix
+        return self.analyze_vocalization_patterns()
+    
+    def _strata_stage(self, matrix, vocalization):
+        self.matrix = matrix
+        if vocalization is not None:
+            self.clusters = vocalization[1]['Cluster']
+        return self.analyze_strata()
+    
+    def _adjusted_effects_stage(self, matrix):
+        self.matrix = matrix
+        return self.analyze_adjusted_effects()
+    
+    def _latent_classes_stage(self, matrix):
+        self.matrix = matrix
+        return self.analyze_latent_classes()
+    
+    def _origin_stage(self, matrix, vocalization):
+        self.matrix = matrix
+        if vocalization is not None:
+            self.clusters = vocalization[1]['Cluster']
+        return self.analyze_origin_impact()
+    
+    def _hierarchical_stage(self, matrix, vocalization):
+        self.matrix = matrix
+        if vocalization is not None:
+            self.clusters = vocalization[1]['Cluster']
+        return self.analyze_hierarchical_clustering()
+    
+    def _cluster_associations_stage(self, matrix, vocalization):
+        self.matrix = matrix
+        if vocalization is not None:
+            self.clusters = vocalization[1]['Cluster']
+        return self.analyze_cluster_associations()
+    
+    def _keeping_stage(self, matrix):
+        self.matrix = matrix
+        return self.analyze_keeping_conditions_impact()
+    
+    def build_pipeline(self, n_jobs=None):
+        """
+        Declare the analysis steps as a dependency graph.
+        
+        The keeping-conditions, adjusted-effects and latent class analyses
+        only need the loaded data, so they run alongside the clustering;
+        the hierarchical comparison, origin and all-block cluster analyses
+        wait for the clusters. Results are memoized under data/cache/stages,
+        keyed by the raw CSV contents and the settings each step uses.
+        
+        Parameters:
+        -----------
+        n_jobs : int, optional
+            Steps run at the same time (None = as many as are ready)
+            
+        Returns:
+        --------
+        Pipeline
+        """
+        pipeline = Pipeline(self.cache_dir / "stages", n_jobs=n_jobs)
+        tests = {'correction': self.correction, 'n_permutations': self.n_permutations}
+        pipeline.add('load', self._load_stage,
+                     inputs=[self.raw_dir / filename for filename in self.files.values()],
+                     memoize=False)
+        pipeline.add('vocalization', self._vocalization_stage, deps=['load'],
+                     params={'cluster_method': self.cluster_method,
+                             'n_clusters': self.n_clusters,
+                             'k_values': list(self.k_values),
+                             'n_bootstrap': self.n_bootstrap})
+        pipeline.add('hierarchical', self._hierarchical_stage, deps=['load', 'vocalization'])
+        pipeline.add('origin', self._origin_stage, deps=['load', 'vocalization'], params=tests)
+        pipeline.add('keeping', self._keeping_stage, deps=['load'], params=tests)
+        pipeline.add('adjusted_effects', self._adjusted_effects_stage, deps=['load'],
+                     params={'correction': self.correction})
+        pipeline.add('latent_classes', self._latent_classes_stage, deps=['load'],
+                     params={'lca_classes': list(self.lca_classes),
+                             'lca_starts': self.lca_starts})
+        pipeline.add('cluster_associations', self._cluster_associations_stage,
+                     deps=['load', 'vocalization'], params={'correction': self.correction})
+        if self.strata_file is not None:
+            pipeline.add('strata', self._strata_stage, deps=['load', 'vocalization'],
+                         inputs=[self.strata_file],
+                         params={'stratify_by': self.stratify_by,
+                                 'min_stratum': self.min_stratum,
+                                 'correction': self.correction})
+        return pipeline
+    
+    def run_pipeline(self, n_jobs=None, force=(), targets=None):
+        """
+        Run all analyses through the memoizing pipeline and write their
+        sections to the results file in the usual order.
+        
+        Parameters:
+        -----------
+        n_jobs : int, optional
+            Steps run at the same time (None = as many as are ready)
+        force : iterable of str
+            Steps to recompute even if a memoized result exists
+            ('load', 'vocalization', 'hierarchical', 'origin', 'keeping',
+            'adjusted_effects', 'latent_classes', 'cluster_associations',
+            'strata' when a strata file is set)
+        targets : iterable of str, optional
+            Steps to run (with the steps they depend on); None runs all
+            
+        Returns:
+        --------
+        dict
+            Step name -> return value of the analysis method
+        """
+        pipeline = self.build_pipeline(n_jobs)
+        results = pipeline.run(targets=targets, force=force)
+        for section, content in pipeline.sections:
+            self.append_to_results(section, content)
+        for spec in pipeline.figures:
+            self.figure_queue.add(spec)
+        self.render_figures()
+        return results
+
 def main():
     """
     Main execution function that runs the complete analysis pipeline.
@@ -305,23 +1107,53 @@ def main():
     The analysis follows these steps:
     1. Load and validate data
     2. Analyze vocalization patterns
-    3. Study origin impact
-    4. Analyze keeping conditions
-    5. Generate comprehensive results
+    3. Compare with Ward hierarchical clustering (after the clustering)
+    4. Study origin impact (after the clustering)
+    5. Analyze keeping conditions (alongside the clustering)
+    6. Fit adjusted logistic regressions of all outcomes on keeping
+       conditions and origin (alongside the clustering)
+    7. Fit latent class models to the binary blocks (alongside the clustering)
+    8. Cross the clusters with all answer blocks
+    9. With --strata, repeat the main tables per language / country
+    10. Generate comprehensive results
+    
+    Steps whose inputs and settings are unchanged are read from the
+    stage cache instead of being recomputed. Figures are rendered at the
+    end, and only when their data changed; --no-figures skips them.
+    
+    --incremental (or --wave DIR) instead folds new respondents into the
+    counts saved by the previous incremental run and reports the
+    statistics derived from them.
     """
+    parser = argparse.ArgumentParser(description="Dog vocalization analysis")
+    parser.add_argument('--no-figures', action='store_true',
+                        help="skip rendering figures (headless runs)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="fold new respondents into the saved counts instead of "
+                             "rerunning every analysis")
+    parser.add_argument('--wave', type=Path,
+                        help="folder with the block CSVs of a new wave (implies --incremental)")
+    parser.add_argument('--strata', type=Path,
+                        help="table with ID_full and the grouping column for stratified results")
+    parser.add_argument('--stratify-by', default='lang',
+                        help="grouping column of the strata table (default: lang)")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    
     print("Starting Enhanced Dog Vocalization Analysis")
     print("=" * 50)
     
     # Initialize and run analysis
-    analyzer = DogVocalizationAnalysis()
-    
-    # Load data
-    analyzer.load_data()
-    
-    # Perform analyses
-    growl_analysis = analyzer.analyze_vocalization_patterns()
-    analyzer.analyze_origin_impact()
-    keeping_impact = analyzer.analyze_keeping_conditions_impact()
+    analyzer = DogVocalizationAnalysis(figures=not args.no_figures, trace=args.trace,
+                                       trace_memory=args.trace_memory, strata_file=args.strata,
+                                       stratify_by=args.stratify_by)
+    if args.incremental or args.wave:
+        analyzer.update_statistics(args.wave)
+        analyzer.render_figures()
+    else:
+        results = analyzer.run_pipeline()
+    if analyzer.tracer:
+        analyzer.tracer.close()
     
     print("\nAnalysis complete. Results saved in 'analysis_results.md'")
 
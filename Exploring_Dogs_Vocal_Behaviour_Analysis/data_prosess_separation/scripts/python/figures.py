@@ -0,0 +1,255 @@
+"""
+Deferred Figure Rendering
+-------------------------
+
+Rendering 300 dpi PNGs used to happen in the middle of the analyses and
+dominated their wall time. The analyses now only describe a figure as a
+FigureSpec (plot kind, the data to draw and a few style options) and put
+it on a FigureQueue. The queue renders all specs afterwards in a process
+pool, or not at all when figures are disabled (headless runs).
+
+A figure is re-rendered only when the hash of its spec differs from the
+one recorded for the existing PNG (figures.json in the output folder).
+
+Figures are drawn with the object-oriented matplotlib API (no pyplot), so
+the renderers are safe to run in any worker.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FIGURE_KINDS = ('bar', 'heatmap', 'mca_biplot', 'dendrogram')
+
+
+def _update_digest(digest, value):
+    """
+    Feed a value into a hash by content; pickles of equal DataFrames are
+    not byte-identical, so pandas and numpy data are hashed explicitly.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(value.shape).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            _update_digest(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update_digest(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+
+class FigureSpec:
+    """
+    Lightweight description of one figure.
+
+    Attributes:
+    -----------
+    kind : str
+        'bar' (Series or DataFrame bars), 'heatmap' (DataFrame),
+        'mca_biplot' (dict with row and variable coordinates) or
+        'dendrogram' (dict with a linkage matrix and node weights)
+    filename : str
+        PNG file name inside the output folder
+    data : object
+        What the renderer draws
+    style : dict
+        Renderer options (title, xlabel, ylabel, figsize, cmap, ...)
+    """
+
+    def __init__(self, kind, filename, data, **style):
+        if kind not in FIGURE_KINDS:
+            raise ValueError(f"Unknown figure kind '{kind}', "
+                             f"expected one of {', '.join(FIGURE_KINDS)}")
+        self.kind = kind
+        self.filename = filename
+        self.data = data
+        self.style = style
+
+    def digest(self):
+        """Hash of everything that ends up in the image"""
+        digest = hashlib.sha256()
+        _update_digest(digest, (self.kind, self.data, self.style))
+        return digest.hexdigest()
+
+
+def _render_bar(ax, data, style):
+    data.plot(kind='bar', ax=ax, color=style.get('color'), legend=data.ndim > 1)
+    ax.tick_params(axis='x', labelrotation=style.get('rotation', 45))
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+
+
+def _render_heatmap(ax, data, style):
+    import seaborn as sns
+
+    sns.heatmap(data, ax=ax, annot=style.get('annot', True), fmt=style.get('fmt', '.2f'),
+                cmap=style.get('cmap', 'RdBu_r'), center=style.get('center', 0))
+
+
+def _render_mca_biplot(ax, data, style):
+    from matplotlib.collections import LineCollection
+
+    # Distinct answer patterns, sized by the number of dogs giving them
+    rows = np.asarray(data['rows'])
+    counts = np.asarray(data['counts'], dtype=np.float64)
+    ax.scatter(rows[:, 0], rows[:, 1], s=4 + 36 * np.sqrt(counts / counts.max()),
+               alpha=0.3, color='gray', label='Dogs')
+
+    # All variable rays and points in one call each
+    var_coords = data['variables']
+    points = var_coords.iloc[:, :2].to_numpy()
+    ax.add_collection(LineCollection([[(0, 0), tuple(p)] for p in points],
+                                     colors='red', alpha=0.5))
+    ax.scatter(points[:, 0], points[:, 1], color='red')
+    for name, (x, y) in zip(var_coords.index, points):
+        ax.annotate(name.replace('_', ' ').title(), (x, y), xytext=(5, 5),
+                    textcoords='offset points', fontsize=8, alpha=0.8)
+
+    ax.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+    ax.axvline(x=0, color='k', linestyle='-', alpha=0.3)
+    ax.grid(True, alpha=0.3)
+    explained = data['explained']
+    ax.set_xlabel(f"Component 1 ({explained[0]*100:.1f}%)")
+    ax.set_ylabel(f"Component 2 ({explained[1]*100:.1f}%)")
+
+
+def _render_dendrogram(ax, data, style):
+    from matplotlib.collections import LineCollection
+    from scipy.cluster.hierarchy import dendrogram
+
+    # Only the top merges are drawn; every leaf is labeled with its dogs
+    tree = dendrogram(data['linkage'], no_plot=True, truncate_mode='lastp',
+                      p=style.get('leaves', 30), color_threshold=data.get('threshold'))
+    segments = [list(zip(x, y)) for x, y in zip(tree['icoord'], tree['dcoord'])]
+    ax.add_collection(LineCollection(segments, colors=tree['color_list']))
+    n_leaves = len(tree['leaves'])
+    ax.set_xticks(5 + 10 * np.arange(n_leaves))
+    ax.set_xticklabels([f"({weight:.0f})" for weight in data['weights'][tree['leaves']]],
+                       rotation=90, fontsize=8)
+    ax.set_xlim(0, 10 * n_leaves)
+    ax.set_ylim(0, max(max(y) for y in tree['dcoord']) * 1.05)
+    if data.get('threshold') is not None:
+        ax.axhline(y=data['threshold'], color='k', linestyle='--', alpha=0.5)
+
+
+_RENDERERS = {
+    'bar': _render_bar,
+    'heatmap': _render_heatmap,
+    'mca_biplot': _render_mca_biplot,
+    'dendrogram': _render_dendrogram,
+}
+
+
+def render_figure(spec, path, dpi=300):
+    """Draw one spec and save it as a PNG (runs in a worker process)"""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=spec.style.get('figsize', (12, 8)))
+    ax = fig.add_subplot()
+    _RENDERERS[spec.kind](ax, spec.data, spec.style)
+    if 'title' in spec.style:
+        ax.set_title(spec.style['title'])
+    if 'xlabel' in spec.style:
+        ax.set_xlabel(spec.style['xlabel'])
+    if 'ylabel' in spec.style:
+        ax.set_ylabel(spec.style['ylabel'])
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    return path.name
+
+
+class FigureQueue:
+    """
+    Collects FigureSpecs during an analysis and renders them afterwards.
+    """
+
+    def __init__(self, output_dir, enabled=True, n_jobs=None, dpi=300):
+        """
+        Parameters:
+        -----------
+        output_dir : str or Path
+            Folder the PNGs are written to
+        enabled : bool
+            False drops every queued figure (headless / --no-figures runs)
+        n_jobs : int, optional
+            Worker processes; None uses all cores, 1 renders in-process
+        dpi : int
+            Resolution of the saved PNGs
+        """
+        self.output_dir = Path(output_dir)
+        self.enabled = enabled
+        self.n_jobs = n_jobs
+        self.dpi = dpi
+        self.index_file = self.output_dir / "figures.json"
+        self.specs = {}
+
+    def add(self, spec):
+        """Queue a figure; a later spec with the same filename replaces it"""
+        if self.enabled:
+            self.specs[spec.filename] = spec
+
+    def __len__(self):
+        return len(self.specs)
+
+    def _load_index(self):
+        if self.index_file.exists():
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def render(self):
+        """
+        Render every queued figure whose data changed since its PNG was
+        written, then empty the queue.
+
+        Returns:
+        --------
+        list of str
+            File names that were (re-)rendered
+        """
+        if not self.specs:
+            return []
+
+        index = self._load_index()
+        digests = {name: spec.digest() for name, spec in self.specs.items()}
+        stale = [name for name in self.specs
+                 if index.get(name) != digests[name] or not (self.output_dir / name).exists()]
+        skipped = len(self.specs) - len(stale)
+        if skipped:
+            print(f"Skipping {skipped} unchanged figures")
+
+        rendered = []
+        if stale:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            args = [(self.specs[name], self.output_dir / name, self.dpi) for name in stale]
+            if self.n_jobs == 1 or len(args) == 1:
+                rendered = [render_figure(*a) for a in args]
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                    rendered = list(pool.map(render_figure, *zip(*args)))
+            for name in rendered:
+                index[name] = digests[name]
+                print(f"Saved figure: {name}")
+
+            tmp = self.index_file.with_suffix('.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.index_file)
+
+        self.specs = {}
+        return rendered
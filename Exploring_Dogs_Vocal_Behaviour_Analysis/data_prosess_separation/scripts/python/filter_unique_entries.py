@@ -4,44 +4,446 @@ Filter Unique Entries Script
 This script filters the main dataset to keep only unique entries
 where fill=1 and repfilt_full=1.
 
+The workbook is streamed row by row (openpyxl read-only mode) and the
+predicates are applied on the fly, so the base export is never held in
+memory as a whole. Matching rows are written in chunks to a columnar file
+(Parquet by default, Feather or CSV on request); the dated .xlsx copy is
+optional because writing Excel is the slowest part of the step.
+
+Parquet / Feather outputs get compact column types (see
+scripts/python/compact_dtypes.py) decided on the kept rows, e.g. int8 flags,
+integer IDs and categories, whichever of the two paths below wrote them.
+
+When the shared content-hash cache (scripts/python/data_cache.py) already
+holds a converted copy of the current workbook, that copy is filtered
+instead and the workbook is not opened at all.
+
 Author: Cline
 Date: 2024
 """
 
-import pandas as pd
-from datetime import datetime
+import argparse
+import csv
+from datetime import date, datetime
 from pathlib import Path
 
-def filter_unique_entries():
+import shared_paths  # noqa: F401 - makes scripts/python importable
+from data_cache import DataCache
+from instrumentation import add_trace_arguments, span, start_tracing, traced
+
+OUTPUT_FORMATS = ('parquet', 'feather', 'csv', 'xlsx')
+
+
+def _fits(value, kind):
+    """Whether a non-empty cell can be stored in a column of the given type"""
+    if kind == 'number':
+        return isinstance(value, (int, float))
+    if kind == 'datetime':
+        return isinstance(value, (datetime, date))
+    return True
+
+
+def _text(value):
+    """Cell value as text; whole-number floats drop the '.0', so 7 and 7.0 read the same"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _infer_column_types(header, rows):
+    """
+    Decide a column type from the first chunk of rows: 'number' when all
+    values are numeric, 'datetime' when all are dates, 'string' otherwise.
+    """
+    types = []
+    for i, _ in enumerate(header):
+        values = [row[i] for row in rows if row[i] is not None]
+        if values and all(_fits(v, 'number') for v in values):
+            types.append('number')
+        elif values and all(_fits(v, 'datetime') for v in values):
+            types.append('datetime')
+        else:
+            types.append('string')
+    return types
+
+
+def _is_mixed(column):
+    """Whether an object column mixes numbers, dates and text"""
+    import pandas as pd
+
+    return (column.dtype == object and pd.api.types.infer_dtype(column, skipna=True)
+            not in ('string', 'empty', 'datetime', 'date'))
+
+
+def _as_text(column):
+    """A column as text, formatted like the cells the streaming writer widens"""
+    import pandas as pd
+
+    return column.astype(object).map(lambda value: None if pd.isna(value) else _text(value))
+
+
+def _output_dtype(column):
+    """
+    Type of a column in the Parquet / Feather output.
+
+    The compact type of compact_dtypes (small integers, nullable integers,
+    categories, float32 where lossless), decided on the kept rows only, so
+    the streamed workbook and a cached copy give the same output schema.
+    Columns mixing numbers and text are typed as their text.
+
+    Parameters:
+    -----------
+    column : pandas.Series
+        Kept values of one column
+
+    Returns:
+    --------
+    str or pandas dtype
+        dtype for Series.astype; 'text' for a mixed column that is not
+        stored as a category
+    """
+    import pandas as pd
+    from compact_dtypes import infer_column_dtype
+
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(column.cat.categories.dtype)
+    mixed = _is_mixed(column)
+    if mixed:
+        column = _as_text(column)
+    values = column.dropna()
+    if not len(values):
+        return 'float64'
+    if pd.api.types.is_datetime64_any_dtype(column.dtype) or (
+            column.dtype == object and pd.api.types.infer_dtype(values) in ('datetime', 'date')):
+        return 'datetime64[us]'
+    dtype = infer_column_dtype(column)
+    if dtype == 'category':
+        return pd.CategoricalDtype(pd.Index(values.unique()).sort_values())
+    return 'text' if mixed else dtype
+
+
+def _to_output(df, dtypes):
+    """Convert the columns of a frame to their output types"""
+    import pandas as pd
+
+    converted = {}
+    for name, dtype in dtypes.items():
+        column = df[name]
+        if _is_mixed(column):
+            column = converted[name] = _as_text(column)
+        if isinstance(dtype, str) and dtype == 'text':
+            continue
+        if str(column.dtype) != str(dtype) or isinstance(dtype, pd.CategoricalDtype):
+            converted[name] = column.astype(dtype)
+    return df.assign(**converted) if converted else df
+
+
+class _ColumnarWriter:
+    """
+    Chunked writer for the Parquet / Feather outputs.
+
+    Rows are spooled to a temporary Parquet file whose column types come
+    from the first chunk. When a later chunk holds a value that does not
+    fit its column (text in a numeric column, say), the column is widened
+    to string: the chunks spooled so far are copied batch by batch into a
+    spool with the wider schema. On close, the output types are decided
+    one column at a time (_output_dtype) and the spool is copied batch by
+    batch into every output file, so the kept rows are never held in
+    memory as a whole.
+    """
+
+    def __init__(self, outputs, header, types):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.outputs = outputs
+        self.spool = next(iter(outputs.values())).with_suffix('.spool.parquet')
+        self.header = header
+        self.types = list(types)
+        self.widened = []
+        self._open()
+
+    def _open(self):
+        import pyarrow.parquet as pq
+
+        pa = self.pa
+        arrow_types = {'number': pa.float64(), 'datetime': pa.timestamp('us'), 'string': pa.string()}
+        self.schema = pa.schema([(name, arrow_types[t]) for name, t in zip(self.header, self.types)])
+        self.writer = pq.ParquetWriter(self.spool, self.schema)
+
+    def _widen(self, columns):
+        """Switch columns to string and rewrite what has been spooled so far"""
+        import pyarrow.parquet as pq
+
+        self.writer.close()
+        partial = self.spool.with_name(self.spool.name + '.partial')
+        self.spool.replace(partial)
+        for i in columns:
+            self.types[i] = 'string'
+            self.widened.append(self.header[i])
+        self._open()
+        try:
+            # Old and new cells go through the same formatter (_text)
+            for batch in pq.ParquetFile(partial).iter_batches():
+                arrays = [self.pa.array([self._convert(v, 'string') for v in column.to_pylist()],
+                                        type=self.pa.string()) if i in columns else column
+                          for i, column in enumerate(batch.columns)]
+                self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        finally:
+            partial.unlink()
+
+    @staticmethod
+    def _convert(value, kind):
+        if value is None:
+            return None
+        if kind == 'number':
+            return float(value)
+        if kind == 'datetime':
+            return value
+        return _text(value)
+
+    def write(self, rows):
+        misfits = [i for i, kind in enumerate(self.types) if kind != 'string'
+                   and any(row[i] is not None and not _fits(row[i], kind) for row in rows)]
+        if misfits:
+            self._widen(misfits)
+        columns = [
+            self.pa.array([self._convert(row[i], kind) for row in rows], type=self.schema.field(i).type)
+            for i, kind in enumerate(self.types)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def _finish(self):
+        """Copy the spool into the output files with their output types"""
+        import pyarrow.parquet as pq
+
+        pa = self.pa
+        spool = pq.ParquetFile(self.spool)
+        dtypes = {name: _output_dtype(spool.read(columns=[name]).column(0).to_pandas())
+                  for name in self.header}
+        tables = ([pa.Table.from_batches([batch]) for batch in spool.iter_batches()]
+                  if spool.metadata.num_rows else [spool.read()])
+        schema, writers = None, {}
+        try:
+            for table in tables:
+                frame = _to_output(table.to_pandas(), dtypes)
+                if schema is None:
+                    # Columns without any value in the first batch are typed
+                    # by their later values: text columns are strings
+                    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+                    for i, field in enumerate(schema):
+                        if pa.types.is_null(field.type):
+                            schema = schema.set(i, field.with_type(pa.string()))
+                    for fmt, path in self.outputs.items():
+                        if fmt == 'parquet':
+                            writers[fmt] = pq.ParquetWriter(path, schema)
+                        else:
+                            import pyarrow.feather  # noqa: F401 - registers the IPC file writer
+                            writers[fmt] = pa.ipc.new_file(str(path), schema)
+                table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+                for writer in writers.values():
+                    writer.write_table(table)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    def close(self):
+        self.writer.close()
+        try:
+            self._finish()
+        finally:
+            self.spool.unlink(missing_ok=True)
+
+
+class _CsvWriter:
+    def __init__(self, path, header):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _XlsxWriter:
+    def __init__(self, path, header):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append(header)
+
+    def write(self, rows):
+        for row in rows:
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+def _filter_cached(cached_df, output_files):
+    """Filter an already converted copy of the workbook and write the outputs"""
+    filtered_df = cached_df[
+        (cached_df['fill'] == 1) &
+        (cached_df['repfilt_full'] == 1)
+    ]
+    columnar_df = filtered_df
+    if {'parquet', 'feather'} & set(output_files):
+        # The same output types as the streamed workbook gets
+        dtypes = {name: _output_dtype(filtered_df[name]) for name in filtered_df.columns}
+        columnar_df = _to_output(filtered_df, dtypes)
+        widened = [str(name) for name in filtered_df.columns if _is_mixed(filtered_df[name])]
+        if widened:
+            print(f"Stored as text because they mix numbers and text: {', '.join(widened)}")
+    for fmt, path in output_files.items():
+        if fmt == 'parquet':
+            columnar_df.to_parquet(path, index=False)
+        elif fmt == 'feather':
+            columnar_df.reset_index(drop=True).to_feather(path)
+        elif fmt == 'csv':
+            filtered_df.to_csv(path, index=False)
+        else:
+            filtered_df.to_excel(path, index=False)
+    return cached_df.shape, filtered_df.shape
+
+
+@traced
+def filter_unique_entries(input_file=None, output_dir=None, formats=('parquet',),
+                          chunk_size=50000, use_cache=True):
+    """
+    Stream the base workbook and keep rows with fill == 1 and repfilt_full == 1.
+
+    Parameters:
+    -----------
+    input_file : str or Path, optional
+        Workbook to filter; defaults to base_data/raw/DATA_STONE_BASE.xlsx
+    output_dir : str or Path, optional
+        Where the dated output files go; defaults to the input's folder
+    formats : tuple of str
+        Any of 'parquet', 'feather', 'csv', 'xlsx'
+    chunk_size : int
+        Number of matching rows buffered before they are written
+    use_cache : bool
+        Filter the cached converted copy of the workbook when one exists
+
+    Returns:
+    --------
+    dict
+        Output format -> written file path
+    """
+    from openpyxl import load_workbook
+
+    unknown = set(formats) - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown output formats: {', '.join(sorted(unknown))}")
+
     # Set up paths
     base_dir = Path(__file__).parent.parent.parent.parent
-    input_file = base_dir / "base_data" / "raw" / "DATA_STONE_BASE.xlsx"
-    
+    input_file = Path(input_file) if input_file else base_dir / "base_data" / "raw" / "DATA_STONE_BASE.xlsx"
+    output_dir = Path(output_dir) if output_dir else input_file.parent
+    output_dir.mkdir(parents=True, exist_ok=True)
+
     # Get current date for output filename
     current_date = datetime.now().strftime('%Y%m%d')
-    output_file = base_dir / "base_data" / "raw" / f"DATA_STONE_BASE_{current_date}.xlsx"
-    
+    output_files = {fmt: output_dir / f"{input_file.stem}_{current_date}.{fmt}"
+                    for fmt in formats}
+
     print(f"Reading data from: {input_file}")
-    
-    # Read the Excel file
-    df = pd.read_excel(input_file)
-    
-    # Print original shape
-    print(f"\nOriginal dataset shape: {df.shape}")
-    
-    # Filter for unique entries (fill=1 and repfilt_full=1)
-    filtered_df = df[
-        (df['fill'] == 1) & 
-        (df['repfilt_full'] == 1)
-    ]
-    
-    # Print filtered shape
-    print(f"Filtered dataset shape: {filtered_df.shape}")
-    print(f"Removed {df.shape[0] - filtered_df.shape[0]} duplicate/invalid entries")
-    
-    # Save filtered dataset
-    filtered_df.to_excel(output_file, index=False)
-    print(f"\nSaved filtered dataset to: {output_file}")
+
+    if use_cache:
+        cache = DataCache()
+        cached = cache.lookup(input_file, compact=True) or cache.lookup(input_file)
+        if cached is not None:
+            print(f"Using cached copy: {cached.name}")
+            with span("filter_unique_entries.cached") as record:
+                original_shape, filtered_shape = _filter_cached(cache.read_table(input_file, compact=True),
+                                                                output_files)
+                record['outputs'] = [list(original_shape), list(filtered_shape)]
+            print(f"\nOriginal dataset shape: {original_shape}")
+            print(f"Filtered dataset shape: {filtered_shape}")
+            print(f"Removed {original_shape[0] - filtered_shape[0]} duplicate/invalid entries")
+            for path in output_files.values():
+                print(f"\nSaved filtered dataset to: {path}")
+            return output_files
+
+    # Stream the first worksheet in read-only mode
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = [str(name) if name is not None else f"Unnamed: {i}"
+              for i, name in enumerate(next(rows))]
+
+    missing = [col for col in ('fill', 'repfilt_full') if col not in header]
+    if missing:
+        workbook.close()
+        raise KeyError(f"Columns not found in {input_file.name}: {', '.join(missing)}")
+    fill_idx = header.index('fill')
+    repfilt_idx = header.index('repfilt_full')
+
+    writers = {}
+    buffer = []
+    n_total = n_kept = 0
+
+    def flush():
+        if not writers:
+            columnar = {fmt: path for fmt, path in output_files.items() if fmt in ('parquet', 'feather')}
+            if columnar:
+                writers['columnar'] = _ColumnarWriter(columnar, header,
+                                                      _infer_column_types(header, buffer))
+            for fmt, path in output_files.items():
+                if fmt == 'csv':
+                    writers[fmt] = _CsvWriter(path, header)
+                elif fmt == 'xlsx':
+                    writers[fmt] = _XlsxWriter(path, header)
+        for writer in writers.values():
+            writer.write(buffer)
+        buffer.clear()
+
+    with span("filter_unique_entries.stream") as record:
+        try:
+            # Filter for unique entries (fill=1 and repfilt_full=1)
+            for row in rows:
+                n_total += 1
+                if row[fill_idx] == 1 and row[repfilt_idx] == 1:
+                    # Short rows (trailing empty cells) are padded to the header
+                    buffer.append(row + (None,) * (len(header) - len(row)))
+                    n_kept += 1
+                    if len(buffer) >= chunk_size:
+                        flush()
+            flush()
+        finally:
+            workbook.close()
+            for writer in writers.values():
+                writer.close()
+        record['outputs'] = [[n_total, len(header)], [n_kept, len(header)]]
+
+    # Print original and filtered shapes
+    print(f"\nOriginal dataset shape: ({n_total}, {len(header)})")
+    print(f"Filtered dataset shape: ({n_kept}, {len(header)})")
+    print(f"Removed {n_total - n_kept} duplicate/invalid entries")
+
+    widened = sorted({name for writer in writers.values() for name in getattr(writer, 'widened', [])})
+    if widened:
+        print(f"Stored as text because later rows did not match the first chunk: {', '.join(widened)}")
+
+    for fmt, path in output_files.items():
+        print(f"\nSaved filtered dataset to: {path}")
+    return output_files
 
 if __name__ == "__main__":
-    filter_unique_entries()
+    parser = argparse.ArgumentParser(description="Keep unique entries of the base workbook")
+    parser.add_argument('--formats', nargs='+', default=['parquet'], choices=OUTPUT_FORMATS,
+                        help="output file formats")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    
+    tracer = None
+    if args.trace:
+        tracer = start_tracing(Path(__file__).parent.parent.parent / "data" / "processed",
+                               "filter", args.trace, args.trace_memory)
+    filter_unique_entries(formats=tuple(args.formats))
+    if tracer:
+        tracer.close()
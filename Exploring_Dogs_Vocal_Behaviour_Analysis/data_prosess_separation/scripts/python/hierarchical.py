@@ -0,0 +1,176 @@
+"""
+Memory-Bounded Ward Clustering
+------------------------------
+
+The R analysis (Cluster_R/scripts/03_clustering_analysis.R) runs
+hclust(dist(scaled_data), method = "ward.D2"), which needs the full
+n x n distance matrix. This module builds the same Ward dendrogram in
+linear memory:
+
+1. Identical answer patterns are merged first by Ward at height 0, so the
+   tree above height 0 equals Ward on the distinct patterns, each carrying
+   its number of dogs as weight (see patterns.py). For the growl block this
+   pre-clustered summary has a few hundred rows instead of thousands of dogs.
+2. The weighted patterns are merged with the nearest-neighbor-chain
+   algorithm. Distances from the chain's tip to all active clusters are
+   computed on the fly from centroids and sizes, so memory is
+   O(patterns x columns), never O(patterns^2).
+
+Merge heights follow ward.D2 / scipy's 'ward' convention,
+sqrt(2 |A| |B| / (|A| + |B|)) * ||c_A - c_B||, so the linkage matrix can
+be used with scipy.cluster.hierarchy (fcluster, dendrogram).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import fcluster
+
+from stability import adjusted_rand_from_table, weighted_table
+
+
+def _ward_heights(centroids, sizes, i, active):
+    """ward.D2 merge height of cluster i with every active cluster"""
+    diff = centroids[active] - centroids[i]
+    sq = np.einsum('ij,ij->i', diff, diff)
+    return np.sqrt(2 * sizes[i] * sizes[active] / (sizes[i] + sizes[active]) * sq)
+
+
+def ward_linkage(X, sample_weight=None):
+    """
+    Ward (ward.D2) hierarchical clustering with the nearest-neighbor chain.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray
+        Rows to cluster, e.g. standardized distinct answer patterns
+    sample_weight : numpy.ndarray, optional
+        Number of dogs behind every row; 1 per row if omitted
+
+    Returns:
+    --------
+    numpy.ndarray
+        scipy linkage matrix of shape (n_rows - 1, 4): merged cluster ids,
+        merge height and number of rows in the new cluster (node_weights
+        gives the number of dogs)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n = X.shape[0]
+    sizes = np.ones(n) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    if n < 2:
+        return np.empty((0, 4))
+
+    # Slots 0..n-1 hold the active clusters; a merge reuses the slot of one
+    # of the two clusters and deactivates the other
+    centroids = X.copy()
+    sizes = sizes.copy()
+    is_active = np.ones(n, dtype=bool)
+    merges = np.empty((n - 1, 3))          # slot a, slot b, height
+    chain = []
+
+    for step in range(n - 1):
+        if not chain:
+            chain.append(int(np.flatnonzero(is_active)[0]))
+        while True:
+            tip = chain[-1]
+            is_active[tip] = False
+            candidates = np.flatnonzero(is_active)
+            is_active[tip] = True
+            heights = _ward_heights(centroids, sizes, tip, candidates)
+            best = candidates[np.argmin(heights)]
+            # Prefer the previous chain element on ties, which guarantees
+            # that reciprocal nearest neighbors are found
+            if len(chain) > 1:
+                previous = chain[-2]
+                if heights[np.searchsorted(candidates, previous)] <= heights.min():
+                    best = previous
+            if len(chain) > 1 and best == chain[-2]:
+                break
+            chain.append(int(best))
+
+        a, b = chain.pop(), chain.pop()
+        merges[step] = (a, b, heights.min())
+        total = sizes[a] + sizes[b]
+        centroids[a] = (sizes[a] * centroids[a] + sizes[b] * centroids[b]) / total
+        sizes[a] = total
+        is_active[b] = False
+
+    return _to_linkage(merges, n)
+
+
+def _to_linkage(merges, n):
+    """
+    Sort the chain's merges by height and renumber clusters the scipy way
+    (leaves 0..n-1, the cluster made at step i gets id n + i).
+    """
+    order = np.argsort(merges[:, 2], kind='stable')
+    parent = np.arange(n)
+    cluster_id = np.arange(n)               # scipy id of the cluster rooted at a leaf
+    sizes = np.ones(n)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    Z = np.empty((n - 1, 4))
+    for step, i in enumerate(order):
+        a, b = find(int(merges[i, 0])), find(int(merges[i, 1]))
+        left, right = sorted((cluster_id[a], cluster_id[b]))
+        Z[step] = (left, right, merges[i, 2], sizes[a] + sizes[b])
+        parent[b] = a
+        sizes[a] += sizes[b]
+        cluster_id[a] = n + step
+    return Z
+
+
+def node_weights(Z, sample_weight):
+    """
+    Number of dogs under every node of a linkage: leaves 0..n-1 first, then
+    the merged clusters n..2n-2.
+    """
+    n = len(Z) + 1
+    weights = np.empty(2 * n - 1)
+    weights[:n] = sample_weight
+    for step, (left, right) in enumerate(Z[:, :2].astype(np.int64)):
+        weights[n + step] = weights[left] + weights[right]
+    return weights
+
+
+def cut_tree(Z, n_clusters):
+    """
+    Cut a linkage into n_clusters flat clusters (like R's cutree).
+
+    Returns:
+    --------
+    numpy.ndarray
+        Cluster 0..n_clusters-1 of every leaf, numbered by first appearance
+    """
+    labels = fcluster(Z, n_clusters, criterion='maxclust')
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first))
+    return rank[inverse]
+
+
+def agreement_table(kmeans_labels, hierarchical_labels, sample_weight=None):
+    """
+    Cross-tabulate two clusterings of the same rows (R's
+    table(kmeans = ..., hierarchical = ...)).
+
+    Returns:
+    --------
+    table : pandas.DataFrame
+        k-means clusters x hierarchical clusters, number of dogs
+    ari : float
+        Adjusted Rand index between the two clusterings
+    """
+    kmeans_labels = np.asarray(kmeans_labels)
+    hierarchical_labels = np.asarray(hierarchical_labels)
+    weights = (np.ones(len(kmeans_labels)) if sample_weight is None
+               else np.asarray(sample_weight, dtype=np.float64))
+    n_rows, n_cols = kmeans_labels.max() + 1, hierarchical_labels.max() + 1
+    counts = weighted_table(kmeans_labels, hierarchical_labels, weights, n_rows, n_cols)
+    table = pd.DataFrame(counts.astype(np.int64),
+                         index=pd.Index(range(n_rows), name='kmeans'),
+                         columns=pd.Index(range(n_cols), name='hierarchical'))
+    return table, adjusted_rand_from_table(counts)
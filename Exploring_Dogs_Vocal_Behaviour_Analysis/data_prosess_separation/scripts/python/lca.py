@@ -0,0 +1,240 @@
+"""
+Latent Class Analysis
+---------------------
+
+K-means on standardized 0/1 answers treats "yes" and "no" as points on a
+continuous scale. Latent class analysis models the answers directly: every
+dog belongs to one of k unobserved classes, and within a class each
+question is answered "yes" independently with a class-specific
+probability (a Bernoulli mixture).
+
+The mixture is fitted with EM, vectorized over everything but iterations:
+- the rows are the distinct answer patterns weighted by their number of
+  dogs (see patterns.py), which gives the same likelihood as every dog
+- a batch of random starts is fitted at once; the E-step for all starts,
+  patterns and classes is one batched matrix product over log-probabilities
+  followed by a log-sum-exp, and the M-step is one weighted product;
+  starts drop out of the batch as soon as they converge
+- batches of starts for every number of classes are spread over a process
+  pool
+
+Models are compared with BIC (lower is better) and the relative entropy of
+the class assignments (near 1 = well separated classes).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.special import logsumexp
+
+# Class-conditional probabilities are kept away from 0 and 1, so a class
+# that never answers "yes" does not give log(0)
+PROBABILITY_FLOOR = 1e-6
+
+
+def _log_components(X, log_weights, log_p, log_q):
+    """
+    log(pi_k) + log P(x | class k) for every start, row and class.
+
+    Shapes: X (n, p), log_weights (s, k), log_p / log_q (s, k, p) with
+    log_q = log(1 - p); returns (s, n, k).
+    """
+    # x log p + (1 - x) log q = x (log p - log q) + sum(log q)
+    return (X @ (log_p - log_q).transpose(0, 2, 1)
+            + log_q.sum(axis=2)[:, None, :] + log_weights[:, None, :])
+
+
+def _em_batch(X, counts, n_classes, n_starts, seed, max_iter, tol):
+    """
+    Fit n_starts random starts at once (runs in a worker process).
+
+    Returns the class weights, conditional probabilities, log-likelihood
+    and iteration count of the best start.
+    """
+    rng = np.random.default_rng(seed)
+    n_dogs = counts.sum()
+    # Random starts: conditional probabilities drawn around the overall
+    # "yes" rates, equal class weights
+    rates = np.clip(counts @ X / n_dogs, 0.05, 0.95)
+    probs = np.clip(rates + rng.uniform(-0.25, 0.25, (n_starts, n_classes, X.shape[1])),
+                    0.02, 0.98)
+    class_weights = np.full((n_starts, n_classes), 1 / n_classes)
+
+    log_likelihood = np.full(n_starts, -np.inf)
+    active = np.arange(n_starts)
+    for iteration in range(1, max_iter + 1):
+        # E-step for all starts that have not converged yet
+        weights, p = class_weights[active], probs[active]
+        log_joint = _log_components(X, np.log(weights), np.log(p), np.log1p(-p))
+        log_rows = logsumexp(log_joint, axis=2)
+        new_log_likelihood = log_rows @ counts
+        done = (np.abs(new_log_likelihood - log_likelihood[active])
+                < tol * np.abs(new_log_likelihood))
+        log_likelihood[active] = new_log_likelihood
+        keep = ~done
+        active = active[keep]
+        if not len(active):
+            break
+
+        # M-step: weighted class sizes and "yes" rates per class
+        responsibilities = np.exp(log_joint[keep] - log_rows[keep][:, :, None]) * counts[None, :, None]
+        sizes = responsibilities.sum(axis=1)
+        class_weights[active] = np.maximum(sizes / n_dogs, 1e-12)
+        probs[active] = np.clip(responsibilities.transpose(0, 2, 1) @ X
+                                / np.maximum(sizes, 1e-12)[:, :, None],
+                                PROBABILITY_FLOOR, 1 - PROBABILITY_FLOOR)
+    else:
+        # Out of iterations: score the parameters of the last M-step
+        weights, p = class_weights[active], probs[active]
+        log_joint = _log_components(X, np.log(weights), np.log(p), np.log1p(-p))
+        log_likelihood[active] = logsumexp(log_joint, axis=2) @ counts
+
+    best = int(np.argmax(log_likelihood))
+    return class_weights[best], probs[best], float(log_likelihood[best]), iteration
+
+
+class LatentClassModel:
+    """
+    A fitted Bernoulli mixture.
+
+    Attributes:
+    -----------
+    n_classes : int
+        Number of latent classes
+    weights_ : numpy.ndarray
+        Share of dogs in every class, ordered from the largest class
+    conditional_ : numpy.ndarray
+        Classes x columns probability of answering "yes"
+    log_likelihood_ : float
+        Log-likelihood of the dogs the model was fitted on
+    n_iter_ : int
+        EM iterations of the best start
+    """
+
+    def __init__(self, class_weights, conditional, log_likelihood, n_iter, columns=None):
+        order = np.argsort(-class_weights, kind='stable')
+        self.weights_ = class_weights[order]
+        self.conditional_ = conditional[order]
+        self.n_classes = len(order)
+        self.log_likelihood_ = log_likelihood
+        self.n_iter_ = n_iter
+        self.columns = columns
+
+    @property
+    def n_parameters(self):
+        """Free parameters: k - 1 class weights and k x columns probabilities"""
+        return self.n_classes - 1 + self.conditional_.size
+
+    def predict_proba(self, X):
+        """Posterior class probabilities of every row"""
+        X = np.asarray(X, dtype=np.float64)
+        probs = self.conditional_[None]
+        log_joint = _log_components(X, np.log(self.weights_)[None], np.log(probs),
+                                    np.log1p(-probs))[0]
+        return np.exp(log_joint - logsumexp(log_joint, axis=1, keepdims=True))
+
+    def predict(self, X):
+        """Most likely class of every row"""
+        return self.predict_proba(X).argmax(axis=1)
+
+    def entropy(self, X, sample_weight=None):
+        """
+        Relative entropy of the class assignments, 1 - E / (n log k):
+        1 when every dog is assigned with certainty, 0 when the posteriors
+        are uniform.
+        """
+        if self.n_classes == 1:
+            return 1.0
+        posterior = self.predict_proba(X)
+        weights = (np.ones(len(posterior)) if sample_weight is None
+                   else np.asarray(sample_weight, dtype=np.float64))
+        row_entropy = -(posterior * np.log(np.maximum(posterior, 1e-300))).sum(axis=1)
+        return 1 - (row_entropy @ weights) / (weights.sum() * np.log(self.n_classes))
+
+    def profiles(self):
+        """Classes x columns "yes" probabilities as a DataFrame"""
+        return pd.DataFrame(self.conditional_, columns=self.columns,
+                            index=pd.Index(range(self.n_classes), name='Class'))
+
+
+def select_classes(X, class_values=range(2, 7), sample_weight=None, columns=None,
+                   n_starts=50, batch_size=10, max_iter=500, tol=1e-8,
+                   n_jobs=None, seed=42):
+    """
+    Fit latent class models for several numbers of classes and pick the
+    one with the lowest BIC.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray
+        0/1 matrix, e.g. the distinct answer patterns of a block
+    class_values : iterable of int
+        Candidate numbers of classes
+    sample_weight : numpy.ndarray, optional
+        Number of dogs behind every row (pattern counts); 1 per row if omitted
+    columns : list of str, optional
+        Column names, kept for LatentClassModel.profiles
+    n_starts : int
+        Random starts per number of classes; the best is kept
+    batch_size : int
+        Starts fitted together in one worker task
+    max_iter : int
+        Maximum EM iterations per start
+    tol : float
+        Relative log-likelihood change at which a start has converged
+    n_jobs : int, optional
+        Worker processes; None uses all cores, 1 runs in-process
+    seed : int
+        Seed for reproducible starts
+
+    Returns:
+    --------
+    best_k : int
+        Number of classes with the lowest BIC
+    scores : pandas.DataFrame
+        Log-likelihood, parameters, AIC, BIC, entropy and smallest class
+        share for every number of classes
+    models : dict
+        Number of classes -> fitted LatentClassModel
+    """
+    X = np.asarray(X, dtype=np.float64)
+    counts = (np.ones(X.shape[0]) if sample_weight is None
+              else np.asarray(sample_weight, dtype=np.float64))
+    class_values = [k for k in class_values if 1 <= k <= X.shape[0]]
+
+    n_batches = int(np.ceil(n_starts / batch_size))
+    sizes = [batch_size] * (n_batches - 1) + [n_starts - batch_size * (n_batches - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(len(class_values) * n_batches)
+    tasks = [(k, size) for k in class_values for size in sizes]
+    args = [(X, counts, k, size, s, max_iter, tol) for (k, size), s in zip(tasks, seeds)]
+
+    if n_jobs == 1 or len(args) == 1:
+        fits = [_em_batch(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            fits = list(pool.map(_em_batch, *zip(*args)))
+
+    best = {}
+    for (k, _), fit in zip(tasks, fits):
+        if k not in best or fit[2] > best[k][2]:
+            best[k] = fit
+
+    n_dogs = counts.sum()
+    models, rows = {}, []
+    for k in class_values:
+        model = LatentClassModel(*best[k], columns=columns)
+        models[k] = model
+        rows.append({
+            'classes': k,
+            'log_likelihood': model.log_likelihood_,
+            'parameters': model.n_parameters,
+            'aic': -2 * model.log_likelihood_ + 2 * model.n_parameters,
+            'bic': -2 * model.log_likelihood_ + model.n_parameters * np.log(n_dogs),
+            'entropy': model.entropy(X, counts),
+            'smallest_class': model.weights_.min(),
+        })
+
+    scores = pd.DataFrame(rows).set_index('classes')
+    best_k = int(scores['bic'].idxmin())
+    return best_k, scores, models
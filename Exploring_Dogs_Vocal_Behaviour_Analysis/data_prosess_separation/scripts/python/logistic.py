@@ -0,0 +1,169 @@
+"""
+Batched Logistic Regression
+---------------------------
+
+Adjusted odds ratios for many binary outcomes that share one set of
+predictors (e.g. every problem, growl and howl answer against the keeping
+conditions and origin). Fitting one GLM per outcome repeats the same work
+on the same design matrix; here all outcomes are fitted together:
+
+1. Dogs with the same predictor answers are grouped. With 0/1 predictors
+   there are only a few dozen distinct design rows, and a logistic model
+   on (dogs, "yes" count) per design row has exactly the likelihood of the
+   model on every dog.
+2. IRLS (Newton-Raphson) runs for all outcomes at once: the working
+   weights form a (design rows x outcomes) matrix, all Hessians X'WX come
+   from one einsum and are solved as one stack of small linear systems.
+
+Columns that are constant or linearly dependent on earlier columns are
+dropped before fitting, so one-hot blocks need no hand-picked reference
+level.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from scipy.stats import norm
+
+# Log odds ratios beyond this only arise from (quasi-)separation
+SEPARATION_LIMIT = 10.0
+
+
+def _independent_columns(X, weights, tol=1e-8):
+    """Positions of a maximal set of linearly independent columns of X"""
+    R = np.linalg.qr(X * np.sqrt(weights)[:, None], mode='r')
+    diagonal = np.abs(np.diag(R))
+    return np.flatnonzero(diagonal > tol * max(diagonal.max(), 1.0))
+
+
+def batched_logistic(X, Y, predictor_names=None, outcome_names=None,
+                     max_iter=50, tol=1e-8, alpha=0.05):
+    """
+    Logistic regression of every outcome column on the same predictors.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray
+        0/1 predictors of shape (n_dogs, n_predictors), without intercept
+    Y : numpy.ndarray
+        0/1 outcomes of shape (n_dogs, n_outcomes)
+    predictor_names, outcome_names : list of str, optional
+        Labels of the result rows and columns
+    max_iter : int
+        Maximum Newton iterations
+    tol : float
+        Relative deviance change at which an outcome has converged
+    alpha : float
+        1 - confidence level of the Wald intervals
+
+    Returns:
+    --------
+    dict
+        'odds_ratio', 'ci_lower', 'ci_upper', 'p_value': predictors x
+        outcomes DataFrames (Wald tests, NaN for dropped predictors);
+        'converged': Series per outcome;
+        'separated': predictors x outcomes, True where the coefficient
+        diverges because the outcome is always or never present at that
+        predictor (its odds ratio and interval are then meaningless);
+        'dropped': predictors removed as constant or collinear;
+        'n': number of dogs
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    n_dogs, n_predictors = X.shape
+    predictor_names = (list(predictor_names) if predictor_names is not None
+                       else [f"x{i}" for i in range(n_predictors)])
+    outcome_names = (list(outcome_names) if outcome_names is not None
+                     else [f"y{i}" for i in range(Y.shape[1])])
+
+    # Group dogs by design row: dogs and "yes" counts per row and outcome
+    rows, inverse = np.unique(X, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    trials = np.bincount(inverse, minlength=len(rows)).astype(np.float64)
+    successes = np.zeros((len(rows), Y.shape[1]))
+    np.add.at(successes, inverse, Y)
+
+    design = np.column_stack([np.ones(len(rows)), rows])
+    kept = _independent_columns(design, trials)
+    design = design[:, kept]
+    n_outcomes, n_params = Y.shape[1], design.shape[1]
+
+    # Start from the overall rate of every outcome
+    rates = np.clip(successes.sum(axis=0) / n_dogs, 1e-6, 1 - 1e-6)
+    beta = np.zeros((n_outcomes, n_params))
+    beta[:, 0] = np.log(rates / (1 - rates))
+
+    def deviance(mu):
+        mu = np.clip(mu, 1e-12, 1 - 1e-12)
+        return -2 * (successes * np.log(mu) + (trials[:, None] - successes) * np.log1p(-mu)).sum(axis=0)
+
+    mu = expit(design @ beta.T)
+    current = deviance(mu)
+    converged = np.zeros(n_outcomes, dtype=bool)
+    for _ in range(max_iter):
+        # All Hessians X'WX and gradients X'(y - m mu) in one go
+        weights = trials[:, None] * mu * (1 - mu)
+        hessians = np.einsum('gi,go,gj->oij', design, weights, design)
+        gradients = (successes - trials[:, None] * mu).T @ design
+        step = np.linalg.solve(hessians + 1e-10 * np.eye(n_params), gradients[:, :, None])[:, :, 0]
+        beta[~converged] += step[~converged]
+
+        mu = expit(design @ beta.T)
+        new = deviance(mu)
+        converged |= np.abs(new - current) < tol * (np.abs(new) + 0.1)
+        current = new
+        if converged.all():
+            break
+
+    # Wald statistics from the inverse Hessian at the estimate
+    weights = trials[:, None] * mu * (1 - mu)
+    hessians = np.einsum('gi,go,gj->oij', design, weights, design)
+    covariance = np.linalg.pinv(hessians)
+    se = np.sqrt(np.maximum(np.diagonal(covariance, axis1=1, axis2=2), 0))
+    z = norm.ppf(1 - alpha / 2)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        p_value = 2 * norm.sf(np.abs(beta / se))
+
+    # Back to all predictors (the intercept is column 0 of the design)
+    def predictor_frame(values):
+        full = np.full((n_predictors, n_outcomes), np.nan)
+        positions = kept[kept > 0]
+        full[positions - 1] = values[:, kept > 0].T
+        return pd.DataFrame(full, index=predictor_names, columns=outcome_names)
+
+    with np.errstate(over='ignore'):
+        return {
+            'odds_ratio': predictor_frame(np.exp(beta)),
+            'ci_lower': predictor_frame(np.exp(beta - z * se)),
+            'ci_upper': predictor_frame(np.exp(beta + z * se)),
+            'p_value': predictor_frame(p_value),
+            'converged': pd.Series(converged, index=outcome_names),
+            'separated': predictor_frame(np.abs(beta) > SEPARATION_LIMIT).fillna(0).astype(bool),
+            'dropped': [name for i, name in enumerate(predictor_names) if i + 1 not in kept],
+            'n': n_dogs,
+        }
+
+
+def logistic_long(results, p_adjusted=None):
+    """
+    One row per predictor and outcome, sorted by p-value; dropped and
+    separated pairs are left out.
+
+    Parameters:
+    -----------
+    results : dict
+        Output of batched_logistic
+    p_adjusted : pandas.DataFrame, optional
+        Corrected p-values of the same shape, added as 'p_adjusted'
+    """
+    columns = {'odds_ratio': results['odds_ratio'], 'ci_lower': results['ci_lower'],
+               'ci_upper': results['ci_upper'], 'p_value': results['p_value']}
+    if p_adjusted is not None:
+        columns['p_adjusted'] = p_adjusted
+    index = pd.MultiIndex.from_product([results['odds_ratio'].index,
+                                        results['odds_ratio'].columns],
+                                       names=['predictor', 'outcome'])
+    long = pd.DataFrame({name: np.asarray(frame).ravel() for name, frame in columns.items()},
+                        index=index)
+    long = long[~np.asarray(results['separated']).ravel()]
+    return long.dropna(subset=['odds_ratio']).sort_values('p_value')
@@ -14,28 +14,75 @@ Analysis Steps:
 3. Extract and interpret components
 4. Visualize results
 
+Alternatively a joint MCA over all four blocks at once can be fitted and
+persisted; later survey batches are then projected onto it or folded into
+it incrementally instead of refitting the whole population.
+
 Author: Cline
 Date: 2024
 """
 
+import argparse
+from functools import partial
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import prince  # For MCA
-import matplotlib.pyplot as plt
-import seaborn as sns
 
+from patterns import ResponsePatterns
+from mca_engine import IndicatorMCA
+from respondent_matrix import RespondentMatrix
+from pipeline import Pipeline, captured_figures, captured_sections
+from figures import FigureQueue, FigureSpec
+
+import shared_paths  # noqa: F401 - makes scripts/python importable
+from data_cache import DataCache
+from instrumentation import add_trace_arguments, instrument, start_tracing
+
+@instrument(exclude=('append_to_results', 'save_figure'))
 class MCAAnalysis:
-    def __init__(self):
-        """Initialize paths and data structures"""
-        self.data_dir = Path(__file__).parent.parent.parent / "data"
+    def __init__(self, figures=True, data_dir=None, trace=None, trace_memory=False):
+        """
+        Initialize paths and data structures
+        
+        Parameters:
+        -----------
+        figures : bool
+            Render the MCA plots after the fits; False skips all plotting
+            (headless runs)
+        data_dir : str or Path, optional
+            Folder holding raw/ and processed/; defaults to
+            data_prosess_separation/data
+        trace : str, optional
+            'jsonl' or 'chrome' records time, CPU, memory and input sizes of
+            every public method in processed/mca_trace.*
+        trace_memory : bool
+            Include tracemalloc peaks in the trace (slower)
+        """
+        self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent.parent.parent / "data"
         self.raw_dir = self.data_dir / "raw"
         self.processed_dir = self.data_dir / "processed"
         self.results_file = self.processed_dir / "mca_results.md"
+        self.joint_model_file = self.processed_dir / "mca_joint_model.npz"
+        self.stage_cache_dir = self.data_dir / "cache" / "stages"
+        
+        # Questionnaire blocks: name -> (file, column prefix in the joint MCA)
+        self.blocks = {
+            'growl': ("grow_to_whom.csv", 'growl_'),
+            'howl': ("howl_on_sound.csv", 'howl_'),
+            'keep': ("keep.csv", 'keep_'),
+            'problems': ("problems.csv", 'problems_')
+        }
         
         # Ensure output directory exists
         self.processed_dir.mkdir(parents=True, exist_ok=True)
         
+        # Plots are described during the fits and rendered afterwards
+        self.figure_queue = FigureQueue(self.processed_dir, enabled=figures)
+        
+        # Per-stage timing and memory, written next to the results file
+        self.tracer = (start_tracing(self.processed_dir, "mca", trace, trace_memory)
+                       if trace else None)
+        
         # Initialize results documentation
         self._initialize_results_file()
     
@@ -59,10 +106,28 @@ in the dog behavior study.
     
     def append_to_results(self, section, content):
         """Add analysis results to markdown file"""
+        # Inside a pipeline stage the section is kept with the stage result
+        sections = captured_sections()
+        if sections is not None:
+            sections.append((section, content))
+            return
         with open(self.results_file, 'a') as f:
             f.write(f"\n## {section}\n")
             f.write(content + "\n")
     
+    def save_figure(self, spec):
+        """Queue a figure for deferred rendering"""
+        # Inside a pipeline stage the spec travels with the stage result
+        figures = captured_figures()
+        if figures is not None:
+            figures.append(spec)
+        else:
+            self.figure_queue.add(spec)
+    
+    def render_figures(self):
+        """Render the queued figures whose data changed (no-op when disabled)"""
+        return self.figure_queue.render()
+    
     def perform_mca(self, data, prefix, n_components=2):
         """
         Perform MCA on a set of binary variables
@@ -78,7 +143,7 @@ in the dog behavior study.
             
         Returns:
         --------
-        mca : prince.MCA
+        mca : IndicatorMCA
             Fitted MCA model
         coords : pandas DataFrame
             Component coordinates
@@ -91,24 +156,33 @@ in the dog behavior study.
             data = data.drop('ID_full', axis=1)
         
         # Convert data to numeric and fill NaN values with 0
-        data = data.apply(pd.to_numeric, errors='coerce').fillna(0)
+        data = data.apply(pd.to_numeric, errors='coerce').fillna(0).astype(np.uint8)
+        
+        # Group identical answer rows; the MCA is fitted on the weighted
+        # distinct patterns and row coordinates are broadcast back to every dog
+        patterns = ResponsePatterns.from_matrix(data)
+        pattern_df = pd.DataFrame(patterns.patterns, columns=data.columns)
+        print(f"\n{len(patterns)} distinct answer patterns among {patterns.n_rows} dogs")
         
         # Print value counts for verification
         print("\nValue counts for first few columns:")
+        yes_counts = pd.Series(patterns.column_sums(), index=data.columns)
         for col in data.columns[:3]:
             print(f"\n{col}:")
-            print(data[col].value_counts())
+            print(pd.Series({0: patterns.n_rows - yes_counts[col], 1: yes_counts[col]},
+                            name='count'))
         
         try:
-            # Initialize and fit MCA
-            mca = prince.MCA(n_components=n_components, random_state=42)
-            
-            # Fit and transform the data
-            coords = mca.fit_transform(data)
+            # Initialize and fit MCA directly on the 0/1 indicator patterns
+            mca = IndicatorMCA(n_components=n_components, random_state=42)
+            mca.fit(pattern_df, sample_weight=patterns.counts)
+            pattern_coords = mca.transform(pattern_df)
+            coords = patterns.broadcast(pattern_coords)
+            coords.index = data.index
             
-            # Get eigenvalues and calculate total inertia
+            # Get eigenvalues and the share of the total inertia they explain
             eigenvalues = mca.eigenvalues_
-            total_inertia = np.sum(eigenvalues)
+            total_inertia = mca.total_inertia_
             explained_inertia = eigenvalues / total_inertia
             
             # Print results
@@ -117,48 +191,19 @@ in the dog behavior study.
                 print(f"Component {i}: {ratio:.3f} ({ratio*100:.1f}%)")
             
             # Get coordinates for variables
-            var_coords = mca.column_coordinates(data)
-            
-            # Create visualization
-            plt.figure(figsize=(12, 8))
-            
-            # Plot individual points (dogs)
-            plt.scatter(coords.iloc[:, 0], coords.iloc[:, 1], 
-                       alpha=0.1, color='gray', label='Dogs')
-            
-            # Plot variable points
-            for i, (var, coord) in enumerate(var_coords.items()):
-                x, y = coord[0], coord[1]
-                plt.plot([0, x], [0, y], 'r-', alpha=0.5)
-                plt.scatter(x, y, color='red')
-                # Clean up variable name for display
-                display_name = var.replace('_', ' ').title()
-                plt.annotate(
-                    display_name,
-                    (x, y),
-                    xytext=(5, 5), 
-                    textcoords='offset points',
-                    fontsize=8,
-                    alpha=0.8
-                )
-            
-            plt.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-            plt.axvline(x=0, color='k', linestyle='-', alpha=0.3)
-            plt.grid(True, alpha=0.3)
+            var_coords = mca.column_coordinates()
             
-            plt.xlabel(f"Component 1 ({explained_inertia[0]*100:.1f}%)")
-            plt.ylabel(f"Component 2 ({explained_inertia[1]*100:.1f}%)")
-            plt.title(f"MCA Results: {prefix}")
-            
-            plt.tight_layout()
-            plt.savefig(self.processed_dir / f"mca_{prefix.lower()}.png", 
-                       dpi=300, bbox_inches='tight')
-            plt.close()
+            # Queue the biplot; dogs are drawn as their distinct answer
+            # patterns sized by count, which is all the spec needs to carry
+            self.save_figure(FigureSpec(
+                'mca_biplot', f"mca_{prefix.lower()}.png",
+                {'rows': pattern_coords.to_numpy()[:, :2], 'counts': patterns.counts,
+                 'variables': var_coords, 'explained': explained_inertia[:2]},
+                title=f"MCA Results: {prefix}"))
             
             # Create results DataFrame
-            correlations = pd.DataFrame(
-                var_coords,
-                columns=[f'Component_{i+1}' for i in range(n_components)]
+            correlations = var_coords.set_axis(
+                [f'Component_{i+1}' for i in range(n_components)], axis=1
             )
             
             # Document results
@@ -192,20 +237,108 @@ of the total variance in the data.
             print(f"Error in MCA analysis: {str(e)}")
             raise
     
-    def analyze_all(self):
-        """Perform MCA analysis on all variable categories"""
-        # Load data
-        growl_df = pd.read_csv(self.raw_dir / "grow_to_whom.csv")
-        howl_df = pd.read_csv(self.raw_dir / "howl_on_sound.csv")
-        keep_df = pd.read_csv(self.raw_dir / "keep.csv")
-        problems_df = pd.read_csv(self.raw_dir / "problems.csv")
+    def load_blocks(self):
+        """Load every questionnaire block as a DataFrame keyed by block name"""
+        cache = DataCache()
+        return {name: cache.read_table(self.raw_dir / filename)
+                for name, (filename, _) in self.blocks.items()}
+    
+    def _joint_matrix(self):
+        """Join all blocks on ID_full into one prefixed respondent matrix"""
+        prefixes = {name: prefix for name, (_, prefix) in self.blocks.items()}
+        matrix = RespondentMatrix.from_tables(self.load_blocks(), prefixes)
+        columns = [col for name in matrix.blocks for col in matrix.columns[name]]
+        return matrix, pd.DataFrame(matrix.values, index=matrix.index, columns=columns)
+    
+    def analyze_joint(self, n_components=2):
+        """
+        Fit one MCA over the concatenated growl, howl, keep and problems
+        blocks and persist the fitted model with the IDs it was fitted on.
+        
+        Parameters:
+        -----------
+        n_components : int
+            Number of components to extract
+            
+        Returns:
+        --------
+        mca : IndicatorMCA
+            Fitted joint model
+        coords : pandas DataFrame
+            Component coordinates of every respondent
+        """
+        matrix, joint_df = self._joint_matrix()
+        mca, coords = self.perform_mca(joint_df, "Joint_All_Blocks", n_components)
+        coords.index = matrix.index
+        self.render_figures()
+        
+        mca.save(self.joint_model_file, ids=matrix.ids)
+        print(f"Saved joint MCA model ({len(matrix)} respondents) to: {self.joint_model_file}")
+        return mca, coords
+    
+    def update_joint(self, mode='update'):
+        """
+        Bring new respondents into the persisted joint MCA.
+        
+        Respondents whose ID_full is not among the IDs the model was fitted
+        on are treated as the new batch.
+        
+        Parameters:
+        -----------
+        mode : str
+            'project' places the new respondents on the existing axes as
+            supplementary rows and leaves the model unchanged;
+            'update' folds them into the model's sufficient statistics,
+            which gives exactly the fit on all respondents without
+            re-reading the old ones
+            
+        Returns:
+        --------
+        coords : pandas DataFrame
+            Component coordinates of the new respondents, indexed by ID_full
+        """
+        if mode not in ('project', 'update'):
+            raise ValueError(f"Unknown mode '{mode}', expected 'project' or 'update'")
+        if not self.joint_model_file.exists():
+            raise FileNotFoundError(
+                f"No joint model at {self.joint_model_file}; run analyze_joint first")
+        
+        mca, extra = IndicatorMCA.load(self.joint_model_file)
+        fitted_ids = extra['ids']
+        matrix, joint_df = self._joint_matrix()
+        new_df = joint_df[~np.isin(matrix.ids, fitted_ids)]
+        
+        if new_df.empty:
+            print("No new respondents to add to the joint MCA")
+            return pd.DataFrame(columns=range(mca.n_components))
+        print(f"\n{len(new_df)} new respondents for the joint MCA ({mode})")
+        
+        patterns = ResponsePatterns.from_matrix(new_df)
+        pattern_df = pd.DataFrame(patterns.patterns, columns=new_df.columns)
+        if mode == 'update':
+            mca.partial_fit(pattern_df, sample_weight=patterns.counts)
+            mca.save(self.joint_model_file, ids=np.union1d(fitted_ids, new_df.index.to_numpy()))
+        coords = patterns.broadcast(mca.transform(pattern_df))
+        coords.index = new_df.index
+        
+        explained = ', '.join(f"{ratio*100:.1f}%" for ratio in mca.explained_inertia_)
+        self.append_to_results("Joint MCA Update", f"""### New respondents ({mode})
+
+- New respondents: {len(new_df)}
+- Respondents in the model: {int(mca.total_weight_)}
+- Explained inertia per component: {explained}
+""")
+        return coords
+    
+    def _load_stage(self):
+        """Load the blocks and print an overview of their answers"""
+        blocks = self.load_blocks()
         
         # Print data info
         print("\nData Overview:")
         print("-" * 50)
-        for name, df in [('Growl', growl_df), ('Howl', howl_df), 
-                        ('Keep', keep_df), ('Problems', problems_df)]:
-            print(f"\n{name} data shape:", df.shape)
+        for name, df in blocks.items():
+            print(f"\n{name.title()} data shape:", df.shape)
             print("Columns:", df.columns.tolist())
             print("Sample of first row:", df.iloc[0].to_dict())
             print("\nValue counts for binary variables:")
@@ -213,24 +346,77 @@ of the total variance in the data.
                 if col != 'ID_full':
                     print(f"\n{col}:")
                     print(df[col].value_counts(normalize=True).mul(100).round(1))
+        return blocks
+    
+    def _mca_stage(self, blocks, block, title, n_components):
+        return self.perform_mca(blocks[block], title, n_components)
+    
+    def build_pipeline(self, n_components=2, n_jobs=None):
+        """
+        Declare the four separate MCA fits as independent pipeline stages.
         
-        # Analyze each category
-        print("\nStarting MCA Analysis...")
-        print("=" * 50)
-        
-        results = {}
+        The fits run in parallel threads and are memoized under
+        data/cache/stages, keyed by the block contents and n_components;
+        their plots are only queued and rendered once all fits are done.
         
-        # Growling patterns
-        results['growl'] = self.perform_mca(growl_df, "Growling_Patterns")
+        Parameters:
+        -----------
+        n_components : int
+            Number of components to extract per block
+        n_jobs : int, optional
+            Fits run at the same time (None = all four)
+            
+        Returns:
+        --------
+        Pipeline
+        """
+        titles = {
+            'growl': "Growling_Patterns",
+            'howl': "Howling_Patterns",
+            'keep': "Keeping_Conditions",
+            'problems': "Problems"
+        }
+        pipeline = Pipeline(self.stage_cache_dir, n_jobs=n_jobs)
+        pipeline.add('mca_load', self._load_stage,
+                     inputs=[self.raw_dir / filename for filename, _ in self.blocks.values()],
+                     memoize=False)
+        for block, title in titles.items():
+            pipeline.add(f'mca_{block}',
+                         partial(self._mca_stage, block=block, title=title,
+                                 n_components=n_components),
+                         deps=['mca_load'], params={'n_components': n_components})
+        return pipeline
+    
+    def analyze_all(self, joint=False, n_jobs=None, force=()):
+        """
+        Perform MCA analysis on all variable categories
         
-        # Howling patterns
-        results['howl'] = self.perform_mca(howl_df, "Howling_Patterns")
+        Parameters:
+        -----------
+        joint : bool
+            Fit one joint MCA over all blocks (persisted for later updates)
+            instead of four separate ones
+        n_jobs : int, optional
+            Separate fits run at the same time (None = all four)
+        force : iterable of str
+            Blocks to refit even if a memoized result exists
+            (e.g. ['growl'])
+        """
+        if joint:
+            return {'joint': self.analyze_joint()}
         
-        # Keeping conditions
-        results['keep'] = self.perform_mca(keep_df, "Keeping_Conditions")
+        # Analyze each category
+        print("\nStarting MCA Analysis...")
+        print("=" * 50)
         
-        # Problems
-        results['problems'] = self.perform_mca(problems_df, "Problems")
+        pipeline = self.build_pipeline(n_jobs=n_jobs)
+        stage_results = pipeline.run(force=[f'mca_{block}' for block in force])
+        for section, content in pipeline.sections:
+            self.append_to_results(section, content)
+        for spec in pipeline.figures:
+            self.figure_queue.add(spec)
+        self.render_figures()
+        results = {block: stage_results[f'mca_{block}'] for block in self.blocks}
         
         print("\nAnalysis complete! Results saved in:")
         print(f"- Markdown: {self.results_file}")
@@ -240,8 +426,17 @@ of the total variance in the data.
 
 def main():
     """Run the complete MCA analysis"""
-    analyzer = MCAAnalysis()
+    parser = argparse.ArgumentParser(description="MCA of the questionnaire blocks")
+    parser.add_argument('--no-figures', action='store_true',
+                        help="skip rendering figures (headless runs)")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    
+    analyzer = MCAAnalysis(figures=not args.no_figures, trace=args.trace,
+                           trace_memory=args.trace_memory)
     results = analyzer.analyze_all()
+    if analyzer.tracer:
+        analyzer.tracer.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,429 @@
+"""
+Indicator-Matrix MCA Engine
+---------------------------
+
+Multiple Correspondence Analysis for blocks of binary (0/1) variables,
+working directly on the 0/1 answer matrix (dense, scipy sparse or a
+PackedTable) instead of a dense one-hot expanded frame.
+
+Every binary variable j has two categories ("j__0" and "j__1"), so the
+complete disjunctive table is Z = [1 - X, X]. MCA is the correspondence
+analysis of Z, and everything it needs can be derived from X itself:
+- the weighted Burt matrix Z'WZ follows from the p x p Gram matrix X'WX
+  and the column sums, giving an exact eigendecomposition of a tiny
+  (2p x 2p) matrix ('gram' solver)
+- for very wide blocks the standardized residual matrix is applied as an
+  operator inside a randomized SVD ('randomized' solver), never formed
+
+Rows can carry weights (e.g. pattern counts from patterns.py). Row
+coordinates use the transition formula, so new or supplementary rows are
+projected with the same code.
+
+With the gram solver the fit is fully described by three sufficient
+statistics (total weight, column sums and X'WX). They are kept on the model
+and saved with it, so a new batch of respondents can be folded in exactly
+with partial_fit at a cost proportional to the batch, not the population.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from binary_store import PackedTable
+
+MCA_SOLVERS = ('auto', 'gram', 'randomized')
+
+
+def _as_matrix(X):
+    """Return (matrix, column names) for a DataFrame, PackedTable, array or sparse matrix"""
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(), list(X.columns)
+    if isinstance(X, PackedTable):
+        return X.to_numpy(), list(X.columns)
+    if sparse.issparse(X):
+        return sparse.csr_matrix(X), list(range(X.shape[1]))
+    X = np.asarray(X)
+    return X, list(range(X.shape[1]))
+
+
+def _dot(X, M, chunk_size=100000):
+    """X @ M for a dense 0/1 matrix (converted chunk-wise) or a sparse one"""
+    if sparse.issparse(X):
+        return np.asarray(X @ M)
+    out = np.empty((X.shape[0], M.shape[1]))
+    for start in range(0, X.shape[0], chunk_size):
+        out[start:start + chunk_size] = X[start:start + chunk_size].astype(np.float64) @ M
+    return out
+
+
+def _weighted_gram(X, weights, chunk_size=100000):
+    """X.T @ diag(weights) @ X, chunk-wise for dense input"""
+    if sparse.issparse(X):
+        return np.asarray((X.T @ X.multiply(weights[:, None]).tocsr()).todense())
+    gram = np.zeros((X.shape[1], X.shape[1]))
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = X[start:start + chunk_size].astype(np.float64)
+        gram += chunk.T @ (chunk * weights[start:start + chunk_size, None])
+    return gram
+
+
+def _tdot(X, M, chunk_size=100000):
+    """X.T @ M for a dense 0/1 matrix (converted chunk-wise) or a sparse one"""
+    if sparse.issparse(X):
+        return np.asarray(X.T @ M)
+    out = np.zeros((X.shape[1], M.shape[1]))
+    for start in range(0, X.shape[0], chunk_size):
+        out += X[start:start + chunk_size].astype(np.float64).T @ M[start:start + chunk_size]
+    return out
+
+
+class IndicatorMCA:
+    """
+    MCA of binary variables without one-hot expansion.
+
+    Attributes (after fit):
+    -----------------------
+    eigenvalues_ : numpy.ndarray
+        Principal inertias of the retained components
+    total_inertia_ : float
+        Total inertia of the indicator matrix
+    column_coordinates_ : pandas.DataFrame
+        Principal coordinates of the categories ("<column>__0", "<column>__1"),
+        in the same order as prince
+    column_masses_ : numpy.ndarray
+        Masses of the categories
+    """
+
+    def __init__(self, n_components=2, solver='auto', n_oversamples=10, n_iter=4,
+                 random_state=None):
+        """
+        Parameters:
+        -----------
+        n_components : int
+            Number of components to extract
+        solver : str
+            'gram' (exact, via the Burt matrix), 'randomized' (randomized
+            SVD of the residual operator) or 'auto' (gram unless the block
+            has more than 1000 variables)
+        n_oversamples, n_iter : int
+            Oversampling and power iterations of the randomized solver
+        random_state : int, optional
+            Seed of the randomized solver
+        """
+        if solver not in MCA_SOLVERS:
+            raise ValueError(f"Unknown solver '{solver}', expected one of {', '.join(MCA_SOLVERS)}")
+        self.n_components = n_components
+        self.solver = solver
+        self.n_oversamples = n_oversamples
+        self.n_iter = n_iter
+        self.random_state = random_state
+
+    # -- building blocks ---------------------------------------------------
+
+    def _split(self, M):
+        """Split a (2p x k) category matrix into its "no" and "yes" halves"""
+        p = len(self.columns_)
+        return M[:p], M[p:]
+
+    def _z_dot(self, X, M):
+        """Z @ M with Z = [1 - X, X], computed from X"""
+        no, yes = self._split(M)
+        return _dot(X, yes - no) + no.sum(axis=0)
+
+    def _z_tdot(self, X, Q):
+        """Z.T @ Q with Z = [1 - X, X], computed from X"""
+        yes = _tdot(X, Q)
+        return np.vstack([Q.sum(axis=0) - yes, yes])
+
+    def _residual_dot(self, X, M, sqrt_r):
+        """S @ M for the standardized residual matrix S"""
+        p = len(self.columns_)
+        scaled = M * self._inv_sqrt_c[:, None]
+        return sqrt_r[:, None] * (self._z_dot(X, scaled) / p - self.column_masses_ @ scaled)
+
+    def _residual_tdot(self, X, Q, sqrt_r):
+        """S.T @ Q for the standardized residual matrix S"""
+        p = len(self.columns_)
+        weighted = Q * sqrt_r[:, None]
+        inner = self._z_tdot(X, weighted) / p - np.outer(self.column_masses_, weighted.sum(axis=0))
+        return inner * self._inv_sqrt_c[:, None]
+
+    # -- solvers -------------------------------------------------------------
+
+    def _set_masses(self, total, yes):
+        """Category masses from the total weight and the weighted column sums"""
+        p = len(self.columns_)
+        self.column_masses_ = np.concatenate([total - yes, yes]) / (total * p)
+        with np.errstate(divide='ignore'):
+            self._inv_sqrt_c = np.where(self.column_masses_ > 0,
+                                        1 / np.sqrt(self.column_masses_), 0)
+
+    def _solve_gram(self, gram, yes, total):
+        """Eigendecomposition of S'S built from the weighted Gram matrix X'WX"""
+        p = len(self.columns_)
+
+        # Weighted Burt matrix Z'WZ from X'WX and the column sums
+        burt = np.empty((2 * p, 2 * p))
+        burt[p:, p:] = gram
+        burt[:p, p:] = yes[None, :] - gram
+        burt[p:, :p] = burt[:p, p:].T
+        burt[:p, :p] = total - yes[:, None] - yes[None, :] + gram
+
+        sqrt_c = np.sqrt(self.column_masses_)
+        cross = burt / (total * p * p)
+        sts = self._inv_sqrt_c[:, None] * cross * self._inv_sqrt_c[None, :] - np.outer(sqrt_c, sqrt_c)
+        sts[self.column_masses_ == 0] = 0
+        sts[:, self.column_masses_ == 0] = 0
+
+        eigenvalues, vectors = np.linalg.eigh(sts)
+        order = np.argsort(eigenvalues)[::-1]
+        return np.clip(eigenvalues[order], 0, None), vectors[:, order]
+
+    def _solve_randomized(self, X, weights):
+        """Randomized SVD of S, applied as an operator on X"""
+        rng = np.random.default_rng(self.random_state)
+        sqrt_r = np.sqrt(weights / weights.sum())
+        width = min(self.n_components + self.n_oversamples, 2 * len(self.columns_))
+
+        omega = rng.standard_normal((2 * len(self.columns_), width))
+        Q, _ = np.linalg.qr(self._residual_dot(X, omega, sqrt_r))
+        for _ in range(self.n_iter):
+            Q, _ = np.linalg.qr(self._residual_tdot(X, Q, sqrt_r))
+            Q, _ = np.linalg.qr(self._residual_dot(X, Q, sqrt_r))
+
+        B = self._residual_tdot(X, Q, sqrt_r).T            # (width x 2p)
+        _, singular, vt = np.linalg.svd(B, full_matrices=False)
+        return singular ** 2, vt.T
+
+    # -- public API ----------------------------------------------------------
+
+    def fit(self, X, sample_weight=None):
+        """
+        Fit the MCA.
+
+        Parameters:
+        -----------
+        X : pandas.DataFrame, numpy.ndarray or scipy.sparse matrix
+            0/1 answers, one row per dog (or per distinct pattern)
+        sample_weight : numpy.ndarray, optional
+            Row weights, e.g. the number of dogs sharing each pattern
+
+        Returns:
+        --------
+        self
+        """
+        X, self.columns_ = _as_matrix(X)
+        n, p = X.shape
+        weights = np.ones(n) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        total = weights.sum()
+
+        yes = _tdot(X, weights[:, None]).ravel()
+        self._set_masses(total, yes)
+
+        solver = self.solver
+        if solver == 'auto':
+            solver = 'gram' if p <= 1000 else 'randomized'
+        if solver == 'gram':
+            self.total_weight_ = float(total)
+            self.column_sums_ = yes
+            self.gram_ = _weighted_gram(X, weights)
+            eigenvalues, vectors = self._solve_gram(self.gram_, yes, total)
+        else:
+            self.total_weight_ = self.column_sums_ = self.gram_ = None
+            eigenvalues, vectors = self._solve_randomized(X, weights)
+        return self._set_solution(eigenvalues, vectors)
+
+    def partial_fit(self, X, sample_weight=None):
+        """
+        Fold a new batch of rows into the fit.
+
+        The batch's weight, column sums and X'WX are added to the stored
+        sufficient statistics and the small (2p x 2p) eigenproblem is solved
+        again, which gives exactly the fit on all rows seen so far.
+
+        Parameters:
+        -----------
+        X : pandas.DataFrame, numpy.ndarray or scipy.sparse matrix
+            0/1 answers of the new rows, same columns as the fitted data
+        sample_weight : numpy.ndarray, optional
+            Row weights of the new rows
+
+        Returns:
+        --------
+        self
+        """
+        if getattr(self, 'gram_', None) is None:
+            if hasattr(self, 'columns_'):
+                raise ValueError("partial_fit needs a model fitted with the gram solver")
+            self.solver = 'gram'
+            return self.fit(X, sample_weight=sample_weight)
+
+        named = isinstance(X, pd.DataFrame)
+        X, columns = _as_matrix(X)
+        if X.shape[1] != len(self.columns_) or (named and list(columns) != list(self.columns_)):
+            raise ValueError("New rows do not have the columns of the fitted data")
+        weights = np.ones(X.shape[0]) if sample_weight is None \
+            else np.asarray(sample_weight, dtype=np.float64)
+
+        self.total_weight_ += float(weights.sum())
+        self.column_sums_ = self.column_sums_ + _tdot(X, weights[:, None]).ravel()
+        self.gram_ = self.gram_ + _weighted_gram(X, weights)
+
+        self._set_masses(self.total_weight_, self.column_sums_)
+        eigenvalues, vectors = self._solve_gram(self.gram_, self.column_sums_, self.total_weight_)
+        return self._set_solution(eigenvalues, vectors)
+
+    @classmethod
+    def from_statistics(cls, total_weight, column_sums, gram, columns, n_components=2):
+        """
+        Fit a gram-solver MCA from stored sufficient statistics alone.
+
+        Parameters:
+        -----------
+        total_weight : float
+            Number (or total weight) of the rows
+        column_sums : numpy.ndarray
+            Weighted "yes" count of every variable, shape (p,)
+        gram : numpy.ndarray
+            Weighted co-occurrence matrix X'WX, shape (p, p)
+        columns : list of str
+            Variable names
+        n_components : int
+            Number of components kept
+
+        Returns:
+        --------
+        IndicatorMCA
+            The same fit as on the rows the statistics were collected from
+        """
+        model = cls(n_components=n_components, solver='gram')
+        model.columns_ = list(columns)
+        model.total_weight_ = float(total_weight)
+        model.column_sums_ = np.asarray(column_sums, dtype=np.float64)
+        model.gram_ = np.asarray(gram, dtype=np.float64)
+        model._set_masses(model.total_weight_, model.column_sums_)
+        eigenvalues, vectors = model._solve_gram(model.gram_, model.column_sums_,
+                                                 model.total_weight_)
+        return model._set_solution(eigenvalues, vectors)
+
+    def _set_solution(self, eigenvalues, vectors):
+        """Derive eigenvalues, inertia and coordinates from the solver output"""
+        p = len(self.columns_)
+        if self.gram_ is not None:
+            self.total_inertia_ = float(eigenvalues.sum())
+        else:
+            # Total inertia of an MCA on p variables with K categories
+            n_categories = int((self.column_masses_ > 0).sum())
+            self.total_inertia_ = (n_categories - p) / p
+        self._eigenvalues = eigenvalues
+        self._eigenvectors = vectors
+
+        k = self.n_components
+        self.eigenvalues_ = eigenvalues[:k]
+        singular = np.sqrt(self.eigenvalues_)
+        self._standard_coords = vectors[:, :k] * self._inv_sqrt_c[:, None]
+
+        coords = self._standard_coords * singular
+        coords[self.column_masses_ == 0] = np.nan
+        # Internally categories are ordered [all "no", all "yes"]; report
+        # them per variable like prince does
+        order = np.ravel(np.column_stack([np.arange(p), np.arange(p) + p]))
+        labels = [f"{col}__{value}" for col in self.columns_ for value in (0, 1)]
+        self.column_coordinates_ = pd.DataFrame(coords[order], index=labels)
+        self.explained_inertia_ = self.eigenvalues_ / self.total_inertia_
+        return self
+
+    def transform(self, X):
+        """
+        Principal coordinates of (active or supplementary) rows.
+
+        Parameters:
+        -----------
+        X : pandas.DataFrame, numpy.ndarray or scipy.sparse matrix
+            0/1 answers with the same columns as the fitted data
+
+        Returns:
+        --------
+        pandas.DataFrame
+            One row per input row, one column per component
+        """
+        index = X.index if isinstance(X, pd.DataFrame) else None
+        X, _ = _as_matrix(X)
+        p = len(self.columns_)
+        coords = self._z_dot(X, self._standard_coords) / p - self.column_masses_ @ self._standard_coords
+        return pd.DataFrame(coords, index=index)
+
+    def fit_transform(self, X, sample_weight=None):
+        """Fit and return the row coordinates of X"""
+        return self.fit(X, sample_weight=sample_weight).transform(X)
+
+    def row_coordinates(self, X):
+        """Alias of transform, mirroring prince's API"""
+        return self.transform(X)
+
+    def column_coordinates(self, X=None):
+        """Category coordinates; X is accepted for prince compatibility"""
+        return self.column_coordinates_
+
+    def save(self, path, **extra):
+        """
+        Persist the fitted model (and its sufficient statistics) to an .npz file.
+
+        Parameters:
+        -----------
+        path : str or Path
+            Target file
+        **extra : numpy.ndarray
+            Additional arrays stored alongside, e.g. the fitted ID_full values
+        """
+        params = {
+            'n_components': self.n_components,
+            'solver': self.solver,
+            'n_oversamples': self.n_oversamples,
+            'n_iter': self.n_iter,
+            'random_state': self.random_state,
+            'columns': [str(col) for col in self.columns_],
+            'total_inertia': self.total_inertia_,
+            'total_weight': self.total_weight_,
+        }
+        arrays = {
+            'eigenvalues': self._eigenvalues,
+            'eigenvectors': self._eigenvectors,
+            'column_masses': self.column_masses_,
+        }
+        if self.gram_ is not None:
+            arrays.update(gram=self.gram_, column_sums=self.column_sums_)
+        np.savez(path, params=np.array(json.dumps(params)), **arrays,
+                 **{f"extra_{key}": value for key, value in extra.items()})
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model written by save.
+
+        Returns:
+        --------
+        model : IndicatorMCA
+            The fitted model
+        extra : dict
+            Additional arrays that were stored with it
+        """
+        with np.load(path) as data:
+            params = json.loads(str(data['params']))
+            model = cls(n_components=params['n_components'], solver=params['solver'],
+                        n_oversamples=params['n_oversamples'], n_iter=params['n_iter'],
+                        random_state=params['random_state'])
+            model.columns_ = params['columns']
+            model.total_weight_ = params['total_weight']
+            model.gram_ = data['gram'] if 'gram' in data else None
+            model.column_sums_ = data['column_sums'] if 'column_sums' in data else None
+            model.column_masses_ = data['column_masses']
+            with np.errstate(divide='ignore'):
+                model._inv_sqrt_c = np.where(model.column_masses_ > 0,
+                                             1 / np.sqrt(model.column_masses_), 0)
+            model._set_solution(data['eigenvalues'], data['eigenvectors'])
+            extra = {key[len('extra_'):]: data[key] for key in data.files
+                     if key.startswith('extra_')}
+        return model, extra
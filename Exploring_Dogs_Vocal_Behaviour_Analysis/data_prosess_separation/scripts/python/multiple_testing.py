@@ -0,0 +1,227 @@
+"""
+Multiple Testing and Permutation P-values
+-----------------------------------------
+
+The analyses run whole batteries of tests (every keeping condition against
+every problem, every origin against the clusters, ...). This module
+provides:
+1. Family-wise / false discovery rate correction over such a battery
+   (Bonferroni, Holm, Benjamini-Hochberg)
+2. Permutation p-values computed in batches: the rows of one indicator
+   block are shuffled many times at once, giving a (n_permutations x n_dogs)
+   matrix that is multiplied against the other block. Batches are spread
+   over a process pool.
+
+Because the margins of every contingency table stay fixed under
+permutation, the permuted statistics only need the "yes" counts that the
+batched product delivers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CORRECTION_METHODS = ('bonferroni', 'holm', 'fdr_bh')
+
+# Bytes a permutation batch may hold per worker: every shuffle keeps an
+# int64 index row and a float64 permuted column of n_dogs entries
+PERMUTATION_MEMORY = 256 * 2**20
+
+
+def adjust_pvalues(p_values, method='fdr_bh'):
+    """
+    Correct a battery of p-values for multiple testing.
+
+    Parameters:
+    -----------
+    p_values : array-like, pandas.Series or pandas.DataFrame
+        Raw p-values of all tests in the battery; NaNs are ignored and kept
+    method : str
+        'bonferroni', 'holm' (family-wise error rate) or
+        'fdr_bh' (Benjamini-Hochberg false discovery rate)
+
+    Returns:
+    --------
+    Same type and shape as p_values
+        Adjusted p-values, capped at 1
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError(f"Unknown correction method '{method}', "
+                         f"expected one of {', '.join(CORRECTION_METHODS)}")
+
+    raw = np.asarray(p_values, dtype=np.float64)
+    flat = raw.ravel()
+    valid = ~np.isnan(flat)
+    p = flat[valid]
+    m = len(p)
+    adjusted = np.full_like(flat, np.nan)
+
+    if m:
+        order = np.argsort(p)
+        ranked = p[order]
+        if method == 'bonferroni':
+            corrected = ranked * m
+        elif method == 'holm':
+            corrected = np.maximum.accumulate(ranked * (m - np.arange(m)))
+        else:
+            corrected = ranked * m / np.arange(1, m + 1)
+            corrected = np.minimum.accumulate(corrected[::-1])[::-1]
+        result = np.empty(m)
+        result[order] = np.minimum(corrected, 1.0)
+        adjusted[valid] = result
+
+    adjusted = adjusted.reshape(raw.shape)
+    if isinstance(p_values, pd.DataFrame):
+        return pd.DataFrame(adjusted, index=p_values.index, columns=p_values.columns)
+    if isinstance(p_values, pd.Series):
+        return pd.Series(adjusted, index=p_values.index, name=p_values.name)
+    return adjusted
+
+
+def _phi_statistic(yes_counts, x_yes, z_yes, n):
+    """|n * n11 - margin product|, monotone in |phi| for fixed margins"""
+    return np.abs(n * yes_counts - x_yes * z_yes)
+
+
+def _chi2_statistic(yes_counts, x_yes, z_yes, n):
+    """Chi-square of a (groups x 2) table from the per-group "yes" counts"""
+    expected_yes = z_yes * x_yes / n
+    expected_no = z_yes * (n - x_yes) / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(expected_yes > 0, 1 / expected_yes, 0) \
+            + np.where(expected_no > 0, 1 / expected_no, 0)
+    return ((yes_counts - expected_yes) ** 2 * weight).sum(axis=-1)
+
+
+STATISTICS = {
+    'phi': _phi_statistic,
+    'chi2': _chi2_statistic,
+}
+
+
+def _permutation_batch(X, Z, statistic, observed, seed, size):
+    """
+    Count permuted statistics at least as extreme as the observed ones.
+
+    Runs in a worker process. Each of the `size` permutations shuffles
+    the rows of X; the column-wise products with Z are computed for all
+    permutations of a batch at once.
+    """
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    perms = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+    stat_fn = STATISTICS[statistic]
+    z_yes = Z.sum(axis=0)
+    exceed = np.zeros_like(observed, dtype=np.int64)
+    tolerance = 1e-9 * np.maximum(np.abs(observed), 1)
+
+    for i in range(X.shape[1]):
+        x = X[:, i]
+        x_yes = x.sum()
+        permuted = x[perms].astype(np.float64)     # (size, n)
+        yes_counts = permuted @ Z                  # (size, m)
+        stats = stat_fn(yes_counts, x_yes, z_yes, n)
+        exceed[i] = (stats >= observed[i] - tolerance[i]).sum(axis=0)
+    return exceed
+
+
+def _run_permutations(X, Z, statistic, observed, n_permutations, batch_size, n_jobs, seed):
+    """Split the permutations into batches and run them, optionally in parallel"""
+    # Large samples get smaller batches, so a worker stays within PERMUTATION_MEMORY
+    batch_size = max(1, min(batch_size, PERMUTATION_MEMORY // (16 * X.shape[0])))
+    n_batches = int(np.ceil(n_permutations / batch_size))
+    sizes = [batch_size] * (n_batches - 1) + [n_permutations - batch_size * (n_batches - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    args = [(X, Z, statistic, observed, s, size) for s, size in zip(seeds, sizes)]
+
+    exceed = np.zeros_like(observed, dtype=np.int64)
+    if n_jobs == 1 or n_batches == 1:
+        for a in args:
+            exceed += _permutation_batch(*a)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            for counts in pool.map(_permutation_batch, *zip(*args)):
+                exceed += counts
+    return (exceed + 1) / (n_permutations + 1)
+
+
+def permutation_pvalues(X, Y, x_names=None, y_names=None, n_permutations=10000,
+                        batch_size=500, n_jobs=None, seed=42):
+    """
+    Two-sided permutation p-values for the phi coefficient of every pair
+    of columns between two indicator blocks.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray or pandas.DataFrame
+        First indicator block, shape (n_dogs, a); its rows are shuffled
+    Y : numpy.ndarray or pandas.DataFrame
+        Second indicator block, shape (n_dogs, b)
+    x_names, y_names : list of str, optional
+        Labels; taken from the DataFrames when omitted
+    n_permutations : int
+        Number of shuffles
+    batch_size : int
+        Shuffles per batch; a batch holds a (batch_size x n_dogs) index matrix,
+        so the batch is made smaller when that would exceed PERMUTATION_MEMORY
+    n_jobs : int, optional
+        Worker processes; None uses all cores, 1 runs in-process
+    seed : int
+        Seed for reproducible shuffles
+
+    Returns:
+    --------
+    pandas.DataFrame
+        Permutation p-values of shape (a, b), computed as
+        (1 + #extreme) / (1 + n_permutations)
+    """
+    if x_names is None:
+        x_names = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(X.shape[1]))
+    if y_names is None:
+        y_names = list(Y.columns) if isinstance(Y, pd.DataFrame) else list(range(Y.shape[1]))
+
+    X = np.asarray(X, dtype=np.uint8)
+    Y = np.asarray(Y, dtype=np.float64)
+    n = X.shape[0]
+    observed = _phi_statistic(X.T.astype(np.float64) @ Y, X.sum(axis=0)[:, None],
+                              Y.sum(axis=0)[None, :], n)
+
+    p = _run_permutations(X, Y, 'phi', observed, n_permutations, batch_size, n_jobs, seed)
+    return pd.DataFrame(p, index=x_names, columns=y_names)
+
+
+def permutation_chi2_pvalues(labels, X, x_names=None, n_permutations=10000,
+                             batch_size=500, n_jobs=None, seed=42):
+    """
+    Permutation p-values for the chi-square test of group labels (e.g.
+    clusters) against every column of an indicator block.
+
+    Parameters:
+    -----------
+    labels : array-like
+        Group label of every dog, e.g. cluster assignments
+    X : numpy.ndarray or pandas.DataFrame
+        Indicator block, shape (n_dogs, a)
+    x_names : list of str, optional
+        Labels; taken from the DataFrame when omitted
+    n_permutations, batch_size, n_jobs, seed
+        See permutation_pvalues
+
+    Returns:
+    --------
+    pandas.Series
+        Permutation p-value per column of X
+    """
+    if x_names is None:
+        x_names = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(X.shape[1]))
+
+    X = np.asarray(X, dtype=np.uint8)
+    _, codes = np.unique(np.asarray(labels), return_inverse=True)
+    one_hot = np.eye(codes.max() + 1)[codes]            # (n_dogs, n_groups)
+    n = X.shape[0]
+    observed = _chi2_statistic(X.T.astype(np.float64) @ one_hot, X.sum(axis=0)[:, None],
+                               one_hot.sum(axis=0)[None, :], n)
+
+    p = _run_permutations(X, one_hot, 'chi2', observed, n_permutations, batch_size, n_jobs, seed)
+    return pd.Series(p, index=x_names, name='permutation_p')
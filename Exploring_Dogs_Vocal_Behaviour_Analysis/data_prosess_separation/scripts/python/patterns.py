@@ -0,0 +1,124 @@
+"""
+Response Pattern Deduplication
+------------------------------
+
+Each questionnaire block has only 4-10 binary columns, so the thousands of
+dogs collapse into at most a few hundred distinct answer patterns. This
+module groups identical rows into unique patterns with counts so that
+clustering, MCA and contingency tables can run on the weighted patterns,
+and maps the results back to the individual dogs afterwards.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class ResponsePatterns:
+    """
+    Unique rows of a 0/1 matrix with their multiplicities.
+
+    Attributes:
+    -----------
+    patterns : numpy.ndarray
+        Distinct rows, shape (n_patterns, n_columns), dtype uint8
+    counts : numpy.ndarray
+        Number of dogs giving each pattern
+    inverse : numpy.ndarray
+        Pattern index of every original row, so patterns[inverse] rebuilds
+        the full matrix
+    columns : list
+        Column names of the matrix
+    """
+
+    def __init__(self, patterns, counts, inverse, columns=None):
+        self.patterns = patterns
+        self.counts = counts
+        self.inverse = inverse
+        self.columns = list(columns) if columns is not None else list(range(patterns.shape[1]))
+
+    @classmethod
+    def from_matrix(cls, X, columns=None):
+        """
+        Group identical rows.
+
+        Parameters:
+        -----------
+        X : numpy.ndarray or pandas.DataFrame
+            0/1 matrix of shape (n_dogs, n_columns)
+        columns : list, optional
+            Column names; taken from the DataFrame when omitted
+
+        Returns:
+        --------
+        ResponsePatterns
+        """
+        if columns is None and isinstance(X, pd.DataFrame):
+            columns = X.columns
+        X = np.asarray(X, dtype=np.uint8)
+
+        # Rows are bit-packed and compared as raw bytes, which is much
+        # cheaper than np.unique(axis=0) on the unpacked matrix
+        packed = np.ascontiguousarray(np.packbits(X, axis=1))
+        keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+        _, first, inverse, counts = np.unique(keys, return_index=True,
+                                              return_inverse=True, return_counts=True)
+        return cls(X[first], counts, inverse.ravel(), columns)
+
+    @property
+    def n_rows(self):
+        """Number of original rows (dogs)"""
+        return len(self.inverse)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def frame(self):
+        """Distinct patterns as a DataFrame with a 'count' column"""
+        df = pd.DataFrame(self.patterns, columns=self.columns)
+        df['count'] = self.counts
+        return df
+
+    def broadcast(self, values):
+        """
+        Map per-pattern results (labels, coordinates, ...) back to every
+        original row.
+
+        Parameters:
+        -----------
+        values : array-like or pandas.DataFrame
+            One entry (or row) per pattern
+
+        Returns:
+        --------
+        Same type as values, one entry per original row
+        """
+        if isinstance(values, (pd.DataFrame, pd.Series)):
+            return values.iloc[self.inverse].reset_index(drop=True)
+        return np.asarray(values)[self.inverse]
+
+    def column_sums(self):
+        """Number of dogs answering yes to each column"""
+        return self.counts @ self.patterns.astype(np.int64)
+
+    def crosstab(self, labels):
+        """
+        Count yes answers per label for all columns at once.
+
+        Parameters:
+        -----------
+        labels : array-like
+            One label per pattern (e.g. a cluster assignment)
+
+        Returns:
+        --------
+        pandas.DataFrame
+            Labels x columns table of yes counts, with a 'total' column
+            holding the number of dogs per label
+        """
+        labels = np.asarray(labels)
+        levels, codes = np.unique(labels, return_inverse=True)
+        weighted = np.zeros((len(levels), len(self.counts)))
+        weighted[codes, np.arange(len(self.counts))] = self.counts
+        table = pd.DataFrame(weighted @ self.patterns, index=levels, columns=self.columns)
+        table['total'] = weighted.sum(axis=1)
+        return table.astype(np.int64)
@@ -0,0 +1,310 @@
+"""
+Analysis Pipeline Runner
+------------------------
+
+The analysis scripts used to run their steps strictly one after another
+and recompute everything on every invocation. This module declares the
+steps as a dependency graph instead:
+- stages whose inputs are ready run concurrently (threads or processes)
+- each stage's result is memoized on disk, keyed by the hash of its input
+  files, its parameters and the keys of the stages it depends on, so
+  changing one parameter only recomputes the stages downstream of it
+- markdown sections a stage writes with append_to_results and figure
+  specs it queues are captured with its result and replayed in
+  declaration order, so the report and the figures are the same whether
+  a stage ran concurrently, sequentially or from cache
+
+Memoized results are pickles under the given cache directory, one file per
+stage; a stage's old file is removed when its key changes. Code changes
+are not part of the key: pass force=[...] or call clear() after editing
+a stage.
+"""
+
+import hashlib
+import json
+import pickle
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+
+import shared_paths  # noqa: F401 - makes scripts/python importable
+from data_cache import file_hash
+
+EXECUTORS = ('thread', 'process')
+# Bumped whenever the layout of memoized results changes
+MEMO_VERSION = 2
+
+_recording = threading.local()
+
+
+@contextmanager
+def capture_outputs():
+    """
+    Collect the (section, content) pairs and figure specs emitted by the
+    current thread.
+    """
+    previous = (getattr(_recording, 'sections', None), getattr(_recording, 'figures', None))
+    _recording.sections, _recording.figures = sections, figures = [], []
+    try:
+        yield sections, figures
+    finally:
+        _recording.sections, _recording.figures = previous
+
+
+def captured_sections():
+    """
+    The section list being captured in this thread, or None when results
+    should be written directly.
+    """
+    return getattr(_recording, 'sections', None)
+
+
+def captured_figures():
+    """
+    The figure spec list being captured in this thread, or None when
+    figures should be queued directly.
+    """
+    return getattr(_recording, 'figures', None)
+
+
+def _execute(func, args):
+    """Run one stage and return its result with the sections and figures it emitted"""
+    with capture_outputs() as (sections, figures):
+        value = func(*args)
+    return value, sections, figures
+
+
+class Stage:
+    """One node of the pipeline graph"""
+
+    def __init__(self, name, func, deps=(), params=None, inputs=(), memoize=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.params = dict(params or {})
+        self.inputs = [Path(p) for p in inputs]
+        self.memoize = memoize
+
+
+class Pipeline:
+    """
+    Dependency-graph runner with per-stage disk memoization.
+    """
+
+    def __init__(self, cache_dir, n_jobs=None, executor='thread'):
+        """
+        Parameters:
+        -----------
+        cache_dir : str or Path
+            Directory for memoized stage results
+        n_jobs : int, optional
+            Stages run at the same time; None lets the executor decide,
+            1 runs every stage in the calling thread
+        executor : str
+            'thread' for stages that release the GIL or share state through
+            their owner object, 'process' for stages that must not share an
+            interpreter (e.g. pyplot figures); functions and their results
+            must then be picklable
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', "
+                             f"expected one of {', '.join(EXECUTORS)}")
+        self.cache_dir = Path(cache_dir)
+        self.n_jobs = n_jobs
+        self.executor = executor
+        self.stages = {}
+        self.sections = []
+        self.figures = []
+
+    def add(self, name, func, deps=(), params=None, inputs=(), memoize=True):
+        """
+        Declare a stage.
+
+        Parameters:
+        -----------
+        name : str
+            Unique stage name
+        func : callable
+            Called with the results of deps as positional arguments
+        deps : iterable of str
+            Stages that must finish first; they must already be declared
+        params : dict, optional
+            Settings the result depends on; only used for the memo key, so
+            func reads them from wherever it already gets them
+        inputs : iterable of str or Path
+            Files whose content the result depends on
+        memoize : bool
+            Store the result on disk; disable for cheap stages with large or
+            unpicklable results (the key still reaches dependent stages)
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already declared")
+        unknown = [dep for dep in deps if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on undeclared stages: {', '.join(unknown)}")
+        self.stages[name] = Stage(name, func, deps, params, inputs, memoize)
+        return self
+
+    def _keys(self, names):
+        """Memo key of every stage in names (declaration order)"""
+        keys = {}
+        hashes = {}
+        for name in names:
+            stage = self.stages[name]
+            inputs = []
+            for path in stage.inputs:
+                if path not in hashes:
+                    hashes[path] = file_hash(path) if path.exists() else None
+                inputs.append([path.name, hashes[path]])
+            payload = json.dumps({
+                'version': MEMO_VERSION,
+                'stage': name,
+                'params': stage.params,
+                'inputs': inputs,
+                'deps': [keys[dep] for dep in stage.deps],
+            }, sort_keys=True, default=repr)
+            keys[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return keys
+
+    def _required(self, targets):
+        """Targets and everything they depend on, in declaration order"""
+        if targets is None:
+            return list(self.stages)
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'")
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].deps)
+        return [name for name in self.stages if name in needed]
+
+    def _memo_file(self, name, key):
+        return self.cache_dir / f"{name}-{key[:16]}.pkl"
+
+    def _load_memo(self, name, key):
+        memo = self._memo_file(name, key)
+        if not memo.exists():
+            return None
+        try:
+            with open(memo, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            print(f"[pipeline] Ignoring unreadable result for {name}: {e}")
+            return None
+
+    def _save_memo(self, name, key, outcome):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        memo = self._memo_file(name, key)
+        for stale in self.cache_dir.glob(f"{name}-*.pkl"):
+            if stale != memo:
+                stale.unlink()
+        tmp = memo.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(outcome, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(memo)
+
+    def run(self, targets=None, force=()):
+        """
+        Run the pipeline.
+
+        Parameters:
+        -----------
+        targets : iterable of str, optional
+            Stages to produce (with their dependencies); None runs all
+        force : iterable of str
+            Stages to recompute even when a memoized result exists
+
+        Returns:
+        --------
+        dict
+            Stage name -> result
+
+        After the run, self.sections and self.figures hold the captured
+        report sections and figure specs of the executed stages in
+        declaration order.
+        """
+        names = self._required(targets)
+        keys = self._keys(names)
+        force = set(force)
+        results, outcomes = {}, {}
+        started = {}
+
+        def finish(name, outcome, source):
+            outcomes[name] = outcome
+            results[name] = outcome[0]
+            elapsed = time.perf_counter() - started.get(name, time.perf_counter())
+            detail = "cached" if source == 'cache' else f"{elapsed:.2f}s"
+            print(f"[pipeline] {name}: {detail}")
+
+        def ready():
+            return [name for name in names
+                    if name not in outcomes and name not in running.values()
+                    and all(dep in outcomes for dep in self.stages[name].deps)]
+
+        def launch(pool, name):
+            stage = self.stages[name]
+            if stage.memoize and name not in force:
+                outcome = self._load_memo(name, keys[name])
+                if outcome is not None:
+                    finish(name, outcome, 'cache')
+                    return None
+            args = tuple(results[dep] for dep in stage.deps)
+            started[name] = time.perf_counter()
+            if pool is None:
+                outcome = _execute(stage.func, args)
+                self._finish_run(name, keys[name], outcome)
+                finish(name, outcome, 'run')
+                return None
+            return pool.submit(_execute, stage.func, args)
+
+        running = {}
+        if self.n_jobs == 1:
+            while len(outcomes) < len(names):
+                for name in ready():
+                    launch(None, name)
+        else:
+            pool_class = ThreadPoolExecutor if self.executor == 'thread' else ProcessPoolExecutor
+            with pool_class(max_workers=self.n_jobs) as pool:
+                while len(outcomes) < len(names):
+                    # Cache hits finish immediately and can unlock more stages
+                    launched = True
+                    while launched:
+                        launched = False
+                        for name in ready():
+                            future = launch(pool, name)
+                            if future is None:
+                                launched = True
+                            else:
+                                running[future] = name
+                    if not running:
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            outcome = future.result()
+                        except BaseException:
+                            for other in running:
+                                other.cancel()
+                            raise
+                        self._finish_run(name, keys[name], outcome)
+                        finish(name, outcome, 'run')
+
+        self.sections = [section for name in names for section in outcomes[name][1]]
+        self.figures = [spec for name in names for spec in outcomes[name][2]]
+        return results
+
+    def _finish_run(self, name, key, outcome):
+        if self.stages[name].memoize:
+            self._save_memo(name, key, outcome)
+
+    def clear(self):
+        """Remove every memoized stage result"""
+        for name in self.stages:
+            for memo in self.cache_dir.glob(f"{name}-*.pkl"):
+                memo.unlink()
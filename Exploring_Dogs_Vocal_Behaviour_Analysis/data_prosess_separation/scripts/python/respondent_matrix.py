@@ -0,0 +1,184 @@
+"""
+Joined Respondent Matrix
+------------------------
+
+All questionnaire blocks describe the same dogs, keyed by ID_full. Instead
+of merging block DataFrames inside every analysis (or assuming that rows
+happen to line up by position), this module joins the blocks once into a
+single uint8 matrix with a sorted ID_full index.
+
+Analyses then slice a block's columns out of that matrix; the slices are
+numpy views, so no merge or copy happens per analysis.
+"""
+
+import numpy as np
+import pandas as pd
+
+from binary_store import ID_COLUMN, PackedTable
+
+
+class RespondentMatrix:
+    """
+    ID-indexed matrix of every loaded questionnaire block.
+
+    Attributes:
+    -----------
+    ids : numpy.ndarray
+        Sorted ID_full values, one per row
+    values : numpy.ndarray
+        uint8 answers of all blocks side by side
+    blocks : dict
+        Block name -> column slice into values
+    columns : dict
+        Block name -> list of (prefixed) column names
+    """
+
+    def __init__(self, ids, values, blocks, columns):
+        self.ids = ids
+        self.values = values
+        self.blocks = blocks
+        self.columns = columns
+        self.index = pd.Index(ids, name=ID_COLUMN)
+
+    @classmethod
+    def from_tables(cls, tables, prefixes=None):
+        """
+        Join packed tables on ID_full.
+
+        Parameters:
+        -----------
+        tables : dict
+            Block name -> PackedTable (or DataFrame with an ID_full column)
+        prefixes : dict, optional
+            Block name -> prefix added to that block's column names, which
+            keeps column names unique across blocks
+
+        Returns:
+        --------
+        RespondentMatrix
+            The joined matrix
+
+        Raises:
+        -------
+        ValueError
+            If a block has duplicate IDs or the blocks do not cover exactly
+            the same set of respondents
+        """
+        prefixes = prefixes or {}
+        ids = None
+        parts, blocks, columns = [], {}, {}
+        start = 0
+
+        for name, table in tables.items():
+            table_ids = np.asarray(table[ID_COLUMN])
+            order = np.argsort(table_ids, kind='stable')
+            sorted_ids = table_ids[order]
+
+            if len(sorted_ids) > 1 and (sorted_ids[1:] == sorted_ids[:-1]).any():
+                duplicates = np.unique(sorted_ids[1:][sorted_ids[1:] == sorted_ids[:-1]])
+                raise ValueError(
+                    f"Block '{name}' has duplicate {ID_COLUMN} values: {duplicates[:10].tolist()}")
+
+            if ids is None:
+                ids = sorted_ids
+            elif len(sorted_ids) != len(ids) or not np.array_equal(sorted_ids, ids):
+                missing = np.setdiff1d(ids, sorted_ids)
+                extra = np.setdiff1d(sorted_ids, ids)
+                raise ValueError(
+                    f"Block '{name}' is not aligned with the other blocks: "
+                    f"{len(missing)} IDs missing (e.g. {missing[:5].tolist()}), "
+                    f"{len(extra)} unexpected IDs (e.g. {extra[:5].tolist()})")
+
+            answer_cols = [col for col in table.columns if col != ID_COLUMN]
+            if isinstance(table, PackedTable):
+                block_values = table.to_numpy(answer_cols)
+            else:
+                block_values = table[answer_cols].to_numpy()
+            parts.append(block_values[order].astype(np.uint8, copy=False))
+
+            prefix = prefixes.get(name, '')
+            columns[name] = [f"{prefix}{col}" for col in answer_cols]
+            blocks[name] = slice(start, start + len(answer_cols))
+            start += len(answer_cols)
+
+        if ids is None:
+            raise ValueError("No blocks given")
+
+        values = np.hstack(parts) if parts else np.empty((0, 0), dtype=np.uint8)
+        return cls(ids, values, blocks, columns)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, name):
+        return name in self.blocks
+
+    def block(self, name):
+        """
+        Return a block's answers as a numpy view.
+
+        Parameters:
+        -----------
+        name : str
+            Block name
+
+        Returns:
+        --------
+        numpy.ndarray
+            uint8 matrix of shape (n_respondents, n_block_columns)
+        """
+        return self.values[:, self.blocks[name]]
+
+    def frame(self, name):
+        """
+        Return a block as a DataFrame indexed by ID_full, backed by the
+        matrix without copying.
+
+        Parameters:
+        -----------
+        name : str
+            Block name
+
+        Returns:
+        --------
+        pandas.DataFrame
+            Block answers with prefixed column names
+        """
+        return pd.DataFrame(self.block(name), index=self.index,
+                            columns=self.columns[name], copy=False)
+
+    def column(self, name, column):
+        """Return one column of a block as a Series indexed by ID_full"""
+        position = self.columns[name].index(column)
+        return pd.Series(self.block(name)[:, position], index=self.index, name=column)
+
+    def labels(self, values, name=None):
+        """
+        Wrap a per-respondent vector (e.g. cluster labels) as a Series on
+        the matrix index.
+
+        Parameters:
+        -----------
+        values : array-like or pandas.Series
+            One value per respondent. A Series is aligned by its ID_full
+            index; anything else must already be in matrix row order.
+        name : str, optional
+            Name of the resulting Series
+
+        Raises:
+        -------
+        ValueError
+            If the values do not cover exactly the matrix respondents
+        """
+        if isinstance(values, pd.Series):
+            if len(values) != len(self.ids) or not values.index.sort_values().equals(self.index):
+                raise ValueError(
+                    f"Series '{values.name}' is not indexed by the same {ID_COLUMN} "
+                    "values as the respondent matrix")
+            return values.reindex(self.index).rename(name or values.name)
+
+        values = np.asarray(values)
+        if len(values) != len(self.ids):
+            raise ValueError(
+                f"Expected {len(self.ids)} values (one per respondent), got {len(values)}")
+        return pd.Series(values, index=self.index, name=name)
@@ -0,0 +1,21 @@
+"""
+Shared Helper Path
+------------------
+
+The content-hash cache (data_cache.py), the column type helpers and the
+instrumentation live in scripts/python at the repository root, outside
+this folder. Importing this module makes them importable:
+
+    import shared_paths  # noqa: F401
+
+The folder is added to sys.path once per process, however many modules
+import this one.
+"""
+
+import sys
+from pathlib import Path
+
+SHARED_DIR = str(Path(__file__).resolve().parents[3] / "scripts" / "python")
+
+if SHARED_DIR not in sys.path:
+    sys.path.insert(0, SHARED_DIR)
@@ -0,0 +1,205 @@
+"""
+Bootstrap Cluster Stability
+---------------------------
+
+A clustering fitted once, from one seed on one sample, says nothing about
+how reproducible its clusters are. This module refits the clustering on
+bootstrap resamples of the dogs and compares every refit with the
+reference solution:
+- Jaccard stability per cluster (Hennig's clusterboot): the best overlap
+  of the reference cluster with any cluster of the refit; clusters with a
+  mean below 0.5 are usually considered dissolved
+- the adjusted Rand index between reference and refit labels, one value
+  per resample
+- co-assignment: how often two distinct answer patterns end up in the same
+  cluster, summarized per reference cluster
+
+The clustering runs on the deduplicated answer patterns (see patterns.py),
+so a bootstrap resample of the dogs is just a multinomial redraw of the
+pattern counts and every refit is a weighted fit on the same few hundred
+rows. Each refit is warm-started from the reference centers, which keeps
+cluster labels comparable and needs a single initialization instead of
+n_init. Warm starts make the check conservative in one direction only:
+a refit that stays near the reference optimum counts as stable, so low
+Jaccard values are a strong signal while values near 1 mean "no better
+solution nearby" rather than "the only solution". Resamples are processed
+in batches across a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from clustering import make_model
+
+
+def _pairs(x):
+    """Number of unordered pairs, element-wise"""
+    return x * (x - 1) / 2
+
+
+def weighted_table(reference, labels, weights, n_reference, n_labels):
+    """Reference x refit cluster table of summed row weights"""
+    table = np.zeros((n_reference, n_labels))
+    np.add.at(table, (reference, labels), weights)
+    return table
+
+
+def adjusted_rand_from_table(table):
+    """
+    Adjusted Rand index from a contingency table of (integer) counts.
+
+    Equals sklearn's adjusted_rand_score on the expanded labels.
+    """
+    n = table.sum()
+    sum_cells = _pairs(table).sum()
+    sum_rows = _pairs(table.sum(axis=1)).sum()
+    sum_cols = _pairs(table.sum(axis=0)).sum()
+    expected = sum_rows * sum_cols / _pairs(n) if n > 1 else 0.0
+    maximum = (sum_rows + sum_cols) / 2
+    if maximum == expected:
+        return 1.0
+    return (sum_cells - expected) / (maximum - expected)
+
+
+def jaccard_from_table(table):
+    """
+    Best Jaccard overlap of every reference cluster (table rows) with any
+    refit cluster (table columns); NaN for clusters absent from the sample.
+    """
+    rows = table.sum(axis=1, keepdims=True)
+    cols = table.sum(axis=0, keepdims=True)
+    union = rows + cols - table
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jaccard = np.where(union > 0, table / union, 0.0).max(axis=1)
+    jaccard[rows.ravel() == 0] = np.nan
+    return jaccard
+
+
+def _stability_batch(X, counts, reference, centers, method, seed, size):
+    """
+    Refit `size` bootstrap resamples (runs in a worker process).
+
+    Returns the per-resample Jaccard (size x k) and ARI values and the
+    summed co-assignment / co-occurrence matrices over the patterns.
+    """
+    rng = np.random.default_rng(seed)
+    k = len(centers)
+    n_patterns = len(counts)
+    n_dogs = int(counts.sum())
+    jaccard = np.empty((size, k))
+    ari = np.empty(size)
+    together = np.zeros((n_patterns, n_patterns))
+    present_both = np.zeros((n_patterns, n_patterns))
+
+    for i in range(size):
+        # Bootstrap sample of dogs = multinomial redraw of the pattern counts
+        weights = rng.multinomial(n_dogs, counts / n_dogs).astype(np.float64)
+        model = make_model(method, k, random_state=int(rng.integers(2**31)), init=centers)
+        model.fit(X, sample_weight=weights)
+        labels = model.predict(X)
+
+        present = weights > 0
+        table = weighted_table(reference[present], labels[present], weights[present], k, k)
+        jaccard[i] = jaccard_from_table(table)
+        ari[i] = adjusted_rand_from_table(table)
+
+        pair_present = np.outer(present, present)
+        present_both += pair_present
+        together += pair_present & (labels[:, None] == labels[None, :])
+
+    return jaccard, ari, together, present_both
+
+
+def bootstrap_stability(X, labels, centers, method='minibatch', sample_weight=None,
+                        n_resamples=200, batch_size=25, n_jobs=None, seed=42):
+    """
+    Bootstrap stability of a fitted clustering.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray
+        Rows the clustering was fitted on (distinct patterns, standardized
+        for 'minibatch', raw 0/1 for 'kmodes')
+    labels : array-like
+        Reference cluster of every row, values 0..k-1
+    centers : numpy.ndarray
+        Reference centers / modes; refits are warm-started from them
+    method : str
+        'minibatch' or 'kmodes', as used for the reference fit
+    sample_weight : numpy.ndarray, optional
+        Number of dogs behind every row (pattern counts); 1 per row if omitted
+    n_resamples : int
+        Number of bootstrap resamples
+    batch_size : int
+        Resamples per worker task
+    n_jobs : int, optional
+        Worker processes; None uses all cores, 1 runs in-process
+    seed : int
+        Seed for reproducible resamples
+
+    Returns:
+    --------
+    dict
+        'summary': per-cluster size, Jaccard mean/std/min, share of
+        resamples in which the cluster dissolved (Jaccard < 0.5) and mean
+        co-assignment of its distinct patterns;
+        'jaccard': resamples x clusters Jaccard values;
+        'ari': adjusted Rand index per resample;
+        'coassignment': patterns x patterns share of resamples (containing
+        both) in which two patterns were clustered together
+    """
+    X = np.asarray(X)
+    reference = np.asarray(labels)
+    centers = np.asarray(centers)
+    counts = (np.ones(X.shape[0]) if sample_weight is None
+              else np.asarray(sample_weight, dtype=np.float64))
+    k = len(centers)
+
+    n_batches = int(np.ceil(n_resamples / batch_size))
+    sizes = [batch_size] * (n_batches - 1) + [n_resamples - batch_size * (n_batches - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    args = [(X, counts, reference, centers, method, s, size) for s, size in zip(seeds, sizes)]
+
+    if n_jobs == 1 or n_batches == 1:
+        batches = [_stability_batch(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            batches = list(pool.map(_stability_batch, *zip(*args)))
+
+    jaccard = np.vstack([batch[0] for batch in batches])
+    ari = np.concatenate([batch[1] for batch in batches])
+    together = sum(batch[2] for batch in batches)
+    present_both = sum(batch[3] for batch in batches)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coassignment = together / present_both
+
+    # Mean co-assignment over pairs of distinct patterns within a cluster,
+    # weighted by the number of dog pairs they stand for
+    pair_weights = np.outer(counts, counts)
+    np.fill_diagonal(pair_weights, 0)
+    within = []
+    for c in range(k):
+        members = reference == c
+        w = pair_weights[np.ix_(members, members)]
+        values = coassignment[np.ix_(members, members)]
+        within.append(np.nansum(w * values) / w.sum() if w.sum() else np.nan)
+
+    clusters = pd.Index(range(k), name='Cluster')
+    summary = pd.DataFrame({
+        'size': [counts[reference == c].sum() for c in range(k)],
+        'jaccard_mean': np.nanmean(jaccard, axis=0),
+        'jaccard_std': np.nanstd(jaccard, axis=0),
+        'jaccard_min': np.nanmin(jaccard, axis=0),
+        'dissolved': np.mean(np.nan_to_num(jaccard, nan=0.0) < 0.5, axis=0),
+        'coassignment': within,
+    }, index=clusters)
+    summary['size'] = summary['size'].astype(np.int64)
+
+    return {
+        'summary': summary,
+        'jaccard': pd.DataFrame(jaccard, columns=clusters),
+        'ari': pd.Series(ari, name='ari'),
+        'coassignment': coassignment,
+    }
@@ -0,0 +1,216 @@
+"""
+Stratified Statistics
+---------------------
+
+Per-language (or per-country) results without re-running the analysis
+once per subgroup. Everything the stratified report needs derives from
+the sufficient statistics of each stratum (see sufficient_stats.py), and
+those are counted for all strata in one pass over the respondent matrix.
+The rows are sorted by stratum (and by stratum x cluster) once, so every
+stratum is a contiguous slice:
+- "yes" counts per stratum: np.add.reduceat over the slice boundaries
+- cluster counts per stratum: the same over the stratum x cluster slices
+- co-occurrence X'X per stratum: each slice contributes its own X_s'X_s
+No group-indicator matrices are built, so memory stays at the size of the
+0/1 matrix itself.
+
+Deriving the tests from the counts (percentages, phi / chi-square tables,
+cluster x answer tests) is independent per stratum and can be spread over
+a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import shared_paths  # noqa: F401 - makes scripts/python importable
+from associations import associations_long
+from binary_store import ID_COLUMN
+from multiple_testing import adjust_pvalues
+from sufficient_stats import SufficientStatistics
+
+# Rows converted to float at a time for the X'X products
+CHUNK_ROWS = 65536
+
+
+def read_groups(source, column, id_column=ID_COLUMN):
+    """
+    Read the grouping column of every respondent, e.g. lang from the base
+    export.
+
+    Parameters:
+    -----------
+    source : str or Path
+        Table (.xlsx, .csv or .parquet) with an ID column and the grouping
+        column, read through the content-hash cache
+    column : str
+        Grouping column
+    id_column : str
+        Respondent ID column
+
+    Returns:
+    --------
+    pandas.Series
+        Group of every respondent, indexed by ID
+    """
+    from data_cache import read_table
+
+    df = read_table(source, compact=True)
+    missing = [col for col in (id_column, column) if col not in df.columns]
+    if missing:
+        raise KeyError(f"Columns not found in {source}: {', '.join(missing)}")
+    groups = df[[id_column, column]].dropna(subset=[id_column]).drop_duplicates(id_column)
+    return groups.set_index(id_column)[column]
+
+
+def _segment_sums(X, sizes):
+    """Column sums of consecutive row segments of the given sizes; empty segments sum to 0"""
+    sums = np.zeros((len(sizes), X.shape[1]), dtype=np.int64)
+    nonempty = sizes > 0
+    if nonempty.any():
+        starts = (np.cumsum(sizes) - sizes)[nonempty]
+        sums[nonempty] = np.add.reduceat(X, starts, axis=0, dtype=np.int64)
+    return sums
+
+
+def grouped_statistics(matrix, groups, labels=None, n_clusters=None, min_size=1):
+    """
+    Sufficient statistics of every stratum, counted in one pass.
+
+    Parameters:
+    -----------
+    matrix : RespondentMatrix
+        Joined respondent matrix
+    groups : pandas.Series
+        Group of every respondent, indexed by ID_full; respondents without
+        a group are left out
+    labels : pandas.Series or array-like, optional
+        Cluster (0..k-1) of every respondent, for per-stratum cluster counts
+    n_clusters : int, optional
+        Number of clusters; taken from the labels when omitted
+    min_size : int
+        Strata with fewer respondents are dropped
+
+    Returns:
+    --------
+    dict
+        Group level -> SufficientStatistics, largest stratum first
+    """
+    group_of = pd.Series(groups).reindex(matrix.index).to_numpy()
+    codes, levels = pd.factorize(group_of)
+    member = codes >= 0
+    codes = codes[member]
+    ids = np.asarray(matrix.ids, dtype=np.int64)[member]
+    n_groups = len(levels)
+    sizes = np.bincount(codes, minlength=n_groups)
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+
+    if labels is not None:
+        # Sorting by stratum x cluster keeps every stratum contiguous and
+        # makes each of its clusters a contiguous sub-slice
+        cluster = matrix.labels(labels).to_numpy()[member].astype(np.int64)
+        n_clusters = int(cluster.max()) + 1 if n_clusters is None else n_clusters
+        cell = codes * n_clusters + cluster
+        order = np.argsort(cell, kind='stable')
+        cell_sizes = np.bincount(cell, minlength=n_groups * n_clusters)
+    else:
+        order = np.argsort(codes, kind='stable')
+    X_sorted = matrix.values[member][order]
+
+    sums = _segment_sums(X_sorted, sizes)
+    cooccurrence = np.zeros((n_groups, X_sorted.shape[1], X_sorted.shape[1]), dtype=np.int64)
+    for g, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        for first in range(start, stop, CHUNK_ROWS):
+            block = X_sorted[first:min(first + CHUNK_ROWS, stop)].astype(np.float64)
+            cooccurrence[g] += np.rint(block.T @ block).astype(np.int64)
+
+    if labels is not None:
+        cluster_counts = _segment_sums(X_sorted, cell_sizes).reshape(n_groups, n_clusters, -1)
+        cluster_sizes = cell_sizes.reshape(n_groups, n_clusters)
+
+    strata = {}
+    for g in np.argsort(-sizes, kind='stable'):
+        if sizes[g] < min_size:
+            continue
+        stats = SufficientStatistics(matrix.blocks, matrix.columns,
+                                     n_clusters if labels is not None else None)
+        stats.ids = np.sort(ids[order[bounds[g]:bounds[g + 1]]])
+        stats.sums = sums[g]
+        stats.cooccurrence = cooccurrence[g]
+        if labels is not None:
+            stats.cluster_counts = cluster_counts[g]
+            stats.cluster_sizes = cluster_sizes[g]
+        strata[levels[g]] = stats
+    return strata
+
+
+def stratum_summary(stats, problems=None, cluster_blocks=('origin',), correction='fdr_bh'):
+    """
+    Results of one stratum (runs in a worker process).
+
+    Parameters:
+    -----------
+    stats : SufficientStatistics
+        Counts of the stratum
+    problems : list of str, optional
+        problems columns crossed with the keeping conditions; all when
+        omitted
+    cluster_blocks : iterable of str
+        Blocks crossed with the clusters
+    correction : str
+        Multiple-testing correction of each battery of tests
+
+    Returns:
+    --------
+    dict
+        'n'; 'growl': growl percentages; 'associations': keeping
+        conditions x problems in long form; 'clusters': cluster x answer
+        tests; 'cluster_pct': percentage of "yes" per cluster (any key is
+        missing when its blocks were not counted)
+    """
+    summary = {'n': stats.n}
+    if 'growl' in stats.blocks:
+        summary['growl'] = stats.percentages('growl')
+    if 'keep' in stats.blocks and 'problems' in stats.blocks:
+        associations = stats.associations('keep', 'problems', y_columns=problems)
+        long_df = associations_long({'phi': associations['phi'],
+                                     'p_value': associations['p_value']})
+        long_df['adjusted_p'] = adjust_pvalues(long_df['p_value'], correction)
+        summary['associations'] = long_df
+    blocks = [name for name in cluster_blocks if name in stats.blocks]
+    if stats.cluster_counts is not None and blocks:
+        contingency = stats.cluster_contingency(blocks)
+        tests = contingency['tests']
+        tests['adjusted_p'] = adjust_pvalues(tests['p_value'], correction)
+        summary['clusters'] = tests
+        summary['cluster_pct'] = contingency['row_pct']
+    return summary
+
+
+def summarize_strata(strata, n_jobs=1, **kwargs):
+    """
+    stratum_summary for every stratum, optionally across worker processes.
+
+    Parameters:
+    -----------
+    strata : dict
+        Group level -> SufficientStatistics (see grouped_statistics)
+    n_jobs : int, optional
+        Worker processes; None uses all cores, 1 runs in-process
+    **kwargs
+        Passed to stratum_summary
+
+    Returns:
+    --------
+    dict
+        Group level -> summary, in the order of strata
+    """
+    levels = list(strata)
+    if n_jobs == 1 or len(levels) < 2:
+        summaries = [stratum_summary(strata[level], **kwargs) for level in levels]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(stratum_summary, strata[level], **kwargs) for level in levels]
+            summaries = [future.result() for future in futures]
+    return dict(zip(levels, summaries))
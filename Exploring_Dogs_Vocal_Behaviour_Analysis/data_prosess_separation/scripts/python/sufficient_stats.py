@@ -0,0 +1,307 @@
+"""
+Incremental Sufficient Statistics
+---------------------------------
+
+Percentages, phi / chi-square tables, cluster x answer tests and MCA Burt
+matrices all derive exactly from a few counts over the 0/1 answers:
+- the number of dogs n
+- the "yes" count of every column (column sums)
+- the "both yes" count of every pair of columns (co-occurrence, X'X)
+- the "yes" count of every column within every cluster, plus the
+  cluster sizes
+
+This module keeps those counts on disk for all blocks of a
+RespondentMatrix. When a new survey wave arrives, only the respondents
+whose ID_full has not been seen yet are folded in, so an update costs
+O(new rows x columns^2) instead of re-reading and re-counting the whole
+population. Folding a wave twice is a no-op.
+
+Cluster counts need a label for every new dog; the labels come from the
+frozen reference clustering (see DogVocalizationAnalysis.update_statistics),
+so the clusters themselves are not re-fitted between full runs.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from associations import associations_from_counts, cluster_contingency_from_counts
+from mca_engine import IndicatorMCA
+
+STATS_VERSION = 1
+
+
+class SufficientStatistics:
+    """
+    Column sums, co-occurrence and cluster counts of every seen respondent.
+
+    Attributes:
+    -----------
+    ids : numpy.ndarray
+        Sorted ID_full values already counted
+    blocks : dict
+        Block name -> column slice, as in RespondentMatrix
+    columns : dict
+        Block name -> list of (prefixed) column names
+    sums : numpy.ndarray
+        "Yes" count of every column (int64)
+    cooccurrence : numpy.ndarray
+        "Both yes" count of every pair of columns, X'X (int64)
+    cluster_sizes : numpy.ndarray or None
+        Number of dogs per cluster
+    cluster_counts : numpy.ndarray or None
+        Clusters x columns "yes" counts
+    waves : list of dict
+        Log of the folded waves (time, new and skipped rows)
+    """
+
+    def __init__(self, blocks, columns, n_clusters=None):
+        """
+        Parameters:
+        -----------
+        blocks : dict
+            Block name -> column slice
+        columns : dict
+            Block name -> list of column names
+        n_clusters : int, optional
+            Number of clusters to count answers for; None keeps no cluster
+            counts
+        """
+        self.blocks = dict(blocks)
+        self.columns = {name: list(cols) for name, cols in columns.items()}
+        p = sum(len(cols) for cols in self.columns.values())
+        self.ids = np.empty(0, dtype=np.int64)
+        self.sums = np.zeros(p, dtype=np.int64)
+        self.cooccurrence = np.zeros((p, p), dtype=np.int64)
+        if n_clusters is None:
+            self.cluster_sizes = self.cluster_counts = None
+        else:
+            self.cluster_sizes = np.zeros(n_clusters, dtype=np.int64)
+            self.cluster_counts = np.zeros((n_clusters, p), dtype=np.int64)
+        self.waves = []
+
+    @property
+    def n(self):
+        """Number of respondents counted"""
+        return len(self.ids)
+
+    @classmethod
+    def from_matrix(cls, matrix, labels=None, n_clusters=None):
+        """
+        Count a whole RespondentMatrix.
+
+        Parameters:
+        -----------
+        matrix : RespondentMatrix
+            Joined respondent matrix
+        labels : pandas.Series or array-like, optional
+            Cluster (0..k-1) of every respondent
+        n_clusters : int, optional
+            Number of clusters; taken from the labels when omitted
+        """
+        if labels is not None and n_clusters is None:
+            n_clusters = int(np.max(np.asarray(labels))) + 1
+        stats = cls(matrix.blocks, matrix.columns, n_clusters)
+        stats.fold(matrix, labels)
+        return stats
+
+    def _check_layout(self, matrix):
+        if {name: list(cols) for name, cols in matrix.columns.items()} != self.columns:
+            raise ValueError("New respondents do not have the blocks and columns "
+                             "the statistics were collected for")
+
+    def fold(self, matrix, labels=None):
+        """
+        Add the respondents of a matrix that were not counted yet.
+
+        Parameters:
+        -----------
+        matrix : RespondentMatrix
+            A new wave (or the full data; known IDs are skipped)
+        labels : pandas.Series or array-like, optional
+            Cluster of every respondent of the matrix; required when the
+            statistics keep cluster counts
+
+        Returns:
+        --------
+        int
+            Number of respondents folded in
+
+        Raises:
+        -------
+        ValueError
+            If the matrix has other columns or labels are missing
+        """
+        self._check_layout(matrix)
+        ids = np.asarray(matrix.ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        known = positions < len(self.ids)
+        known[known] = self.ids[positions[known]] == ids[known]
+        new = ~known
+
+        if self.cluster_counts is not None:
+            if labels is None:
+                raise ValueError("Cluster labels are required to update the cluster counts")
+            cluster = matrix.labels(labels).to_numpy()[new].astype(np.int64)
+            if len(cluster) and (cluster.min() < 0 or cluster.max() >= len(self.cluster_sizes)):
+                raise ValueError(f"Cluster labels must lie in 0..{len(self.cluster_sizes) - 1}")
+
+        X = matrix.values[new].astype(np.float64)
+        if len(X):
+            # Counts of a wave stay far below 2**53, so float products are exact
+            self.sums += X.sum(axis=0).astype(np.int64)
+            self.cooccurrence += np.rint(X.T @ X).astype(np.int64)
+            if self.cluster_counts is not None:
+                one_hot = np.zeros((len(self.cluster_sizes), len(X)))
+                one_hot[cluster, np.arange(len(X))] = 1
+                self.cluster_sizes += one_hot.sum(axis=1).astype(np.int64)
+                self.cluster_counts += np.rint(one_hot @ X).astype(np.int64)
+            self.ids = np.union1d(self.ids, ids[new])
+
+        self.waves.append({'time': datetime.now().isoformat(timespec='seconds'),
+                           'new': int(new.sum()), 'skipped': int(known.sum())})
+        return int(new.sum())
+
+    # -- derived statistics --------------------------------------------------
+
+    def _positions(self, block, columns=None):
+        names = self.columns[block]
+        start = self.blocks[block].start
+        if columns is None:
+            return np.arange(start, start + len(names)), list(names)
+        return np.array([start + names.index(col) for col in columns]), list(columns)
+
+    def percentages(self, block):
+        """Percentage of dogs answering yes to every column of a block"""
+        positions, names = self._positions(block)
+        return pd.Series(self.sums[positions] / self.n * 100, index=names)
+
+    def associations(self, x_block, y_block, x_columns=None, y_columns=None, **kwargs):
+        """
+        All 2x2 association statistics between two blocks.
+
+        Parameters:
+        -----------
+        x_block, y_block : str
+            Block names
+        x_columns, y_columns : list of str, optional
+            Restrict to these (prefixed) columns
+        **kwargs
+            Passed to associations_from_counts (e.g. yates)
+
+        Returns:
+        --------
+        dict
+            As associations.compute_associations on the raw answers
+        """
+        x_pos, x_names = self._positions(x_block, x_columns)
+        y_pos, y_names = self._positions(y_block, y_columns)
+        return associations_from_counts(self.n, self.sums[x_pos], self.sums[y_pos],
+                                        self.cooccurrence[np.ix_(x_pos, y_pos)],
+                                        x_names, y_names, **kwargs)
+
+    def cluster_contingency(self, blocks=None, **kwargs):
+        """
+        Cluster x answer tests for several blocks.
+
+        Returns:
+        --------
+        dict
+            As associations.cluster_block_contingency
+        """
+        if self.cluster_counts is None:
+            raise ValueError("These statistics keep no cluster counts")
+        blocks = list(self.blocks) if blocks is None else list(blocks)
+        positions = np.concatenate([self._positions(name)[0] for name in blocks])
+        names = [col for name in blocks for col in self.columns[name]]
+        results = cluster_contingency_from_counts(self.cluster_counts[:, positions],
+                                                  self.cluster_sizes,
+                                                  list(range(len(self.cluster_sizes))),
+                                                  names, **kwargs)
+        results['tests'].insert(0, 'block', np.repeat(blocks, [len(self.columns[name])
+                                                               for name in blocks]))
+        return results
+
+    def mca(self, block, n_components=2):
+        """
+        MCA of a block, solved from its Burt matrix.
+
+        Returns:
+        --------
+        IndicatorMCA
+            Identical to IndicatorMCA(solver='gram').fit on the raw answers
+        """
+        positions, names = self._positions(block)
+        return IndicatorMCA.from_statistics(self.n, self.sums[positions],
+                                            self.cooccurrence[np.ix_(positions, positions)],
+                                            names, n_components=n_components)
+
+    # -- persistence ---------------------------------------------------------
+
+    @staticmethod
+    def exists(directory):
+        """Check whether statistics were saved to a directory"""
+        return (Path(directory) / "meta.json").exists()
+
+    def save(self, directory):
+        """
+        Write the statistics to directory/statistics.npz and meta.json.
+
+        meta.json is written last; load() refuses arrays that do not match
+        it, e.g. after an interrupted save.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {'ids': self.ids, 'sums': self.sums, 'cooccurrence': self.cooccurrence}
+        if self.cluster_counts is not None:
+            arrays.update(cluster_sizes=self.cluster_sizes, cluster_counts=self.cluster_counts)
+        tmp = directory / "statistics.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, directory / "statistics.npz")
+
+        meta = {
+            'version': STATS_VERSION,
+            'n': self.n,
+            'blocks': {name: [s.start, s.stop] for name, s in self.blocks.items()},
+            'columns': self.columns,
+            'waves': self.waves,
+        }
+        tmp = directory / "meta.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, directory / "meta.json")
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Read statistics written by save.
+
+        Raises:
+        -------
+        ValueError
+            If the files were written by an incompatible version
+        """
+        directory = Path(directory)
+        with open(directory / "meta.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != STATS_VERSION:
+            raise ValueError(f"Statistics in {directory} have version {meta.get('version')}, "
+                             f"expected {STATS_VERSION}")
+        blocks = {name: slice(start, stop) for name, (start, stop) in meta['blocks'].items()}
+        with np.load(directory / "statistics.npz") as data:
+            n_clusters = len(data['cluster_sizes']) if 'cluster_sizes' in data else None
+            stats = cls(blocks, meta['columns'], n_clusters)
+            stats.ids = data['ids']
+            stats.sums = data['sums']
+            stats.cooccurrence = data['cooccurrence']
+            if n_clusters is not None:
+                stats.cluster_sizes = data['cluster_sizes']
+                stats.cluster_counts = data['cluster_counts']
+        if len(stats.ids) != meta['n']:
+            raise ValueError(f"Statistics in {directory} are incomplete")
+        stats.waves = meta['waves']
+        return stats
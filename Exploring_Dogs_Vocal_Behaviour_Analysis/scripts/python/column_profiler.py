@@ -0,0 +1,449 @@
+"""
+Streaming Column Profiler
+-------------------------
+
+Profiles every column of a table in one chunked pass, replacing
+DataFrame.describe(include='all'), which needs the whole table in memory
+and makes several passes with exact unique counts per column.
+
+Per column the profile keeps small, mergeable summaries:
+- count, missing values and values that are not numeric
+- mean and variance (Chan's parallel update), minimum and maximum
+- value frequencies, exact up to `capacity` distinct values and a
+  Misra-Gries summary beyond (top value and its count stay reliable)
+- a HyperLogLog sketch for the distinct count
+- a t-digest for the quantiles
+
+As long as a column has at most `capacity` distinct values (true for the
+coded survey answers) unique, top, freq and the quantiles are computed
+exactly from the frequencies; the sketches only take over for
+high-cardinality columns such as free text or IDs.
+
+Profiles of separate chunks merge into the profile of their union, so
+chunks can be profiled in worker processes and combined afterwards.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROFILE_ROWS = ('count', 'missing', 'non_numeric', 'unique', 'top', 'freq', 'mean', 'std',
+                'min', '25%', '50%', '75%', 'max', 'exact')
+
+
+def _bit_length(x):
+    """Number of significant bits of every uint64 value"""
+    x = x.copy()
+    length = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = x >= (np.uint64(1) << np.uint64(shift))
+        length[high] += shift
+        x[high] >>= np.uint64(shift)
+    return length + (x > 0)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch over 64-bit value hashes.
+
+    The standard error is about 1.04 / sqrt(2**precision), 1.6% for the
+    default precision of 12 (4096 one-byte registers).
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Add uint64 hashes of values"""
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes << p
+        # Position of the first 1 bit after the index bits
+        rank = np.where(rest == 0, 64 - self.precision + 1, 64 - _bit_length(rest) + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        """Union with a sketch of the same precision"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """Estimated number of distinct values"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch: sorted centroids whose size shrinks towards
+    the tails (arcsine scale function), so extreme quantiles stay accurate.
+
+    New values and merged digests are added as centroids and the whole set
+    is compressed again, which keeps at most about compression / 2
+    centroids.
+    """
+
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def total(self):
+        return self.weights.sum()
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q_left = (cumulative - weights) / cumulative[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1))
+        bins = np.floor(k - k[0]).astype(np.int64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def update(self, values):
+        """Add finite float values"""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other):
+        """Add the centroids of another digest"""
+        if len(other.weights):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+        return self
+
+    def quantile(self, q):
+        """Approximate quantile(s) q in [0, 1]"""
+        if not len(self.weights):
+            return np.full(np.shape(q), np.nan)
+        total = self.total
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(np.asarray(q) * total, np.concatenate([[0], centers, [total]]),
+                         np.concatenate([[self.min], self.means, [self.max]]))
+
+
+def _quantiles_from_counts(values, counts, qs):
+    """Exact quantiles (linear interpolation, as pandas) from a frequency table"""
+    order = np.argsort(values)
+    values, counts = values[order], counts[order]
+    upper = np.cumsum(counts) - 1            # last position of every value
+    positions = np.asarray(qs) * (counts.sum() - 1)
+    low = values[np.searchsorted(upper, np.floor(positions))]
+    high = values[np.searchsorted(upper, np.ceil(positions))]
+    return low + (high - low) * (positions - np.floor(positions))
+
+
+class ColumnProfile:
+    """
+    Mergeable one-pass summary of a single column.
+    """
+
+    def __init__(self, capacity=1000, precision=12, compression=200):
+        """
+        Parameters:
+        -----------
+        capacity : int
+            Distinct values whose frequencies are kept exactly
+        precision : int
+            HyperLogLog precision (2**precision registers)
+        compression : int
+            t-digest compression
+        """
+        self.capacity = capacity
+        self.count = 0
+        self.missing = 0
+        self.n_numeric = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.frequencies = pd.Series(dtype=np.float64)
+        self.frequency_error = 0
+        self.hll = HyperLogLog(precision)
+        self.digest = TDigest(compression)
+
+    def _add_moments(self, n, mean, m2):
+        """Chan et al.'s pairwise combination of count, mean and M2"""
+        if not n:
+            return
+        total = self.n_numeric + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n_numeric * n / total
+        self.n_numeric = total
+
+    def _add_frequencies(self, counts, error=0):
+        frequencies = self.frequencies.add(counts, fill_value=0)
+        self.frequency_error += error
+        if len(frequencies) > self.capacity:
+            # Misra-Gries: subtract the (capacity + 1)-th largest count
+            # from every value and forget the ones that drop to zero
+            threshold = np.partition(frequencies.to_numpy(), -(self.capacity + 1))[-(self.capacity + 1)]
+            frequencies = frequencies - threshold
+            frequencies = frequencies[frequencies > 0]
+            self.frequency_error += threshold
+        self.frequencies = frequencies
+
+    def update(self, values):
+        """
+        Add a chunk of values.
+
+        Parameters:
+        -----------
+        values : pandas.Series
+            Raw values of the column in this chunk
+        """
+        present = values.dropna()
+        self.count += len(present)
+        self.missing += len(values) - len(present)
+        if not len(present):
+            return
+
+        if pd.api.types.is_datetime64_any_dtype(present) or pd.api.types.is_timedelta64_dtype(present):
+            # Dates are profiled like text (unique, top, freq) as with Excel sources
+            numeric = pd.Series(np.nan, index=present.index)
+        elif pd.api.types.is_bool_dtype(present) or not pd.api.types.is_numeric_dtype(present):
+            numeric = pd.to_numeric(present, errors='coerce')
+        else:
+            numeric = present
+        numeric = numeric.astype(np.float64)
+        is_numeric = numeric.notna().to_numpy()
+        numbers = numeric.to_numpy()[is_numeric]
+        others = present[~is_numeric].astype(str)
+
+        if len(numbers):
+            self._add_moments(len(numbers), numbers.mean(), ((numbers - numbers.mean()) ** 2).sum())
+            self.digest.update(numbers)
+        # Numbers are keyed and hashed as floats, so 1 and 1.0 from
+        # different chunks (or file types) count as the same value
+        self.hll.add_hashes(pd.util.hash_array(numbers))
+        self.hll.add_hashes(pd.util.hash_array(others.to_numpy(dtype=object)))
+        counts = pd.concat([pd.Series(numbers).value_counts(), others.value_counts()])
+        self._add_frequencies(counts.groupby(level=0).sum())
+
+    def merge(self, other):
+        """Combine with the profile of other rows of the same column"""
+        self.count += other.count
+        self.missing += other.missing
+        self._add_moments(other.n_numeric, other.mean, other.m2)
+        self._add_frequencies(other.frequencies, other.frequency_error)
+        self.hll.merge(other.hll)
+        self.digest.merge(other.digest)
+        return self
+
+    @property
+    def exact(self):
+        """True while every distinct value has an exact frequency"""
+        return self.frequency_error == 0
+
+    def summary(self):
+        """
+        Statistics of the column.
+
+        Returns:
+        --------
+        dict
+            One value per entry of PROFILE_ROWS; numeric statistics cover the
+            numeric values and are NaN when there are none
+        """
+        exact = self.exact
+        summary = {name: np.nan for name in PROFILE_ROWS}
+        summary.update(count=self.count, missing=self.missing,
+                       non_numeric=self.count - self.n_numeric, exact=exact)
+        if not self.count:
+            summary['unique'] = 0
+            return summary
+
+        summary['unique'] = len(self.frequencies) if exact else round(self.hll.estimate())
+        if len(self.frequencies):
+            # Beyond capacity the kept count undercounts by at most frequency_error;
+            # no value is left when all are about equally rare (e.g. IDs)
+            summary['top'] = self.frequencies.idxmax()
+            summary['freq'] = int(self.frequencies.max())
+        if self.n_numeric:
+            summary['mean'] = self.mean
+            summary['std'] = math.sqrt(self.m2 / (self.n_numeric - 1)) if self.n_numeric > 1 else np.nan
+            summary['min'] = self.digest.min
+            summary['max'] = self.digest.max
+            qs = (0.25, 0.5, 0.75)
+            if exact:
+                numeric = self.frequencies[[isinstance(v, float) for v in self.frequencies.index]]
+                quantiles = _quantiles_from_counts(numeric.index.to_numpy(dtype=np.float64),
+                                                   numeric.to_numpy(), qs)
+            else:
+                quantiles = self.digest.quantile(qs)
+            summary.update(zip(('25%', '50%', '75%'), quantiles))
+        return summary
+
+
+class TableProfile:
+    """
+    Column profiles of a whole table, built chunk by chunk.
+    """
+
+    def __init__(self, **options):
+        """
+        Parameters:
+        -----------
+        **options
+            Passed to every ColumnProfile (capacity, precision, compression)
+        """
+        self.options = options
+        self.columns = {}
+        self.n_rows = 0
+
+    def update(self, chunk):
+        """Add a DataFrame chunk; new columns get a profile on first sight"""
+        self.n_rows += len(chunk)
+        for name in chunk.columns:
+            if name not in self.columns:
+                self.columns[name] = ColumnProfile(**self.options)
+                # Rows seen before the column appeared count as missing
+                self.columns[name].missing = self.n_rows - len(chunk)
+            self.columns[name].update(chunk[name])
+        return self
+
+    def merge(self, other):
+        """Combine with the profile of other rows of the same table"""
+        for name, profile in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(profile)
+            else:
+                profile.missing += self.n_rows
+                self.columns[name] = profile
+        for name, profile in self.columns.items():
+            if name not in other.columns:
+                profile.missing += other.n_rows
+        self.n_rows += other.n_rows
+        return self
+
+    def to_frame(self):
+        """Statistics x columns DataFrame, laid out like describe()"""
+        return pd.DataFrame({name: profile.summary() for name, profile in self.columns.items()},
+                            index=list(PROFILE_ROWS))
+
+
+def iter_chunks(source, chunk_size=50000, sheet_name=0):
+    """
+    Read a table in chunks without loading it as a whole.
+
+    Parameters:
+    -----------
+    source : str or Path
+        .xlsx (streamed in openpyxl read-only mode), .csv, .parquet or a
+        pickled DataFrame (.pkl, read at once)
+    chunk_size : int
+        Rows per chunk
+    sheet_name : str or int
+        Worksheet of Excel sources
+
+    Yields:
+    -------
+    pandas.DataFrame
+    """
+    source = Path(source)
+    suffix = source.suffix.lower()
+    if suffix in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            sheet = (workbook.worksheets[sheet_name] if isinstance(sheet_name, int)
+                     else workbook[sheet_name])
+            rows = sheet.iter_rows(values_only=True)
+            header = [str(name) if name is not None else f"Unnamed: {i}"
+                      for i, name in enumerate(next(rows))]
+            buffer = []
+            for row in rows:
+                # Short rows (trailing empty cells) are padded to the header
+                buffer.append(row + (None,) * (len(header) - len(row)))
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=header)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=header)
+        finally:
+            workbook.close()
+    elif suffix == '.csv':
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    elif suffix == '.parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif suffix == '.pkl':
+        df = pd.read_pickle(source)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        raise ValueError(f"Unsupported source file type: {source.suffix}")
+
+
+def _profile_chunk(chunk, options):
+    """Profile one chunk (runs in a worker process)"""
+    return TableProfile(**options).update(chunk)
+
+
+def profile_table(source, chunk_size=50000, n_jobs=1, sheet_name=0, **options):
+    """
+    Profile a table file in one chunked pass.
+
+    Parameters:
+    -----------
+    source : str or Path
+        Table file, see iter_chunks
+    chunk_size : int
+        Rows per chunk
+    n_jobs : int, optional
+        Worker processes profiling chunks while the next ones are read;
+        1 profiles in-process, None uses all cores
+    sheet_name : str or int
+        Worksheet of Excel sources
+    **options
+        ColumnProfile options (capacity, precision, compression)
+
+    Returns:
+    --------
+    TableProfile
+    """
+    chunks = iter_chunks(source, chunk_size, sheet_name)
+    profile = TableProfile(**options)
+    if n_jobs == 1:
+        for chunk in chunks:
+            profile.update(chunk)
+        return profile
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        # At most two chunks per worker are in flight, which bounds memory
+        limit = 2 * (n_jobs or os.cpu_count() or 1)
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_profile_chunk, chunk, options))
+            if len(pending) >= limit:
+                profile.merge(pending.pop(0).result())
+        for future in pending:
+            profile.merge(future.result())
+    return profile
@@ -0,0 +1,120 @@
+"""
+Compact Column Types
+--------------------
+
+pandas reads the base export with wide default types: every text column
+(lang, country, ...) becomes an object column of Python strings and every
+flag (fill, repfilt_full, the 0/1 answers) becomes int64, or float64 as
+soon as one cell is empty. This module infers the narrowest type that
+holds each column exactly:
+- text with few distinct values -> category
+- whole numbers -> the smallest integer type covering their range
+  (int8 for 0/1 flags); the nullable Int8 / Int16 / ... types when
+  values are missing, so flags stay integers instead of floats
+- fractional numbers -> float32 when every value survives the round trip,
+  float64 otherwise
+
+The inferred schema is a plain {column: dtype} dict that apply_schema
+converts a frame to. data_cache caches the converted frame itself, so
+later loads of the same content come back compact without inferring again.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Text columns become categories up to this many distinct values, and only
+# while the distinct values are at most this share of the non-empty cells
+MAX_CATEGORIES = 5000
+MAX_CATEGORY_RATIO = 0.5
+
+_INTEGER_TYPES = [(np.int8, 'int8', 'Int8'), (np.int16, 'int16', 'Int16'),
+                  (np.int32, 'int32', 'Int32'), (np.int64, 'int64', 'Int64')]
+
+
+def _integer_dtype(low, high, nullable):
+    for numpy_type, name, nullable_name in _INTEGER_TYPES:
+        info = np.iinfo(numpy_type)
+        if info.min <= low and high <= info.max:
+            return nullable_name if nullable else name
+    return None
+
+
+def infer_column_dtype(column):
+    """
+    Narrowest dtype that stores a column without loss.
+
+    Parameters:
+    -----------
+    column : pandas.Series
+
+    Returns:
+    --------
+    str
+        dtype name accepted by Series.astype; the current dtype when
+        nothing narrower fits
+    """
+    current = str(column.dtype)
+    values = column.dropna()
+    if not len(values):
+        return current
+    nullable = len(values) < len(column)
+
+    if pd.api.types.is_bool_dtype(column.dtype) or pd.api.types.is_datetime64_any_dtype(column.dtype):
+        return current
+
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        array = values.to_numpy(dtype=np.float64)
+        if not np.isfinite(array).all():
+            return current
+        if np.array_equal(array, np.floor(array)):
+            return _integer_dtype(array.min(), array.max(), nullable) or current
+        if np.array_equal(array.astype(np.float32).astype(np.float64), array):
+            return 'float32'
+        return 'float64'
+
+    if pd.api.types.infer_dtype(values, skipna=True) == 'string':
+        n_unique = values.nunique()
+        if n_unique <= MAX_CATEGORIES and n_unique <= MAX_CATEGORY_RATIO * len(values):
+            return 'category'
+    return current
+
+
+def infer_schema(df):
+    """
+    Infer compact dtypes for every column of a DataFrame.
+
+    Returns:
+    --------
+    dict
+        Column name -> dtype name
+    """
+    return {str(name): infer_column_dtype(df[name]) for name in df.columns}
+
+
+def apply_schema(df, schema):
+    """
+    Convert the columns of a DataFrame to the dtypes of a schema.
+
+    Columns missing from the schema are left alone, as are columns whose
+    values no longer fit (the schema is then out of date for them).
+
+    Returns:
+    --------
+    pandas.DataFrame
+        A new frame with the converted columns
+    """
+    converted = {}
+    for name in df.columns:
+        dtype = schema.get(str(name))
+        if dtype is None or str(df[name].dtype) == dtype:
+            continue
+        try:
+            converted[name] = df[name].astype(dtype)
+        except (TypeError, ValueError, OverflowError):
+            print(f"Column {name} no longer fits {dtype}; keeping {df[name].dtype}")
+    return df.assign(**converted) if converted else df
+
+
+def memory_usage(df):
+    """Bytes used by a DataFrame, strings included"""
+    return int(df.memory_usage(deep=True).sum())
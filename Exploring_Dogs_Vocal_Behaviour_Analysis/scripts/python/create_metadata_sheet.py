@@ -1,14 +1,71 @@
-import pandas as pd
+import argparse
+from pathlib import Path
 
-# Load the dataset
-file_path = r"C:\Users\Farkas\Documents\Exploring-individual-and-demographic-factors-potentially-affecting-dogs-vocal-behaviour\Exploring_Dogs_Vocal_Behaviour_Analysis\base_data\raw\DATA_Base_stone.xlsx"
-data = pd.read_excel(file_path)
+from data_cache import DataCache
+from instrumentation import add_trace_arguments, span, start_tracing
 
-# Generate basic statistics
-metadata = data.describe(include='all')
+base_dir = Path(__file__).resolve().parent.parent.parent
+DEFAULT_INPUT = base_dir / "base_data" / "raw" / "DATA_Base_stone.xlsx"
+DEFAULT_OUTPUT = base_dir / "base_data" / "raw" / "metadata_sheet.xlsx"
 
-# Save the metadata to a new Excel file
-metadata_file_path = r"C:\Users\Farkas\Documents\Exploring-individual-and-demographic-factors-potentially-affecting-dogs-vocal-behaviour\Exploring_Dogs_Vocal_Behaviour_Analysis\base_data\raw\metadata_sheet.xlsx"
-metadata.to_excel(metadata_file_path)
 
-print("Metadata sheet created successfully.")
+def create_metadata_sheet(input_file=DEFAULT_INPUT, output_file=DEFAULT_OUTPUT,
+                          chunk_size=20000, n_jobs=1):
+    """
+    Profile the base export and write one row of statistics per column.
+
+    Parameters:
+    -----------
+    input_file : str or Path
+        Export to profile (.xlsx, .csv or .parquet)
+    output_file : str or Path
+        Metadata sheet to write
+    chunk_size : int
+        Rows profiled per chunk
+    n_jobs : int, optional
+        Worker processes profiling chunks (None = all cores)
+
+    Returns:
+    --------
+    pandas.DataFrame
+        The metadata sheet
+    """
+    from column_profiler import profile_table
+
+    # Profile the dataset in one chunked pass; a converted copy in the
+    # content-hash cache is streamed instead of the workbook when available
+    source = DataCache().lookup(input_file) or input_file
+    with span("create_metadata_sheet.profile") as record:
+        profile = profile_table(source, chunk_size=chunk_size, n_jobs=n_jobs)
+        record['outputs'] = [profile.n_rows, len(profile.columns)]
+
+    # Generate basic statistics
+    metadata = profile.to_frame()
+
+    # Save the metadata to a new Excel file
+    with span("create_metadata_sheet.save", metadata):
+        metadata.to_excel(output_file)
+
+    print(f"Profiled {profile.n_rows} rows x {len(profile.columns)} columns from {Path(source).name}")
+    print("Metadata sheet created successfully.")
+    return metadata
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the metadata sheet of the base dataset")
+    parser.add_argument('--input', type=Path, default=DEFAULT_INPUT,
+                        help="export to profile (.xlsx, .csv or .parquet)")
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT,
+                        help="metadata sheet to write")
+    parser.add_argument('--chunk-size', type=int, default=20000, help="rows profiled per chunk")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes profiling chunks (0 = all cores)")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    tracer = (start_tracing(base_dir / "base_data" / "raw", "metadata_sheet", args.trace,
+                            args.trace_memory) if args.trace else None)
+
+    create_metadata_sheet(args.input, args.output, args.chunk_size, args.jobs or None)
+
+    if tracer:
+        tracer.close()
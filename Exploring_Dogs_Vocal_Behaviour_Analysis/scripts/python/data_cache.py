@@ -0,0 +1,244 @@
+"""
+Content-Hash Data Cache
+-----------------------
+
+Shared data-access layer for the project scripts. Every source file
+(.xlsx or .csv) is keyed by the SHA-256 of its content and converted once
+into a columnar cache file; later reads load the cached copy instead of
+parsing Excel again.
+
+- The cache lives in base_data/cache (one file per source and content hash)
+- index.json remembers size, mtime and hash per source, so unchanged files
+  are not even re-hashed
+- When a source's content changes, its old cache entry is evicted
+- Reads with different read options (usecols, dtype, header, ...) are
+  separate cache entries
+- read_table(..., compact=True) narrows the column types (see
+  compact_dtypes.py) and caches the narrowed frame as its own entry;
+  Parquet and pickle keep category / int8 / Int8 columns, so later loads
+  come back compact without building the wide frame first
+
+Parquet is used when pyarrow is installed, pickle otherwise.
+
+pandas is only imported when a table is actually read, so scripts that
+just look up cache entries (or hash files) start quickly.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+CACHE_FORMAT = 'parquet' if importlib.util.find_spec('pyarrow') else 'pkl'
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "base_data" / "cache"
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DataCache:
+    """
+    Converts source tables into cached columnar files keyed by content hash.
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        Parameters:
+        -----------
+        cache_dir : str or Path, optional
+            Cache directory; defaults to base_data/cache
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / "index.json"
+        self.index = self._load_index()
+
+    def _load_index(self):
+        if self.index_file.exists():
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_index(self):
+        tmp = self.index_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp, self.index_file)
+
+    @staticmethod
+    def _options(read_kwargs):
+        """Canonical text of the read options, '' when there are none"""
+        return json.dumps(read_kwargs, sort_keys=True, default=str) if read_kwargs else ''
+
+    @classmethod
+    def _key(cls, source, sheet_name, read_kwargs=None, compact=False):
+        key = str(Path(source).resolve())
+        if sheet_name not in (None, 0):
+            key = f"{key}::{sheet_name}"
+        options = cls._options(read_kwargs)
+        if options:
+            key = f"{key}::{options}"
+        return f"{key}::compact" if compact else key
+
+    def source_hash(self, source, sheet_name=0, read_kwargs=None, compact=False):
+        """
+        Content hash of a source file, reusing the stored hash when size and
+        modification time are unchanged.
+        """
+        stat = os.stat(source)
+        entry = self.index.get(self._key(source, sheet_name, read_kwargs, compact))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+        return file_hash(source)
+
+    def lookup(self, source, sheet_name=0, read_kwargs=None, compact=False):
+        """
+        Return the cached file for the current content of source (read with
+        the given read options, compacted or not), or None.
+        """
+        key = self._key(source, sheet_name, read_kwargs, compact)
+        entry = self.index.get(key)
+        if not entry:
+            return None
+        cached = self.cache_dir / entry['cached']
+        if (entry['sha256'] != self.source_hash(source, sheet_name, read_kwargs, compact)
+                or not cached.exists()):
+            return None
+
+        # Same content under a new timestamp: remember it to skip re-hashing
+        stat = os.stat(source)
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self._save_index()
+        return cached
+
+    def _evict(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            stale = self.cache_dir / entry['cached']
+            if stale.exists():
+                stale.unlink()
+                print(f"Evicted stale cache entry: {stale.name}")
+
+    @staticmethod
+    def _read_source(source, sheet_name, **read_kwargs):
+        import pandas as pd
+
+        if source.suffix.lower() in ('.xlsx', '.xls', '.xlsm'):
+            return pd.read_excel(source, sheet_name=sheet_name, **read_kwargs)
+        if source.suffix.lower() == '.csv':
+            return pd.read_csv(source, **read_kwargs)
+        if source.suffix.lower() == '.parquet':
+            return pd.read_parquet(source, **read_kwargs)
+        raise ValueError(f"Unsupported source file type: {source.suffix}")
+
+    @staticmethod
+    def _read_cached(cached):
+        import pandas as pd
+
+        if cached.suffix == '.parquet':
+            return pd.read_parquet(cached)
+        return pd.read_pickle(cached)
+
+    @staticmethod
+    def _compact(df):
+        """Narrow the column types of a frame"""
+        from compact_dtypes import apply_schema, infer_schema, memory_usage
+
+        before = memory_usage(df)
+        df = apply_schema(df, infer_schema(df))
+        print(f"Inferred compact column types: {before / 2**20:.1f} MiB -> "
+              f"{memory_usage(df) / 2**20:.1f} MiB")
+        return df
+
+    def read_table(self, source, sheet_name=0, compact=False, **read_kwargs):
+        """
+        Read a table through the cache.
+
+        Parameters:
+        -----------
+        source : str or Path
+            .xlsx / .csv file
+        sheet_name : str or int
+            Worksheet for Excel sources
+        compact : bool
+            Convert the columns to compact types (categories, small and
+            nullable integers, float32 where lossless); the converted frame
+            is what gets cached
+        **read_kwargs
+            Passed to pd.read_excel / pd.read_csv on a cache miss; part of
+            the cache key, so other options give another entry
+
+        Returns:
+        --------
+        pandas.DataFrame
+        """
+        source = Path(source)
+        key = self._key(source, sheet_name, read_kwargs, compact)
+        cached = self.lookup(source, sheet_name, read_kwargs, compact)
+        if cached is not None:
+            return self._read_cached(cached)
+
+        # A compact copy is converted from the plain cached copy when there
+        # is one, so the workbook is not parsed again
+        stat = os.stat(source)
+        plain = self.lookup(source, sheet_name, read_kwargs) if compact else None
+        if plain is not None:
+            digest = self.index[self._key(source, sheet_name, read_kwargs)]['sha256']
+            df = self._read_cached(plain)
+        else:
+            digest = file_hash(source)
+            df = self._read_source(source, sheet_name, **read_kwargs)
+        if compact:
+            df = self._compact(df)
+
+        # A changed source invalidates whatever was cached for it before
+        self._evict(key)
+        sheet = '' if sheet_name in (None, 0) else f"-{sheet_name}"
+        options = self._options(read_kwargs)
+        if options:
+            sheet += f"-{hashlib.sha256(options.encode()).hexdigest()[:8]}"
+        if compact:
+            sheet += "-compact"
+        cached = self.cache_dir / f"{source.stem}{sheet}-{digest[:16]}.{CACHE_FORMAT}"
+        try:
+            if CACHE_FORMAT == 'parquet':
+                df.to_parquet(cached, index=False)
+            else:
+                df.to_pickle(cached)
+        except (ValueError, TypeError) as e:
+            # Mixed-type object columns cannot always be stored as Parquet
+            print(f"Could not cache {source.name} as {CACHE_FORMAT} ({e}); using pickle")
+            cached.unlink(missing_ok=True)
+            cached = cached.with_suffix('.pkl')
+            df.to_pickle(cached)
+
+        self.index[key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'cached': cached.name,
+        }
+        self._save_index()
+        print(f"Cached {source.name} -> {cached.name}")
+        return df
+
+    def clear(self):
+        """Remove every cache entry"""
+        for key in list(self.index):
+            self._evict(key)
+        self._save_index()
+
+
+def read_table(source, sheet_name=0, cache_dir=None, compact=False, **read_kwargs):
+    """Read a table through the default (or given) cache directory"""
+    return DataCache(cache_dir).read_table(source, sheet_name=sheet_name, compact=compact,
+                                           **read_kwargs)
@@ -0,0 +1,292 @@
+"""
+Stage Instrumentation
+---------------------
+
+Records what every analysis step costs, so a slow production run can be
+traced back to data loading, clustering, MCA or plotting without
+attaching a profiler by hand.
+
+For every span (a traced function or method, or a `with span(...)`
+block) the active Tracer records:
+- wall time and CPU time of the calling thread
+- the process' peak RSS so far (where the platform reports it)
+- the tracemalloc peak inside the span (only with memory=True, since
+  tracing allocations slows Python-heavy code down). The peak counter is
+  process-wide, so spans that overlap spans of other threads (pipeline
+  stages running side by side) get no tracemalloc peak, only the RSS
+- the shapes / lengths of the inputs and of the result
+
+Spans are written as JSON lines as they finish, or collected into a
+Chrome trace (chrome://tracing, Perfetto) written on close().
+
+Nothing is recorded and the wrappers cost one attribute lookup while no
+tracer is active.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_FORMATS = ('jsonl', 'chrome')
+
+_active = None
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def describe(value):
+    """Size of a stage input or output: its shape, length or None"""
+    shape = getattr(value, 'shape', None)
+    if shape is not None and not callable(shape):
+        return list(shape)
+    if isinstance(value, (str, bytes, Path)):
+        return None
+    if isinstance(value, (tuple, list)):
+        sizes = [describe(item) for item in value]
+        return sizes if any(size is not None for size in sizes) else len(value)
+    if isinstance(value, dict):
+        return {str(key): describe(item) for key, item in value.items()}
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class Tracer:
+    """
+    Collects spans and exports them as JSON lines or a Chrome trace.
+    """
+
+    def __init__(self, path, fmt='jsonl', memory=False):
+        """
+        Parameters:
+        -----------
+        path : str or Path
+            Trace file; an existing file is replaced
+        fmt : str
+            'jsonl' (one JSON object per span) or 'chrome' (Chrome trace
+            event format)
+        memory : bool
+            Trace Python allocations with tracemalloc for per-span peaks
+        """
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format '{fmt}', "
+                             f"expected one of {', '.join(TRACE_FORMATS)}")
+        self.path = Path(path)
+        self.fmt = fmt
+        self.memory = memory
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open_frames = []
+        self._origin = time.perf_counter()
+        self._file = None
+
+    def start(self):
+        """Make this the active tracer of the process"""
+        global _active
+        if _active is not None and _active is not self:
+            _active.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.fmt == 'jsonl':
+            self._file = open(self.path, 'w', encoding='utf-8')
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active = self
+        atexit.register(self.close)
+        print(f"Tracing stages to: {self.path}")
+        return self
+
+    def close(self):
+        """Write out the trace and deactivate the tracer"""
+        global _active
+        if _active is self:
+            _active = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self.fmt == 'chrome' and self.events:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+            self.events = []
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name, inputs=None):
+        """
+        Record one stage.
+
+        Parameters:
+        -----------
+        name : str
+            Stage name, e.g. 'DogVocalizationAnalysis.load_data'
+        inputs : object, optional
+            Stage inputs whose sizes are recorded
+
+        Yields:
+        -------
+        dict
+            The span record; set record['outputs'] to log result sizes
+        """
+        stack = self._stack()
+        record = {'name': name, 'inputs': describe(inputs) if inputs is not None else None}
+        frame = {'peak_floor': 0, 'thread': threading.get_ident(), 'shared': False}
+        with self._lock:
+            # Spans open in other threads share the process-wide peak
+            # counter with this one: none of them can attribute it
+            for other in self._open_frames:
+                if other['thread'] != frame['thread']:
+                    other['shared'] = frame['shared'] = True
+            self._open_frames.append(frame)
+        if self.memory and tracemalloc.is_tracing() and not frame['shared']:
+            # Remember the enclosing span's peak before restarting the
+            # counter for this one
+            outer_peak = tracemalloc.get_traced_memory()[1]
+            if stack:
+                stack[-1]['peak_floor'] = max(stack[-1]['peak_floor'], outer_peak)
+            tracemalloc.reset_peak()
+        stack.append(frame)
+
+        started = time.perf_counter()
+        started_at = time.time()
+        cpu_started = time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - started
+            record['cpu_s'] = time.thread_time() - cpu_started
+            stack.pop()
+            with self._lock:
+                self._open_frames.remove(frame)
+            if self.memory and tracemalloc.is_tracing() and not frame['shared']:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['peak_floor'])
+                record['tracemalloc_peak_mb'] = peak / 2**20
+                if stack:
+                    stack[-1]['peak_floor'] = max(stack[-1]['peak_floor'], peak)
+            record['rss_peak_mb'] = _peak_rss_mb()
+            self._emit(record, started, started_at, threading.get_ident(), len(stack))
+
+    def _emit(self, record, started, started_at, thread, depth):
+        with self._lock:
+            if self.fmt == 'jsonl':
+                if self._file is None:
+                    return
+                record.update(start=datetime.fromtimestamp(started_at).isoformat(timespec='milliseconds'),
+                              offset_s=started - self._origin, thread=thread, depth=depth)
+                self._file.write(json.dumps(record, default=str) + "\n")
+                self._file.flush()
+            else:
+                args = {key: value for key, value in record.items()
+                        if key not in ('name', 'wall_s')}
+                self.events.append({
+                    'name': record['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': thread,
+                    'ts': (started - self._origin) * 1e6, 'dur': record['wall_s'] * 1e6,
+                    'args': args,
+                })
+
+
+def current_tracer():
+    """The active Tracer, or None"""
+    return _active
+
+
+@contextmanager
+def span(name, inputs=None):
+    """Record a block with the active tracer (no-op without one)"""
+    tracer = _active
+    if tracer is None:
+        yield {}
+        return
+    with tracer.span(name, inputs) as record:
+        yield record
+
+
+def traced(func=None, name=None, method=False):
+    """
+    Decorator recording every call of a function as a span.
+
+    Inputs are the positional and keyword arguments (without self for
+    methods), the output is the return value.
+    """
+    if func is None:
+        return functools.partial(traced, name=name, method=method)
+    label = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        tracer = _active
+        if tracer is None:
+            return func(*args, **kwargs)
+        inputs = list(args[1:] if method else args)
+        if kwargs:
+            inputs.append(kwargs)
+        with tracer.span(label, inputs) as record:
+            result = func(*args, **kwargs)
+            record['outputs'] = describe(result)
+        return result
+
+    wrapper.__wrapped_traced__ = True
+    return wrapper
+
+
+def instrument(cls=None, exclude=()):
+    """
+    Class decorator tracing every public method defined on the class.
+
+    Parameters:
+    -----------
+    exclude : iterable of str
+        Methods too small or too frequent to be worth a span
+    """
+    if cls is None:
+        return functools.partial(instrument, exclude=exclude)
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_') or attr in exclude or isinstance(value, (type, staticmethod, classmethod)):
+            continue
+        if not callable(value) or getattr(value, '__wrapped_traced__', False):
+            continue
+        setattr(cls, attr, traced(value, name=f"{cls.__name__}.{attr}", method=True))
+    return cls
+
+
+def start_tracing(directory, stem, fmt='jsonl', memory=False):
+    """
+    Start a tracer writing <stem>_trace.jsonl (or .json for Chrome traces)
+    into directory.
+    """
+    suffix = 'jsonl' if fmt == 'jsonl' else 'json'
+    return Tracer(Path(directory) / f"{stem}_trace.{suffix}", fmt, memory).start()
+
+
+def add_trace_arguments(parser):
+    """Add the --trace / --trace-memory options to a script's argument parser"""
+    parser.add_argument('--trace', choices=TRACE_FORMATS,
+                        help="record per-stage timing and memory as JSON lines or a Chrome trace")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also trace Python allocations per stage (slower)")